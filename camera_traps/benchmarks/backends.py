@@ -0,0 +1,84 @@
+"""
+Validation of an exported classifier (see `camera_traps.model.export`) against the Keras model on the held-out images
+of the dataset (the validation split of the training notebook): throughput, accuracy and differences of the predicted
+probabilities.
+
+Usage:
+
+    python -m camera_traps.benchmarks.backends path/to/weights path/to/export --backend tflite \
+        --dataset path/to/dataset --threads 4
+"""
+import argparse
+import time
+
+import numpy as np
+
+from camera_traps.model.classifier import load_classifier
+from camera_traps.model.dataset import get_dataset_index, split_dataset, load_images
+
+
+def evaluate(classifier, images: np.ndarray, labels: list[str], batch_size: int = 32) -> tuple[np.ndarray, dict]:
+    """
+    Classify the images, measuring the throughput and the accuracy.
+
+    :param classifier: the classifier
+    :param images: the (N, H, W, 3) array of RGB images
+    :param labels: the true label of each image
+    :param batch_size: the number of images predicted together
+    :return: the predictions and the metrics
+    """
+    # Warm up.
+    classifier.predict(images[:batch_size], batch_size=batch_size)
+
+    t1 = time.perf_counter()
+    predictions = classifier.predict(images, batch_size=batch_size)
+    elapsed = time.perf_counter() - t1
+
+    predicted = np.array(classifier.labels)[np.argmax(predictions, axis=1)]
+
+    return predictions, {"images/s": len(images) / elapsed, "accuracy": float(np.mean(predicted == labels))}
+
+
+def benchmark(weights_path: str, export_path: str, backend: str, dataset_path: str, num_threads: int = None,
+              limit: int = None, batch_size: int = 32) -> dict:
+    """
+    Compare the exported classifier with the Keras one on the held-out images.
+
+    :param weights_path: the path to the weights of the Keras model
+    :param export_path: the path to the exported model
+    :param backend: the backend of the exported model, 'tflite' or 'onnx'
+    :param dataset_path: the path to the dataset folder
+    :param num_threads: the number of threads of the exported model
+    :param limit: the maximum number of held-out images
+    :param batch_size: the number of images predicted together
+    :return: the metrics of both classifiers and their differences
+    """
+    _, df_valid = split_dataset(get_dataset_index(dataset_path))
+    if limit:
+        df_valid = df_valid.sample(n=min(limit, len(df_valid)), random_state=42)
+    images, labels = load_images(df_valid["filename"].tolist()), df_valid["label"].to_numpy()
+
+    reference, reference_metrics = evaluate(load_classifier(weights_path), images, labels, batch_size)
+    predictions, metrics = evaluate(load_classifier(export_path, backend=backend, num_threads=num_threads), images,
+                                    labels, batch_size)
+
+    return {"images": len(images),
+            "keras": reference_metrics,
+            backend: metrics,
+            "speedup": metrics["images/s"] / reference_metrics["images/s"],
+            "accuracy_delta": metrics["accuracy"] - reference_metrics["accuracy"],
+            "agreement": float(np.mean(np.argmax(predictions, axis=1) == np.argmax(reference, axis=1))),
+            "max_probability_delta": float(np.abs(predictions - reference).max())}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("weights", help="folder containing 'weights.h5' and 'labels'")
+    parser.add_argument("export", help="folder of the exported model")
+    parser.add_argument("--backend", default="tflite", choices=["tflite", "onnx"], help="backend of the exported model")
+    parser.add_argument("--dataset", required=True, help="dataset folder")
+    parser.add_argument("--threads", type=int, default=None, help="number of threads of the exported model")
+    parser.add_argument("--limit", type=int, default=None, help="maximum number of held-out images")
+    args = parser.parse_args()
+
+    print(benchmark(args.weights, args.export, args.backend, args.dataset, args.threads, args.limit))
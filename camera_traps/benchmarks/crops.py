@@ -0,0 +1,95 @@
+"""
+Benchmark of the crop extraction: the preallocated crop buffer (see `camera_traps.motion_detection.crops`) against the
+legacy loop, which converts and resizes every crop into a fresh array and stacks them all at the end. Random boxes are
+cut out of random frames, so that the timings only depend on the numbers of frames and boxes; the peak memory is the
+one traced by `tracemalloc`, which includes the NumPy allocations.
+
+Usage:
+
+    python -m camera_traps.benchmarks.crops --frames 1000 --boxes-per-frame 10
+"""
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+import cv2
+
+from camera_traps.benchmarks.geometry import random_boxes
+from camera_traps.motion_detection.crops import CropBuffer
+
+
+def legacy_crops(frames: list[np.ndarray], coordinates: list[list[tuple[int, int, int, int]]]) -> np.ndarray:
+    """
+    The crop extraction as it was before the crop buffer: one array for each crop, stacked at the end.
+    """
+    crops = []
+    for frame, frame_coordinates in zip(frames, coordinates):
+        for x, y, w, h in frame_coordinates:
+            box = frame[y:y + h, x:x + w]
+            box = cv2.cvtColor(box, cv2.COLOR_BGR2RGB)
+            box = cv2.resize(box, (128, 128))
+            crops.append(box)
+
+    return np.stack(crops, axis=0)
+
+
+def buffered_crops(frames: list[np.ndarray], coordinates: list[list[tuple[int, int, int, int]]]) -> np.ndarray:
+    """
+    The crop extraction into a single preallocated buffer, converted to RGB at the end.
+    """
+    buffer = CropBuffer()
+    for frame, frame_coordinates in zip(frames, coordinates):
+        buffer.add(frame, frame_coordinates)
+
+    return buffer.to_rgb()
+
+
+def benchmark(n_frames: int, boxes_per_frame: int, width: int = 1280, height: int = 720, seed: int = 0) -> dict:
+    """
+    Cut the same random boxes with both implementations.
+
+    :param n_frames: the number of frames
+    :param boxes_per_frame: the number of boxes of each frame
+    :param width: the width of the frames
+    :param height: the height of the frames
+    :param seed: the seed of the random generator
+    :return: the number of crops, the elapsed times, the peak memory (in MB) of both implementations and the speedup
+    """
+    rng = np.random.default_rng(seed)
+    # A few distinct frames are enough, since the crops are copied anyway.
+    frames = [rng.integers(0, 256, (height, width, 3), dtype=np.uint8) for _ in range(8)]
+    frames = [frames[i % len(frames)] for i in range(n_frames)]
+    coordinates = []
+    for _ in range(n_frames):
+        boxes = random_boxes(rng, boxes_per_frame, width, height)
+        boxes[:, 2] = np.minimum(boxes[:, 2], width - boxes[:, 0])
+        boxes[:, 3] = np.minimum(boxes[:, 3], height - boxes[:, 1])
+        coordinates.append([tuple(box) for box in boxes.tolist()])
+
+    result = {"crops": n_frames * boxes_per_frame}
+    reference = None
+    for name, function in [("legacy", legacy_crops), ("buffered", buffered_crops)]:
+        tracemalloc.start()
+        t1 = time.perf_counter()
+        crops = function(frames, coordinates)
+        result[name] = time.perf_counter() - t1
+        result[f"{name}_peak_mb"] = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        tracemalloc.stop()
+
+        reference = crops if reference is None else reference
+        assert np.array_equal(crops, reference), "The crops of the buffer differ from the legacy ones"
+        del crops
+    result["speedup"] = result["legacy"] / result["buffered"]
+
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", type=int, nargs="+", default=[500, 2000], help="numbers of frames")
+    parser.add_argument("--boxes-per-frame", type=int, default=10, help="number of boxes of each frame")
+    args = parser.parse_args()
+
+    for n_frames in args.frames:
+        print(benchmark(n_frames, args.boxes_per_frame))
@@ -0,0 +1,82 @@
+"""
+Benchmark of the motion detection at different detection scales: throughput and agreement of the bounding boxes with
+the ones detected at full resolution.
+
+Usage:
+
+    python -m camera_traps.benchmarks.detection_scale path/to/video.mp4 --scales 1 0.5 0.25 --frames 300
+"""
+import argparse
+import itertools
+import time
+
+import numpy as np
+
+from camera_traps.motion_detection.capture_motion import get_video_properties, read_frames, load_background, \
+    detect_bboxes
+
+
+def get_iou(boxes1: np.ndarray, boxes2: np.ndarray) -> np.ndarray:
+    """
+    Compute the pairwise intersection over union of two sets of boxes.
+
+    :param boxes1: the (N, 4) array of the x and y coordinates of the upper left corner, the width and the height
+    :param boxes2: the (M, 4) array of the x and y coordinates of the upper left corner, the width and the height
+    :return: the (N, M) array of the intersections over union
+    """
+    boxes1, boxes2 = boxes1[:, np.newaxis], boxes2[np.newaxis]
+    overlap = np.maximum(np.minimum(boxes1[..., :2] + boxes1[..., 2:], boxes2[..., :2] + boxes2[..., 2:]) -
+                         np.maximum(boxes1[..., :2], boxes2[..., :2]), 0)
+    intersection = overlap[..., 0] * overlap[..., 1]
+    union = boxes1[..., 2] * boxes1[..., 3] + boxes2[..., 2] * boxes2[..., 3] - intersection
+
+    return intersection / union
+
+
+def benchmark(video_path: str, scales: list[float], n_frames: int, area_filer_out: int,
+              background_path: str = None) -> list[dict]:
+    """
+    Detect the motion of the first frames of a video at each scale.
+
+    :param video_path: the path to the video file
+    :param scales: the detection scales
+    :param n_frames: the number of frames (decoded in advance, so that the decoding is not timed)
+    :param area_filer_out: the bounding boxes' areas that will not be considered for motion detection if smaller
+    :param background_path: the path to the background image; if not provided, it is computed from the video
+    :return: for each scale, the frames per second, the number of boxes and the mean best IoU of the boxes detected
+        at full resolution with the ones detected at that scale
+    """
+    video, *_ = get_video_properties(video_path)
+    frames = list(itertools.islice(read_frames(video), n_frames))
+    video.release()
+    background = load_background(video_path, background_path)
+
+    reference, results = None, []
+    for scale in scales:
+        t1 = time.perf_counter()
+        boxes = [np.array(coordinates).reshape(-1, 4) for _, _, coordinates in
+                 detect_bboxes(frames, background, area_filer_out, detection_scale=scale)]
+        elapsed = time.perf_counter() - t1
+
+        reference = boxes if reference is None else reference
+        best_iou = [get_iou(r, b).max(axis=1) if len(b) else np.zeros(len(r)) for r, b in zip(reference, boxes)]
+        best_iou = np.concatenate(best_iou)
+
+        results.append({"scale": scale, "fps": len(frames) / elapsed, "boxes": int(sum(map(len, boxes))),
+                        "mean_best_iou": float(best_iou.mean()) if len(best_iou) else None})
+
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("video", help="path to the video file")
+    parser.add_argument("--background", default=None, help="path to the background image")
+    parser.add_argument("--scales", type=float, nargs="+", default=[1, 0.5, 0.25], help="detection scales; the first "
+                                                                                         "one is the reference")
+    parser.add_argument("--frames", type=int, default=300, help="number of frames")
+    parser.add_argument("--area-filter-out", type=int, default=3000, help="minimum area of the bounding boxes")
+    args = parser.parse_args()
+
+    for result in benchmark(args.video, args.scales, args.frames, args.area_filter_out, args.background):
+        print(result)
@@ -0,0 +1,56 @@
+"""
+Benchmark of the motion-gated frame sampling: fraction of skipped frames, detected boxes and end-to-end speedup of the
+decoding and motion detection with respect to analyzing every frame.
+
+Usage:
+
+    python -m camera_traps.benchmarks.frame_step path/to/video.mp4 --steps 1 5 10
+"""
+import argparse
+import time
+
+from camera_traps.motion_detection.capture_motion import get_video_properties, load_background, \
+    detect_sampled_bboxes
+
+
+def benchmark(video_path: str, steps: list[int], area_filer_out: int, background_path: str = None) -> list[dict]:
+    """
+    Detect the motion of a video with each sampling step.
+
+    :param video_path: the path to the video file
+    :param steps: the sampling steps; the first one is the reference
+    :param area_filer_out: the bounding boxes' areas that will not be considered for motion detection if smaller
+    :param background_path: the path to the background image; if not provided, it is computed from the video
+    :return: for each step, the elapsed time, the speedup, the fraction of skipped frames and the number of boxes
+    """
+    background = load_background(video_path, background_path)
+
+    results = []
+    for frame_step in steps:
+        video, *_ = get_video_properties(video_path)
+        t1 = time.perf_counter()
+        n_frames, n_skipped, n_boxes = 0, 0, 0
+        for _, frame, coordinates in detect_sampled_bboxes(video, background, area_filer_out, frame_step=frame_step):
+            n_frames += 1
+            n_skipped += frame is None
+            n_boxes += len(coordinates)
+        elapsed = time.perf_counter() - t1
+        video.release()
+
+        results.append({"frame_step": frame_step, "elapsed": elapsed, "speedup": results[0]["elapsed"] / elapsed
+                        if results else 1.0, "skipped": n_skipped / max(n_frames, 1), "boxes": n_boxes})
+
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("video", help="path to the video file")
+    parser.add_argument("--background", default=None, help="path to the background image")
+    parser.add_argument("--steps", type=int, nargs="+", default=[1, 5, 10], help="sampling steps; the first one is "
+                                                                                  "the reference")
+    parser.add_argument("--area-filter-out", type=int, default=3000, help="minimum area of the bounding boxes")
+    args = parser.parse_args()
+
+    for result in benchmark(args.video, args.steps, args.area_filter_out, args.background):
+        print(result)
@@ -0,0 +1,99 @@
+"""
+Parity check and benchmark of the NumPy box merging (`merge_bboxes`) against the shapely one
+(`get_bbox_without_intersection`) on random axis-aligned boxes.
+
+Usage:
+
+    python -m camera_traps.benchmarks.geometry --frames 2000 --boxes 10
+"""
+import argparse
+import time
+
+import numpy as np
+from shapely.ops import unary_union
+
+from camera_traps.motion_detection.geometry_utils import compose_polygon, decompose_polygon, \
+    get_bbox_without_intersection, merge_bboxes
+
+
+def random_boxes(rng: np.random.Generator, n_boxes: int, width: int = 1920, height: int = 1080) -> np.ndarray:
+    """
+    Draw random axis-aligned boxes inside a frame.
+
+    :param rng: the random generator
+    :param n_boxes: the number of boxes
+    :param width: the width of the frame
+    :param height: the height of the frame
+    :return: the (N, 4) array of the x and y coordinates of the upper left corner, the width and the height of the
+        boxes
+    """
+    sizes = rng.integers(20, 300, size=(n_boxes, 2))
+    corners = rng.integers(0, [width, height], size=(n_boxes, 2)) - sizes // 2
+
+    return np.concatenate([np.clip(corners, 0, None), sizes], axis=1)
+
+
+def check_parity(n_frames: int, n_boxes: int, seed: int = 0) -> dict:
+    """
+    Compare the merged boxes of both implementations on random frames. The NumPy boxes must always be equal to the
+    extents of the shapely union; they are also compared with the output of `get_bbox_without_intersection`, which
+    differs only when the minimum rotated rectangle of a merged polygon is not axis-aligned.
+
+    :param n_frames: the number of random frames
+    :param n_boxes: the number of boxes of each frame
+    :param seed: the seed of the random generator
+    :return: the number of frames and the number of frames with the same merged boxes of `get_bbox_without_intersection`
+    """
+    rng = np.random.default_rng(seed)
+    n_equal = 0
+    for _ in range(n_frames):
+        boxes = random_boxes(rng, n_boxes)
+        polygons = [compose_polygon(*box) for box in boxes]
+        merged = sorted(map(tuple, merge_bboxes(boxes).tolist()))
+
+        union = unary_union(polygons)
+        union = list(union.geoms) if union.geom_type == "MultiPolygon" else [union]
+        extents = sorted(decompose_polygon(p.envelope) for p in union if not p.is_empty)
+        assert merged == extents, f"Merged boxes {merged} differ from the union extents {extents}"
+
+        n_equal += merged == sorted(get_bbox_without_intersection(polygons))
+
+    return {"frames": n_frames, "frames_equal_to_shapely": n_equal}
+
+
+def benchmark(n_frames: int, n_boxes: int, seed: int = 0) -> dict:
+    """
+    Time both implementations, including the construction of their inputs from the contours' bounding rectangles.
+
+    :param n_frames: the number of random frames
+    :param n_boxes: the number of boxes of each frame
+    :param seed: the seed of the random generator
+    :return: the mean time per frame (in microseconds) of both implementations and the speedup
+    """
+    rng = np.random.default_rng(seed)
+    frames = [[tuple(box) for box in random_boxes(rng, n_boxes).tolist()] for _ in range(n_frames)]
+
+    t1 = time.perf_counter()
+    for rects in frames:
+        get_bbox_without_intersection([compose_polygon(*rect) for rect in rects])
+    t2 = time.perf_counter()
+    for rects in frames:
+        merge_bboxes(np.array(rects))
+    t3 = time.perf_counter()
+
+    shapely_time = (t2 - t1) / n_frames * 1e6
+    numpy_time = (t3 - t2) / n_frames * 1e6
+
+    return {"shapely_us_per_frame": shapely_time, "numpy_us_per_frame": numpy_time,
+            "speedup": shapely_time / numpy_time}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", type=int, default=2000, help="number of random frames")
+    parser.add_argument("--boxes", type=int, nargs="+", default=[1, 5, 10, 30], help="number of boxes per frame")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the random generator")
+    args = parser.parse_args()
+
+    for n in args.boxes:
+        print(f"{n} boxes per frame:", check_parity(args.frames, n, args.seed), benchmark(args.frames, n, args.seed))
@@ -0,0 +1,73 @@
+"""
+Import time of the modules of the package, measured with `python -X importtime` in a fresh interpreter: total time,
+slowest imported modules and heavy dependencies imported without being needed. The motion detection modules must not
+import TensorFlow, matplotlib or tkinter, since every worker process of the CLI pays their import cost; the check exits
+with an error if they do, so that startup regressions stay visible.
+
+Usage:
+
+    python -m camera_traps.benchmarks.import_time camera_traps.cli camera_traps.motion_detection.capture_motion
+"""
+import argparse
+import subprocess
+import sys
+
+# The heavy dependencies that are imported only when they are actually needed.
+DEFERRED_MODULES = ("tensorflow", "matplotlib", "tkinter", "onnxruntime", "tflite_runtime", "sklearn")
+
+
+def measure(module: str) -> dict[str, tuple[int, int]]:
+    """
+    Import a module in a fresh interpreter and collect the import time of every module it imports.
+
+    :param module: the name of the module to import
+    :return: for each imported module, its own and its cumulative import time (in microseconds)
+    """
+    process = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], capture_output=True,
+                             text=True, check=True)
+
+    times = dict()
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_time, cumulative_time, name = line[len("import time:"):].split("|")
+        times[name.strip()] = (int(self_time), int(cumulative_time))
+
+    return times
+
+
+def benchmark(module: str, top: int = 10) -> dict:
+    """
+    Measure the import time of a module.
+
+    :param module: the name of the module to import
+    :param top: the number of slowest imported modules reported
+    :return: the total import time (in seconds), the slowest imported modules and the deferred dependencies imported
+    """
+    times = measure(module)
+    slowest = sorted(times.items(), key=lambda item: item[1][1], reverse=True)[:top]
+
+    return {"module": module,
+            "total": times[module][1] / 1e6 if module in times else None,
+            "modules": len(times),
+            "slowest": {name: cumulative / 1e6 for name, (_, cumulative) in slowest},
+            "deferred": sorted({name.split(".")[0] for name in times} & set(DEFERRED_MODULES))}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("modules", nargs="*", default=["camera_traps.cli",
+                                                       "camera_traps.motion_detection.capture_motion"],
+                        help="modules to import")
+    parser.add_argument("--top", type=int, default=10, help="number of slowest imported modules reported")
+    args = parser.parse_args()
+
+    failed = False
+    for module in args.modules:
+        result = benchmark(module, args.top)
+        print(result)
+        if result["deferred"]:
+            print(f"{module} imports {', '.join(result['deferred'])} at import time", file=sys.stderr)
+            failed = True
+
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,198 @@
+"""
+Benchmark of each stage of the motion detection pipeline on a synthetic camera-trap video (see
+`camera_traps.benchmarks.synthetic`): background computation, pixel difference, box merging (shapely and NumPy), crop
+and resize, classification by a small random-weight model, tracking and writing of the annotated video. The results
+are written as JSON, so that the timings of different versions can be compared.
+
+Usage:
+
+    python -m camera_traps.benchmarks.pipeline --frames 300 --width 1280 --height 720 --output pipeline.json
+"""
+from typing import Optional
+import argparse
+import contextlib
+import importlib.metadata
+import json
+import os
+import platform
+import tempfile
+import time
+
+import numpy as np
+import cv2
+
+from camera_traps.benchmarks.synthetic import write_video
+from camera_traps.motion_detection.capture_motion import get_video_properties, get_background, \
+    get_pixel_difference, read_frames, crop_bboxes, postprocess_detections, write_output_video
+from camera_traps.motion_detection.crops import CropBuffer
+from camera_traps.motion_detection.detections import Detections
+from camera_traps.motion_detection.geometry_utils import compose_polygon, get_bbox_without_intersection, merge_bboxes
+
+
+class RandomClassifier:
+    """
+    Small convolutional network with random weights, standing in for the trained classifier: the timings do not need
+    the trained weights, nor the download of the pretrained ones.
+    """
+
+    def __init__(self, labels: list[str], input_shape: tuple = (128, 128, 3), seed: int = 0):
+        """
+        :param labels: the labels of the model
+        :param input_shape: the input shape allowed by the model
+        :param seed: the seed of the random weights
+        """
+        import tensorflow as tf
+
+        tf.keras.utils.set_random_seed(seed)
+        inputs = tf.keras.layers.Input(shape=input_shape)
+        x = tf.keras.layers.Rescaling(1 / 255)(inputs)
+        x = tf.keras.layers.Conv2D(16, 3, strides=2, activation="relu")(x)
+        x = tf.keras.layers.Conv2D(32, 3, strides=2, activation="relu")(x)
+        x = tf.keras.layers.GlobalAveragePooling2D()(x)
+        outputs = tf.keras.layers.Dense(len(labels), activation="softmax")(x)
+
+        self.model = tf.keras.Model(inputs, outputs, name="Random")
+        self.labels = labels
+        self.input_shape = input_shape
+        self.weights_id = f"random-{seed}"
+
+    def predict(self, crops: np.ndarray, batch_size: int = 32, verbose: int = 0) -> np.ndarray:
+        """
+        Classify a stack of crops.
+
+        :param crops: the (N, H, W, 3) array of RGB crops
+        :param batch_size: the number of crops predicted together
+        :param verbose: the verbosity of the prediction
+        :return: the (N, num_classes) array of the class probabilities
+        """
+        return self.model.predict(crops, batch_size=batch_size, verbose=verbose)
+
+
+@contextlib.contextmanager
+def timed(timings: dict, stage: str):
+    """
+    Add the elapsed time of the block to the timing of a stage.
+
+    :param timings: the elapsed time (in seconds) of each stage
+    :param stage: the name of the stage
+    """
+    t1 = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - t1
+
+
+def get_versions() -> dict:
+    """
+    :return: the versions of Python, of the package and of its main dependencies
+    """
+    versions = {"python": platform.python_version(), "numpy": np.__version__, "opencv": cv2.__version__}
+    try:
+        versions["camera_traps"] = importlib.metadata.version("camera-traps-wild-life")
+    except importlib.metadata.PackageNotFoundError:
+        versions["camera_traps"] = None
+
+    return versions
+
+
+def benchmark(n_frames: int = 300, width: int = 1280, height: int = 720, n_sprites: int = 3,
+              area_filer_out: int = 3000, classify: bool = True, seed: int = 0,
+              video_path: Optional[str] = None) -> dict:
+    """
+    Time each stage of the pipeline on a synthetic video.
+
+    :param n_frames: the number of frames of the synthetic video
+    :param width: the width of the synthetic video
+    :param height: the height of the synthetic video
+    :param n_sprites: the number of moving sprites of the synthetic video
+    :param area_filer_out: the bounding boxes' areas that will not be considered for motion detection if smaller
+    :param classify: whether to time the classification (it requires TensorFlow)
+    :param seed: the seed of the synthetic video, of the background frames and of the random weights
+    :param video_path: the path to a video to use instead of the synthetic one
+    :return: the parameters, the properties of the video, the counts of frames and boxes, and the elapsed time of each
+        stage
+    """
+    timings = dict()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        if video_path is None:
+            video_path = write_video(os.path.join(tmp_dir, "synthetic.mp4"), n_frames, width, height,
+                                     n_sprites=n_sprites, seed=seed)
+
+        with timed(timings, "get_background"):
+            background = get_background(video_path, seed=seed)
+
+        # The requested sizes are kept as parameters, the ones of the video may differ (e.g. for a real video).
+        video, fps, video_width, video_height = get_video_properties(video_path)
+        with timed(timings, "decode"):
+            frames = list(read_frames(video))
+        video.release()
+
+        with timed(timings, "get_pixel_difference"):
+            contours = [get_pixel_difference(frame, background) for frame in frames]
+        rectangles = [[cv2.boundingRect(c) for c in frame_contours if cv2.contourArea(c) > area_filer_out]
+                      for frame_contours in contours]
+
+        with timed(timings, "get_bbox_without_intersection"):
+            for frame_rectangles in rectangles:
+                get_bbox_without_intersection([compose_polygon(*r) for r in frame_rectangles])
+        with timed(timings, "merge_bboxes"):
+            coordinates = [merge_bboxes(np.array(frame_rectangles)).tolist() for frame_rectangles in rectangles]
+
+        with timed(timings, "crop_resize"):
+            buffer = CropBuffer()
+            for frame, frame_coordinates in zip(frames, coordinates):
+                crop_bboxes(frame, frame_coordinates, buffer=buffer)
+            crops = buffer.to_rgb()
+
+        detections = Detections.from_boxes([id_frame for id_frame, frame_coordinates in enumerate(coordinates)
+                                            for _ in frame_coordinates],
+                                           [tuple(c) for frame_coordinates in coordinates for c in frame_coordinates])
+
+        predictions, labels = None, None
+        if classify and len(crops):
+            classifier = RandomClassifier(["badger", "deer", "fox", "human", "None_of_the_above"], seed=seed)
+            # Warm up, so that the tracing of the model is not timed.
+            classifier.predict(crops[:32])
+            with timed(timings, "classification"):
+                predictions = classifier.predict(crops, batch_size=32)
+            labels = classifier.labels
+
+        if not detections.empty:
+            with timed(timings, "tracking"):
+                detections = postprocess_detections(detections, predictions, labels, score_filter_out=0,
+                                                    tracked_prediction=True)
+
+        with timed(timings, "write_output_video"):
+            write_output_video(frames, detections, os.path.join(tmp_dir, "output.mp4"), fps, video_width,
+                               video_height, labeled=predictions is not None)
+
+    return {"parameters": {"frames": n_frames, "width": width, "height": height, "sprites": n_sprites,
+                           "area_filer_out": area_filer_out, "seed": seed},
+            "video": {"fps": fps, "width": video_width, "height": video_height},
+            "versions": get_versions(),
+            "counts": {"frames": len(frames), "contours": int(sum(map(len, contours))),
+                       "boxes": len(detections), "crops": len(crops)},
+            "seconds": timings,
+            "ms_per_frame": {stage: elapsed / max(len(frames), 1) * 1e3 for stage, elapsed in timings.items()}}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--video", default=None, help="path to a video to use instead of the synthetic one")
+    parser.add_argument("--frames", type=int, default=300, help="number of frames of the synthetic video")
+    parser.add_argument("--width", type=int, default=1280, help="width of the synthetic video")
+    parser.add_argument("--height", type=int, default=720, help="height of the synthetic video")
+    parser.add_argument("--sprites", type=int, default=3, help="number of moving sprites of the synthetic video")
+    parser.add_argument("--area-filter-out", type=int, default=3000, help="minimum area of the bounding boxes")
+    parser.add_argument("--no-classification", action="store_true", help="do not time the classification")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the random generators")
+    parser.add_argument("--output", default=None, help="path to the JSON file of the results")
+    args = parser.parse_args()
+
+    result = benchmark(args.frames, args.width, args.height, args.sprites, args.area_filter_out,
+                       classify=not args.no_classification, seed=args.seed, video_path=args.video)
+    if args.output:
+        with open(args.output, "w") as fp:
+            json.dump(result, fp, indent=2)
+    print(json.dumps(result, indent=2))
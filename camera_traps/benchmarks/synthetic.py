@@ -0,0 +1,128 @@
+"""
+Synthetic camera-trap videos for the benchmarks: a static textured background crossed by moving sprites, with a slow
+lighting drift and sensor noise. The videos are generated offline and deterministically from a seed, so that the
+timings of different versions of the package are comparable.
+
+Usage:
+
+    python -m camera_traps.benchmarks.synthetic output.mp4 --frames 300 --sprites 3 --width 1280 --height 720
+"""
+from typing import Iterator, Optional
+import argparse
+
+import numpy as np
+import cv2
+
+
+def make_background(width: int, height: int, rng: np.random.Generator) -> np.ndarray:
+    """
+    Draw a textured background, i.e. smoothed random blobs on a green-brown gradient.
+
+    :param width: the width of the frame
+    :param height: the height of the frame
+    :param rng: the random generator
+    :return: the BGR background
+    """
+    gradient = np.linspace(0, 1, height, dtype=np.float32)[:, np.newaxis, np.newaxis]
+    background = (1 - gradient) * np.array([60, 110, 80], dtype=np.float32) + \
+        gradient * np.array([40, 70, 100], dtype=np.float32)
+    texture = cv2.GaussianBlur(rng.normal(0, 40, (height, width, 3)).astype(np.float32), (0, 0), sigmaX=4)
+
+    return np.clip(background + texture, 0, 255).astype(np.uint8)
+
+
+def make_sprites(n_sprites: int, n_frames: int, width: int, height: int, rng: np.random.Generator) -> list[dict]:
+    """
+    Draw the sprites and their linear trajectories across the frame.
+
+    :param n_sprites: the number of sprites
+    :param n_frames: the number of frames of the video
+    :param width: the width of the frame
+    :param height: the height of the frame
+    :param rng: the random generator
+    :return: the size, color, first frame, initial position and velocity (pixels per frame) of each sprite
+    """
+    sprites = []
+    for _ in range(n_sprites):
+        size = rng.integers(min(width, height) // 10, min(width, height) // 4, size=2)
+        start = int(rng.integers(0, max(n_frames // 2, 1)))
+        left_to_right = bool(rng.integers(2))
+        position = np.array([-size[0] if left_to_right else width, rng.integers(0, height - size[1])], dtype=float)
+        velocity = np.array([(width + size[0]) / rng.uniform(0.3, 0.6) / max(n_frames, 1), rng.normal(0, 0.5)])
+        velocity[0] *= 1 if left_to_right else -1
+        sprites.append({"size": size, "color": rng.integers(0, 256, size=3).tolist(), "start": start,
+                        "position": position, "velocity": velocity})
+
+    return sprites
+
+
+def generate_frames(n_frames: int = 300, width: int = 1280, height: int = 720, n_sprites: int = 3,
+                    drift: float = 30, noise: float = 4, seed: int = 0) -> Iterator[np.ndarray]:
+    """
+    Generate the frames of a synthetic camera-trap video.
+
+    :param n_frames: the number of frames
+    :param width: the width of the frames
+    :param height: the height of the frames
+    :param n_sprites: the number of moving sprites
+    :param drift: the amplitude of the lighting drift (in gray levels) along the video
+    :param noise: the standard deviation of the Gaussian sensor noise (in gray levels)
+    :param seed: the seed of the random generator
+    :return: a generator over the BGR frames
+    """
+    rng = np.random.default_rng(seed)
+    background = make_background(width, height, rng)
+    sprites = make_sprites(n_sprites, n_frames, width, height, rng)
+
+    for id_frame in range(n_frames):
+        frame = background.copy()
+        for sprite in sprites:
+            if id_frame < sprite["start"]:
+                continue
+            x, y = (sprite["position"] + sprite["velocity"] * (id_frame - sprite["start"])).astype(int).tolist()
+            w, h = sprite["size"].tolist()
+            cv2.ellipse(frame, (x + w // 2, y + h // 2), (w // 2, h // 2), 0, 0, 360, sprite["color"], -1)
+        # Lighting drift, as the slow change of the daylight.
+        light = drift * np.sin(2 * np.pi * id_frame / max(n_frames, 1))
+        frame = frame.astype(np.int16) + int(light) + rng.normal(0, noise, frame.shape).astype(np.int16)
+
+        yield np.clip(frame, 0, 255).astype(np.uint8)
+
+
+def write_video(output_video_path: str, n_frames: int = 300, width: int = 1280, height: int = 720, fps: int = 25,
+                n_sprites: int = 3, drift: float = 30, noise: float = 4, seed: Optional[int] = 0) -> str:
+    """
+    Write a synthetic camera-trap video (see `generate_frames`).
+
+    :param output_video_path: the path to the output file (.mp4)
+    :param n_frames: the number of frames
+    :param width: the width of the frames
+    :param height: the height of the frames
+    :param fps: the frame rate of the video
+    :param n_sprites: the number of moving sprites
+    :param drift: the amplitude of the lighting drift (in gray levels) along the video
+    :param noise: the standard deviation of the Gaussian sensor noise (in gray levels)
+    :param seed: the seed of the random generator
+    :return: the path to the output file
+    """
+    fourcc = cv2.VideoWriter_fourcc(*"mp4v")
+    output_video = cv2.VideoWriter(output_video_path, fourcc, fps=fps, frameSize=(width, height))
+    for frame in generate_frames(n_frames, width, height, n_sprites, drift, noise, seed):
+        output_video.write(frame)
+    output_video.release()
+
+    return output_video_path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("output", help="path to the output video (.mp4)")
+    parser.add_argument("--frames", type=int, default=300, help="number of frames")
+    parser.add_argument("--width", type=int, default=1280, help="width of the frames")
+    parser.add_argument("--height", type=int, default=720, help="height of the frames")
+    parser.add_argument("--fps", type=int, default=25, help="frame rate")
+    parser.add_argument("--sprites", type=int, default=3, help="number of moving sprites")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the random generator")
+    args = parser.parse_args()
+
+    write_video(args.output, args.frames, args.width, args.height, args.fps, args.sprites, seed=args.seed)
@@ -0,0 +1,67 @@
+"""
+Benchmark of the track label voting: the vectorized 2-D bincount (`get_primary_labels`) against the pandas groupby
+calling `get_primary_label` for every track, on synthetic tables of many short tracks. The labels of both are checked
+to be the same.
+
+Usage:
+
+    python -m camera_traps.benchmarks.voting --boxes 10000 100000 --track-length 10
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from camera_traps.motion_detection.detections import get_primary_label, get_primary_labels
+
+
+def make_tracks(n_boxes: int, track_length: int, n_labels: int = 10, seed: int = 0) \
+        -> tuple[np.ndarray, pd.Categorical]:
+    """
+    Create random tracks of random labels, some of them missing.
+
+    :param n_boxes: the number of boxes
+    :param track_length: the average number of boxes of each track
+    :param n_labels: the number of labels
+    :param seed: the seed of the random generator
+    :return: the track and the label of each box
+    """
+    rng = np.random.default_rng(seed)
+    tracks = np.sort(rng.integers(0, max(n_boxes // track_length, 1), n_boxes))
+    labels = np.array([f"label_{i}" for i in range(n_labels)] + ["None_of_the_above", np.nan], dtype=object)
+
+    return tracks, pd.Categorical(rng.choice(labels, n_boxes, p=[0.8 / n_labels] * n_labels + [0.15, 0.05]))
+
+
+def benchmark(n_boxes: int, track_length: int) -> dict:
+    """
+    Vote the labels of the same synthetic tracks with both implementations.
+
+    :param n_boxes: the number of boxes
+    :param track_length: the average number of boxes of each track
+    :return: the number of tracks, the elapsed times and the speedup
+    """
+    tracks, labels = make_tracks(n_boxes, track_length)
+
+    t1 = time.perf_counter()
+    expected = pd.Series(np.asarray(labels, dtype=object)).groupby(tracks).transform(get_primary_label)
+    t2 = time.perf_counter()
+    primary = get_primary_labels(tracks, labels)
+    t3 = time.perf_counter()
+
+    assert np.array_equal(expected.fillna("nan").to_numpy(dtype=object),
+                          pd.Series(np.asarray(primary, dtype=object)).fillna("nan").to_numpy(dtype=object))
+
+    return {"boxes": n_boxes, "tracks": len(np.unique(tracks)), "groupby": t2 - t1, "vectorized": t3 - t2,
+            "speedup": (t2 - t1) / (t3 - t2)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--boxes", type=int, nargs="+", default=[10000, 100000], help="numbers of boxes")
+    parser.add_argument("--track-length", type=int, default=10, help="average number of boxes of each track")
+    args = parser.parse_args()
+
+    for n_boxes in args.boxes:
+        print(benchmark(n_boxes, args.track_length))
@@ -0,0 +1,99 @@
+"""
+Benchmark of the annotated-video writer: the frame-indexed, threaded writer against the legacy loop, which queries the
+whole detections DataFrame for every frame. Synthetic detections are drawn on blank frames, so that the timings only
+depend on the numbers of frames and boxes.
+
+Usage:
+
+    python -m camera_traps.benchmarks.writer --frames 500 2000 --boxes-per-frame 3
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+import cv2
+
+from camera_traps.motion_detection.capture_motion import write_output_video
+from camera_traps.motion_detection.detections import Detections
+
+
+def legacy_write_output_video(frames, box_detection, output_video_path, fps, width, height, labeled=True):
+    """
+    The writer as it was before the frame index: one DataFrame query and `iterrows` for every frame.
+    """
+    fourcc = cv2.VideoWriter_fourcc(*"mp4v")
+    output_video = cv2.VideoWriter(output_video_path, fourcc, fps=fps, frameSize=(width, height))
+    for i, frame in enumerate(frames):
+        frame_objects_detection = box_detection.query("id_frame == @i & label != 'None_of_the_above'")
+        for index, row in frame_objects_detection.iterrows():
+            x, y, w, h = row["box"]
+            cv2.rectangle(frame, (x, y), (x + w, y + h), row["color_label"] or row["color_track"], 2)
+            text = f"{row['label']}: {'{:.2f}'.format(row['score'])}%" if labeled else "n/a"
+            (w, h), _ = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, 0.6, 1)
+            frame = cv2.rectangle(frame, (x, y - 20), (x + w, y), row["color_label"] or row["color_track"], -1)
+            frame = cv2.putText(frame, text, (x, y - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1)
+        output_video.write(frame)
+    output_video.release()
+
+
+def make_detections(n_frames: int, boxes_per_frame: int, width: int, height: int, seed: int = 0) -> Detections:
+    """
+    Create random detections, shuffled so that the boxes are not grouped by frame.
+
+    :param n_frames: the number of frames
+    :param boxes_per_frame: the average number of boxes of each frame
+    :param width: the width of the frames
+    :param height: the height of the frames
+    :param seed: the seed of the random generator
+    :return: the detections
+    """
+    rng = np.random.default_rng(seed)
+    n_boxes = n_frames * boxes_per_frame
+
+    detections = Detections.from_boxes(rng.integers(0, n_frames, n_boxes),
+                                       np.stack([rng.integers(0, width - 100, n_boxes),
+                                                 rng.integers(20, height - 100, n_boxes),
+                                                 rng.integers(20, 100, n_boxes),
+                                                 rng.integers(20, 100, n_boxes)], axis=1))
+    detections.set_predictions(rng.dirichlet([0.1] * 3, n_boxes), ["deer", "fox", "human"], score_filter_out=50)
+    detections.track()
+
+    return detections
+
+
+def benchmark(n_frames: int, boxes_per_frame: int, width: int = 640, height: int = 360) -> dict:
+    """
+    Write the same synthetic detections with both writers.
+
+    :param n_frames: the number of frames
+    :param boxes_per_frame: the average number of boxes of each frame
+    :param width: the width of the frames
+    :param height: the height of the frames
+    :return: the elapsed times and the speedup
+    """
+    detections = make_detections(n_frames, boxes_per_frame, width, height)
+    blank = np.zeros((height, width, 3), dtype=np.uint8)
+
+    result = {"frames": n_frames, "boxes": len(detections)}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for name, writer, boxes in [("legacy", legacy_write_output_video, detections.to_dataframe()),
+                                    ("indexed", write_output_video, detections)]:
+            frames = (blank.copy() for _ in range(n_frames))
+            t1 = time.perf_counter()
+            writer(frames, boxes, os.path.join(tmp_dir, f"{name}.mp4"), 25, width, height)
+            result[name] = time.perf_counter() - t1
+    result["speedup"] = result["legacy"] / result["indexed"]
+
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", type=int, nargs="+", default=[500, 2000], help="numbers of frames")
+    parser.add_argument("--boxes-per-frame", type=int, default=3, help="average number of boxes of each frame")
+    args = parser.parse_args()
+
+    for n_frames in args.frames:
+        print(benchmark(n_frames, args.boxes_per_frame))
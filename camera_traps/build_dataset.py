@@ -0,0 +1,255 @@
+"""
+Build a training set of crops from an archive of trap videos, in a single pass.
+
+The motion detection of the videos is spread across a pool of worker processes (see `camera_traps.cli`). Each worker
+cuts the crops of the detected motion (positives) and a fixed number of background crops (negatives) out of the
+analyzed frames without motion: the frames are chosen by reservoir sampling, so that they are spread uniformly along the
+video, and the boxes are drawn all at once by `sample_random_bboxes`, without rejection. The crops are written by the
+main process into NumPy shards of a fixed number of crops (`shard-00000.npz`, ...), each one holding the RGB crops with
+their kind ('motion' or 'background'), video, frame and box, and a manifest (`manifest.json`) lists the parameters of
+the run, the videos and the shards.
+
+Usage:
+
+    python -m camera_traps.build_dataset path/to/videos "path/to/other/*.mp4" --output-dir crops --negatives 20
+"""
+from typing import Optional
+import argparse
+import concurrent.futures
+import json
+import logging
+import multiprocessing
+import os
+import pathlib
+import time
+
+import numpy as np
+
+from camera_traps.cli import find_videos
+from camera_traps.motion_detection.background import BACKGROUND_MODES
+from camera_traps.motion_detection.capture_motion import get_video_properties, load_background, \
+    detect_sampled_bboxes, crop_bboxes, get_motion_parameters
+from camera_traps.motion_detection.crops import CropBuffer, CROP_SIZE
+from camera_traps.motion_detection.geometry_utils import sample_random_bboxes
+
+# The kinds of the crops, as stored in the shards.
+KINDS = ("motion", "background")
+
+
+def extract_training_crops(video_path: str, input_background_path: Optional[str] = None, area_filer_out: int = 3000,
+                           background_mode: str = "static", detection_scale: float = 1.0, frame_step: int = 1,
+                           n_negatives: int = 20, min_area: Optional[int] = None, seed: Optional[int] = None) -> dict:
+    """
+    Cut the motion crops of a video and sample background crops from its frames without motion.
+
+    :param video_path: the path to the video file
+    :param input_background_path: the path to the input background image; if not provided a background is computed
+        from the video
+    :param area_filer_out: the bounding boxes' areas that will not be considered for motion detection if smaller
+    :param background_mode: the background model (see `create_background_model`)
+    :param detection_scale: the scale at which the motion is detected (see `detect_bboxes`)
+    :param frame_step: the sampling step of the frames analyzed while no motion is found (see `detect_sampled_bboxes`)
+    :param n_negatives: the maximum number of background crops, at most one for each frame without motion
+    :param min_area: the minimum area of the background crops (by default, the area limit of the motion)
+    :param seed: the seed of the background crops
+    :return: the RGB crops, their kind (index of `KINDS`), frame and box
+    """
+    rng = np.random.default_rng(seed)
+    min_area = area_filer_out if min_area is None else min_area
+
+    video, _, width, height = get_video_properties(video_path=video_path)
+    background = load_background(video_path, input_background_path, background_mode)
+
+    positives, ids, coordinates = CropBuffer(), list(), list()
+    negative_boxes = sample_random_bboxes(width, height, min(min_area, width * height), n_negatives, rng)
+    negatives = np.empty((n_negatives, CROP_SIZE[1], CROP_SIZE[0], 3), dtype=np.uint8)
+    negative_ids = np.empty(n_negatives, dtype=np.int64)
+    n_motionless = 0
+    for id_frame, frame, frame_coordinates in detect_sampled_bboxes(video, background, area_filer_out,
+                                                                    frame_step=frame_step,
+                                                                    background_mode=background_mode,
+                                                                    detection_scale=detection_scale):
+        if frame is None:
+            continue
+        if frame_coordinates:
+            crop_bboxes(frame, frame_coordinates, buffer=positives)
+            ids.extend([id_frame] * len(frame_coordinates))
+            coordinates.extend(frame_coordinates)
+        elif n_negatives:
+            # Reservoir sampling of the frames without motion, one background crop for each.
+            slot = n_motionless if n_motionless < n_negatives else int(rng.integers(n_motionless + 1))
+            if slot < n_negatives:
+                negatives[slot] = crop_bboxes(frame, [tuple(negative_boxes[slot].tolist())])[0]
+                negative_ids[slot] = id_frame
+            n_motionless += 1
+
+    video.release()
+
+    n_kept = min(n_motionless, n_negatives)
+    crops = np.concatenate([positives.to_rgb(), negatives[:n_kept]], axis=0)
+
+    return {"crops": crops,
+            "kind": np.repeat(np.arange(len(KINDS), dtype=np.uint8), [len(positives), n_kept]),
+            "id_frame": np.concatenate([np.asarray(ids, dtype=np.int64), negative_ids[:n_kept]]),
+            "box": np.concatenate([np.asarray(coordinates, dtype=np.int32).reshape(-1, 4),
+                                   negative_boxes[:n_kept].astype(np.int32)], axis=0)}
+
+
+class ShardWriter:
+    """
+    Writer of the crops into NumPy shards of a fixed number of crops.
+    """
+
+    def __init__(self, output_dir: pathlib.Path, shard_size: int = 4096):
+        """
+        :param output_dir: the directory of the shards
+        :param shard_size: the number of crops of each shard
+        """
+        self.output_dir = output_dir
+        self.shard_size = shard_size
+        self.shards = list()
+        self._pending = list()
+        self._length = 0
+
+    def add(self, video_index: int, crops: dict):
+        """
+        Queue the crops of a video, writing the shards that are completed.
+
+        :param video_index: the index of the video in the manifest
+        :param crops: the crops of the video (see `extract_training_crops`)
+        """
+        crops = {**crops, "video": np.full(len(crops["crops"]), video_index, dtype=np.int32)}
+        self._pending.append(crops)
+        self._length += len(crops["crops"])
+        while self._length >= self.shard_size:
+            self._write(self.shard_size)
+
+    def close(self):
+        """
+        Write the last, partially filled, shard.
+        """
+        if self._length:
+            self._write(self._length)
+
+    def _write(self, n_crops: int):
+        fields = {name: np.concatenate([c[name] for c in self._pending], axis=0) for name in self._pending[0]}
+        name = f"shard-{len(self.shards):05d}.npz"
+        # Write the shard aside, so that a partially written shard is never read.
+        tmp_path = self.output_dir / f".{name}"
+        with open(tmp_path, "wb") as fp:
+            np.savez(fp, **{field: values[:n_crops] for field, values in fields.items()})
+        os.replace(tmp_path, self.output_dir / name)
+
+        kinds = np.bincount(fields["kind"][:n_crops], minlength=len(KINDS))
+        self.shards.append({"file": name, "crops": n_crops, **dict(zip(KINDS, kinds.tolist()))})
+        self._pending = [{field: values[n_crops:] for field, values in fields.items()}]
+        self._length -= n_crops
+
+
+def build_dataset(videos: list[pathlib.Path], output_dir: pathlib.Path, input_background_path: Optional[str] = None,
+                  area_filer_out: int = 3000, background_mode: str = "static", detection_scale: float = 1.0,
+                  frame_step: int = 1, n_negatives: int = 20, min_area: Optional[int] = None,
+                  shard_size: int = 4096, workers: Optional[int] = None, seed: int = 42) -> dict:
+    """
+    Extract the training crops of a batch of videos, spreading the videos across worker processes.
+
+    :param videos: the video files
+    :param output_dir: the directory of the shards and of the manifest
+    :param input_background_path: the path to the input background image shared by all the videos
+    :param area_filer_out: the bounding boxes' areas that will not be considered for motion detection if smaller
+    :param background_mode: the background model (see `create_background_model`)
+    :param detection_scale: the scale at which the motion is detected (see `detect_bboxes`)
+    :param frame_step: the sampling step of the frames analyzed while no motion is found (see `detect_sampled_bboxes`)
+    :param n_negatives: the maximum number of background crops of each video
+    :param min_area: the minimum area of the background crops (by default, the area limit of the motion)
+    :param shard_size: the number of crops of each shard
+    :param workers: the number of worker processes (by default, the number of CPUs)
+    :param seed: the seed of the background crops; each video gets its own one, derived from it
+    :return: the manifest of the dataset
+    """
+    output_dir.mkdir(parents=True, exist_ok=True)
+    writer = ShardWriter(output_dir, shard_size)
+    manifest = {"parameters": {**get_motion_parameters(input_background_path, area_filer_out, background_mode,
+                                                       detection_scale, frame_step),
+                               "negatives": n_negatives, "min_area": min_area, "seed": seed,
+                               "crop_size": list(CROP_SIZE)},
+                "kinds": list(KINDS), "videos": list(), "shards": writer.shards}
+    seeds = np.random.SeedSequence(seed).spawn(len(videos))
+
+    # Spawn the workers, as the ones of the command line entry point.
+    context = multiprocessing.get_context("spawn")
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+        futures = {executor.submit(extract_training_crops, str(video_path), input_background_path, area_filer_out,
+                                   background_mode, detection_scale, frame_step, n_negatives, min_area,
+                                   int(video_seed.generate_state(1)[0])): (video_path, time.time())
+                   for video_path, video_seed in zip(videos, seeds)}
+
+        for done, future in enumerate(concurrent.futures.as_completed(futures), start=1):
+            video_path, t1 = futures[future]
+            try:
+                crops = future.result()
+            except Exception:
+                logging.exception(f"[{done}/{len(videos)}] {video_path}: failed")
+                manifest["videos"].append({"video": video_path.as_posix(), "status": "failed"})
+                continue
+
+            kinds = np.bincount(crops["kind"], minlength=len(KINDS)).tolist()
+            writer.add(len(manifest["videos"]), crops)
+            manifest["videos"].append({"video": video_path.as_posix(), "status": "processed",
+                                       **dict(zip(KINDS, kinds)), "elapsed": time.time() - t1})
+            logging.info(f"[{done}/{len(videos)}] {video_path}: {kinds[0]} motion and {kinds[1]} background crops")
+
+    writer.close()
+
+    tmp_path = output_dir / ".manifest.json"
+    with open(tmp_path, "w") as fp:
+        json.dump(manifest, fp, indent=2)
+    os.replace(tmp_path, output_dir / "manifest.json")
+
+    return manifest
+
+
+def load_shard(path: pathlib.Path) -> dict[str, np.ndarray]:
+    """
+    Load a shard of the dataset.
+
+    :param path: the path to the shard
+    :return: the RGB crops, their kind (index of `KINDS`), video (index of the manifest videos), frame and box
+    """
+    with np.load(path) as shard:
+        return {field: shard[field] for field in shard.files}
+
+
+def parse_args(args: Optional[list[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("inputs", nargs="+", help="video files, directories of videos or glob patterns")
+    parser.add_argument("--output-dir", default="crops", help="directory of the shards and of the manifest")
+    parser.add_argument("--background", default=None, help="background image shared by all the videos")
+    parser.add_argument("--background-mode", default="static", choices=list(BACKGROUND_MODES),
+                        help="background model used for detecting the motion")
+    parser.add_argument("--detection-scale", type=float, default=1.0, help="scale at which the motion is detected")
+    parser.add_argument("--frame-step", type=int, default=1, help="sampling step of the frames without motion")
+    parser.add_argument("--area-filter-out", type=int, default=3000, help="minimum area of the bounding boxes")
+    parser.add_argument("--negatives", type=int, default=20, help="maximum number of background crops of each video")
+    parser.add_argument("--min-area", type=int, default=None, help="minimum area of the background crops")
+    parser.add_argument("--shard-size", type=int, default=4096, help="number of crops of each shard")
+    parser.add_argument("--workers", type=int, default=None, help="number of worker processes")
+    parser.add_argument("--seed", type=int, default=42, help="seed of the background crops")
+
+    return parser.parse_args(args)
+
+
+def main(args: Optional[list[str]] = None):
+    args = parse_args(args)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    manifest = build_dataset(find_videos(args.inputs), pathlib.Path(args.output_dir),
+                             input_background_path=args.background, area_filer_out=args.area_filter_out,
+                             background_mode=args.background_mode, detection_scale=args.detection_scale,
+                             frame_step=args.frame_step, n_negatives=args.negatives, min_area=args.min_area,
+                             shard_size=args.shard_size, workers=args.workers, seed=args.seed)
+    print(f"{sum(s['crops'] for s in manifest['shards'])} crops in {len(manifest['shards'])} shards")
+
+
+if __name__ == "__main__":
+    main()
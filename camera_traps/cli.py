@@ -0,0 +1,367 @@
+"""
+Detect motion on a batch of videos from the command line, without the GUI.
+
+The motion detection of the videos (decoding, background difference and box merging) is spread across a pool of worker
+processes, while the crops are classified in the main process by a single shared classifier. One detections file is
+written for each video, together with a summary of all of them; the videos whose detections file already exists are
+skipped, so that an interrupted run can be resumed.
+
+Usage:
+
+    python -m camera_traps.cli path/to/videos "path/to/other/*.mp4" --output-dir detections --weights path/to/weights
+"""
+from typing import Optional
+import argparse
+import concurrent.futures
+import functools
+import glob
+import logging
+import multiprocessing
+import os
+import pathlib
+import time
+
+import numpy as np
+import pandas as pd
+
+from camera_traps.model.classifier import CLASSIFIER_BACKENDS, load_classifier
+from camera_traps.motion_detection.background import BACKGROUND_MODES
+from camera_traps.motion_detection.cache import DetectionCache
+from camera_traps.motion_detection.capture_motion import extract_motion, get_background_source, get_motion_parameters, \
+    get_video_properties, postprocess_detections, predict_cached_crops
+from camera_traps.motion_detection.detections import Detections
+from camera_traps.motion_detection.events import EventIndex
+from camera_traps.motion_detection.sink import read_detections, read_detections_with_probabilities, \
+    write_detections
+
+VIDEO_EXTENSIONS = (".mp4", ".avi", ".mov", ".mkv")
+
+
+def find_videos(inputs: list[str]) -> list[pathlib.Path]:
+    """
+    Get the video files from a list of directories, files or glob patterns.
+
+    :param inputs: the directories, files or glob patterns
+    :return: the sorted video files, without duplicates
+    """
+    videos = set()
+    for pattern in inputs:
+        for path in map(pathlib.Path, glob.glob(pattern, recursive=True)):
+            if path.is_dir():
+                videos.update(p for p in path.iterdir() if p.suffix.lower() in VIDEO_EXTENSIONS)
+            elif path.suffix.lower() in VIDEO_EXTENSIONS:
+                videos.add(path)
+
+    return sorted(videos)
+
+
+def get_videos_root(videos: list[pathlib.Path]) -> Optional[pathlib.Path]:
+    """
+    Get the deepest directory containing all the videos.
+
+    :param videos: the video files
+    :return: the absolute path to the common directory of the videos, if any
+    """
+    if not videos:
+        return None
+
+    return pathlib.Path(os.path.commonpath([os.path.abspath(v.parent) for v in videos]))
+
+
+def get_detections_path(output_dir: pathlib.Path, video_path: pathlib.Path, output_format: str = "csv",
+                        root: Optional[pathlib.Path] = None) -> pathlib.Path:
+    """
+    Get the path to the detections file of a video. The subdirectories of the videos below the root are mirrored in
+    the output directory, so that videos with the same name in different directories (e.g. `cam1/IMG_0001.mp4` and
+    `cam2/IMG_0001.mp4`) do not share the same detections file.
+
+    :param output_dir: the directory of the detections files
+    :param video_path: the path to the video file
+    :param output_format: the format of the detections file, 'csv' or 'parquet'
+    :param root: the directory the video paths are taken relative to (see `get_videos_root`); if not provided, the
+        detections file is named after the video only
+    :return: the path to the detections file
+    """
+    relative_path = pathlib.Path(os.path.abspath(video_path)).relative_to(root) if root is not None \
+        else pathlib.Path(video_path.name)
+
+    return output_dir / relative_path.with_suffix(f".{output_format}")
+
+
+def get_probabilities_path(path: pathlib.Path) -> pathlib.Path:
+    """
+    :param path: the path to a CSV detections file
+    :return: the path to the NumPy file of the class probabilities of its boxes, next to it
+    """
+    return path.with_suffix(".probabilities.npz")
+
+
+def save_detections(detections: Detections, path: pathlib.Path, metadata: Optional[dict] = None):
+    """
+    Save the detections of a video, without the fields only needed for drawing, but with the class probabilities of
+    the boxes (see `restore_detections`). The file is written atomically, so that a partially written file is never
+    mistaken for a completed video.
+
+    :param detections: the detected bounding boxes
+    :param path: the path to the detections file (.csv or .parquet); the class probabilities are stored in the
+        Parquet file itself, or in a NumPy file next to the CSV file (see `get_probabilities_path`)
+    :param metadata: the parameters of the run, stored only in the Parquet files
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".tmp")
+    if path.suffix == ".parquet":
+        write_detections(detections, tmp_path, metadata=metadata)
+    else:
+        if detections.probabilities is not None:
+            probabilities_path = get_probabilities_path(path)
+            with open(tmp_path, "wb") as fp:
+                np.savez(fp, probabilities=detections.probabilities, classes=np.asarray(detections.classes))
+            os.replace(tmp_path, probabilities_path)
+        detections.to_table().to_csv(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+
+def load_detections(path: pathlib.Path) -> pd.DataFrame:
+    """
+    Load the detections of a video.
+
+    :param path: the path to the detections file (.csv or .parquet)
+    :return: the DataFrame of the detections
+    """
+    return read_detections(path) if path.suffix == ".parquet" else pd.read_csv(path)
+
+
+def restore_detections(path: pathlib.Path) -> Detections:
+    """
+    Load the detections of a video together with the class probabilities of their boxes, so that they can be labeled
+    again with other thresholds without running the model, e.g. `restore_detections(path).relabel(80)`.
+
+    :param path: the path to the detections file (.csv or .parquet)
+    :return: the detected bounding boxes
+    """
+    if path.suffix == ".parquet":
+        return read_detections_with_probabilities(path)
+
+    probabilities, classes = None, None
+    if get_probabilities_path(path).exists():
+        with np.load(get_probabilities_path(path)) as stored:
+            probabilities, classes = stored["probabilities"], stored["classes"].tolist()
+
+    return Detections.from_table(pd.read_csv(path), probabilities=probabilities, classes=classes)
+
+
+def summarize(videos: list[pathlib.Path], output_dir: pathlib.Path, elapsed: dict, failed: set,
+              output_format: str = "csv", root: Optional[pathlib.Path] = None) -> pd.DataFrame:
+    """
+    Summarize the detections of all the videos.
+
+    :param videos: the video files
+    :param output_dir: the directory of the detections files
+    :param elapsed: the processing time (in seconds) of the videos processed in this run
+    :param failed: the videos that could not be processed
+    :param output_format: the format of the detections files, 'csv' or 'parquet'
+    :param root: the directory the video paths are taken relative to (see `get_detections_path`)
+    :return: the summary DataFrame, one row for each video
+    """
+    rows = []
+    for video_path in videos:
+        path = get_detections_path(output_dir, video_path, output_format, root)
+        row = {"video": video_path.as_posix(), "detections": path.relative_to(output_dir).as_posix(),
+               "status": "skipped", "boxes": None, "tracks": None, "labels": None, "elapsed": elapsed.get(video_path)}
+        if video_path in failed:
+            row["status"] = "failed"
+        else:
+            detections = load_detections(path)
+            labels = detections["label"].dropna()
+            row.update({"status": "processed" if video_path in elapsed else "skipped",
+                        "boxes": len(detections),
+                        "tracks": detections["track_index"].nunique(),
+                        "labels": ",".join(sorted(set(labels) - {"None_of_the_above"}))})
+        rows.append(row)
+
+    return pd.DataFrame(rows)
+
+
+def extract_motion_timed(*args, **kwargs) -> tuple[float, tuple[Detections, np.ndarray]]:
+    """
+    Run `extract_motion` in a worker process, recording when it actually starts (rather than when it is submitted).
+
+    :return: the start time of the motion detection, and its result
+    """
+    return time.time(), extract_motion(*args, **kwargs)
+
+
+def run_batch(videos: list[pathlib.Path], output_dir: pathlib.Path, input_background_path: Optional[str] = None,
+              area_filer_out: int = 3000, weights_path: Optional[str] = None, score_filter_out: float = 95,
+              tracked_prediction: bool = True, workers: Optional[int] = None,
+              background_mode: str = "static", detection_scale: float = 1.0, frame_step: int = 1,
+              output_format: str = "csv", cache_dir: Optional[str] = None,
+              cache_size: int = 10 * 2 ** 30, backend: str = "keras",
+              num_threads: Optional[int] = None, index_path: Optional[str] = None) -> pd.DataFrame:
+    """
+    Detect motion on a batch of videos, spreading the motion detection across worker processes and classifying the
+    crops with a single classifier in the current process.
+
+    :param videos: the video files
+    :param output_dir: the directory of the detections files, mirroring the subdirectories of the videos below their
+        common directory (see `get_detections_path`)
+    :param input_background_path: the path to the input background image shared by all the videos; if not provided a
+        background is automatically computed for each video
+    :param area_filer_out: the bounding boxes' areas that will not be considered for motion detection if smaller
+    :param weights_path: the path to the weights of the model for predicting the detected bounding boxes
+    :param score_filter_out: the model scores that will not be considered for output predictions if smaller
+    :param tracked_prediction: if activated an algorithm tracks the detected objected over time along the videos
+    :param workers: the number of worker processes (by default, the number of CPUs)
+    :param background_mode: the background model (see `create_background_model`)
+    :param detection_scale: the scale at which the motion is detected (see `detect_bboxes`)
+    :param frame_step: the sampling step of the frames analyzed while no motion is found (see `detect_sampled_bboxes`)
+    :param output_format: the format of the detections files: 'csv', or 'parquet' for storing the parameters of the run
+        too (it requires pyarrow)
+    :param cache_dir: the directory of the cache of the bounding boxes, crops and predictions; the videos whose motion
+        detection is cached are not decoded again
+    :param cache_size: the maximum size (in bytes) of the cache
+    :param backend: the inference backend of the classifier (see `load_classifier`)
+    :param num_threads: the number of CPU threads of the 'tflite' and 'onnx' backends
+    :param index_path: the path to the SQLite index of the events, where the tracks of each video are added as soon as
+        it is processed (see `camera_traps.motion_detection.events`)
+    :return: the summary DataFrame, one row for each video
+    """
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    root = get_videos_root(videos)
+    todo = [v for v in videos if not get_detections_path(output_dir, v, output_format, root).exists()]
+    logging.info(f"{len(videos) - len(todo)} of {len(videos)} videos already processed")
+
+    elapsed, failed = dict(), set()
+    classifier = load_classifier(weights_path, backend=backend, num_threads=num_threads) \
+        if weights_path and todo else None
+    metadata = {"background": get_background_source(input_background_path, background_mode),
+                "background_mode": background_mode,
+                "area_filer_out": area_filer_out,
+                "detection_scale": detection_scale,
+                "frame_step": frame_step,
+                "weights_id": classifier.weights_id if classifier is not None else None,
+                "score_filter_out": score_filter_out,
+                "tracked_prediction": tracked_prediction}
+
+    cache = DetectionCache(cache_dir, max_size=cache_size) if cache_dir else None
+    index = EventIndex(index_path) if index_path else None
+    motion_parameters = get_motion_parameters(input_background_path, area_filer_out, background_mode, detection_scale,
+                                              frame_step)
+
+    # Spawn the workers, so that they never inherit the state of the classifier.
+    context = multiprocessing.get_context("spawn")
+    max_workers = workers or os.cpu_count() or 1
+    with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers, mp_context=context) as executor:
+        extract = functools.partial(executor.submit, extract_motion_timed, input_background_path=input_background_path,
+                                    area_filer_out=area_filer_out, crop=classifier is not None or cache is not None,
+                                    background_mode=background_mode, detection_scale=detection_scale,
+                                    frame_step=frame_step)
+        # Keep only a few videos in flight, so that the memory does not grow with the batch: the crops of a video are
+        # held by its future until it is processed.
+        pending, futures, done = iter(todo), dict(), 0
+        while True:
+            while len(futures) < 2 * max_workers and (video_path := next(pending, None)) is not None:
+                cache_key = cache.get_key(str(video_path), motion_parameters) if cache is not None else None
+                if cache is not None and cache.contains(cache_key):
+                    # The cached motion detection is loaded only when the video is processed.
+                    future = concurrent.futures.Future()
+                    future.set_result(None)
+                else:
+                    future = extract(str(video_path))
+                futures[future] = (video_path, cache_key)
+            if not futures:
+                break
+
+            completed, _ = concurrent.futures.wait(futures, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in completed:
+                video_path, cache_key = futures.pop(future)
+                try:
+                    result = future.result()
+                    motion = cache.load_motion(cache_key) if result is None else None
+                    if result is None and motion is None:
+                        # The entry has been evicted in the meantime: detect the motion again.
+                        futures[extract(str(video_path))] = (video_path, cache_key)
+                        continue
+                    # The processing of a video starts when its worker starts, or now if it is cached.
+                    t1, (detections, crops) = (time.time(), motion) if result is None else result
+                    if cache is not None and result is not None:
+                        cache.save_motion(cache_key, detections, crops)
+                    if not detections.empty:
+                        predictions = predict_cached_crops(classifier, crops, cache, cache_key) \
+                            if classifier is not None else None
+                        detections = postprocess_detections(detections, predictions=predictions,
+                                                            labels=classifier.labels if classifier is not None
+                                                            else None,
+                                                            score_filter_out=score_filter_out,
+                                                            tracked_prediction=tracked_prediction)
+                    del crops
+                    save_detections(detections, get_detections_path(output_dir, video_path, output_format, root),
+                                    metadata={"video": video_path.as_posix(), **metadata})
+                    if index is not None:
+                        video, fps, *_ = get_video_properties(str(video_path))
+                        video.release()
+                        index.add_video(video_path.as_posix(), detections, fps, weights_id=metadata["weights_id"])
+                except Exception:
+                    done += 1
+                    logging.exception(f"[{done}/{len(todo)}] {video_path}: failed")
+                    failed.add(video_path)
+                    continue
+
+                done += 1
+                elapsed[video_path] = time.time() - t1
+                logging.info(f"[{done}/{len(todo)}] {video_path}: {len(detections)} boxes")
+
+    if index is not None:
+        index.close()
+
+    summary = summarize(videos, output_dir, elapsed, failed, output_format, root)
+    summary.to_csv(output_dir / "summary.csv", index=False)
+
+    return summary
+
+
+def parse_args(args: Optional[list[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("inputs", nargs="+", help="video files, directories of videos or glob patterns")
+    parser.add_argument("--output-dir", default="detections", help="directory of the detections files")
+    parser.add_argument("--background", default=None, help="background image shared by all the videos")
+    parser.add_argument("--background-mode", default="static", choices=list(BACKGROUND_MODES),
+                        help="background model used for detecting the motion")
+    parser.add_argument("--detection-scale", type=float, default=1.0, help="scale at which the motion is detected")
+    parser.add_argument("--frame-step", type=int, default=1, help="sampling step of the frames without motion")
+    parser.add_argument("--area-filter-out", type=int, default=3000, help="minimum area of the bounding boxes")
+    parser.add_argument("--weights", default=None, help="folder containing 'weights.h5' and 'labels' (or the "
+                                                         "exported model, for the other backends)")
+    parser.add_argument("--backend", default="keras", choices=list(CLASSIFIER_BACKENDS),
+                        help="inference backend of the classifier")
+    parser.add_argument("--threads", type=int, default=None, help="number of CPU threads of the classifier")
+    parser.add_argument("--score-filter-out", type=float, default=95, help="minimum score of the predictions")
+    parser.add_argument("--no-tracking", action="store_true", help="do not track the objects along the videos")
+    parser.add_argument("--workers", type=int, default=None, help="number of worker processes")
+    parser.add_argument("--format", default="csv", choices=["csv", "parquet"], help="format of the detections files")
+    parser.add_argument("--cache-dir", default=None, help="directory of the cache of the motion detection")
+    parser.add_argument("--cache-size", type=float, default=10, help="maximum size of the cache (GB)")
+    parser.add_argument("--index", default=None, help="SQLite index of the events of the processed videos")
+
+    return parser.parse_args(args)
+
+
+def main(args: Optional[list[str]] = None):
+    args = parse_args(args)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    videos = find_videos(args.inputs)
+    summary = run_batch(videos, pathlib.Path(args.output_dir), input_background_path=args.background,
+                        area_filer_out=args.area_filter_out, weights_path=args.weights,
+                        score_filter_out=args.score_filter_out, tracked_prediction=not args.no_tracking,
+                        workers=args.workers, background_mode=args.background_mode,
+                        detection_scale=args.detection_scale, frame_step=args.frame_step,
+                        output_format=args.format, cache_dir=args.cache_dir,
+                        cache_size=int(args.cache_size * 2 ** 30), backend=args.backend,
+                        num_threads=args.threads, index_path=args.index)
+    print(summary)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,15 @@
 import logging
 
-from camera_traps.motion_detection import gui
 from camera_traps.motion_detection.capture_motion import detect_motion_on_fixed_video
 
-app = gui.MenuGUI()
-app.mainloop()
-
 if __name__ == "__main__":
+    from camera_traps.motion_detection import gui
+
     logging.getLogger().setLevel(logging.INFO)
 
+    app = gui.MenuGUI()
+    app.mainloop()
+
     box_detection = detect_motion_on_fixed_video(input_video_path=app.videoLoc,
                                                  input_background_path=app.backgroundLoc,
                                                  area_filer_out=3000,
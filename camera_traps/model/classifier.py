@@ -0,0 +1,282 @@
+from typing import Any, Optional
+import functools
+import hashlib
+import os
+import pickle
+import time
+
+import numpy as np
+
+from camera_traps.motion_detection.crops import CropBuffer
+
+
+class Classifier:
+    """
+    Pretrained model for classifying the motion crops, built and loaded once so that it can be reused across videos.
+    """
+
+    def __init__(self, weights_path: str, input_shape: tuple = (128, 128, 3)):
+        """
+        :param weights_path: the path to the weights of the model; it must contain at least two files: 'weights.h5'
+            and 'labels'
+        :param input_shape: the input shape allowed by the model
+        """
+        # Import TensorFlow only when a model is actually built.
+        from camera_traps.model.model import efficientnet_b0
+
+        self.weights_path = weights_path
+        self.input_shape = input_shape
+
+        self.labels = load_labels(weights_path)
+        self.model = efficientnet_b0(num_classes=len(self.labels), input_shape=input_shape)
+        self.model.load_weights(f"{weights_path}/weights.h5")
+
+    def predict(self, crops: np.ndarray, batch_size: int = 32, verbose: int = 0) -> np.ndarray:
+        """
+        Classify a stack of crops.
+
+        :param crops: the (N, H, W, 3) array of RGB crops
+        :param batch_size: the number of crops predicted together
+        :param verbose: the verbosity of the prediction
+        :return: the (N, num_classes) array of the class probabilities
+        """
+        return self.model.predict(crops, batch_size=batch_size, verbose=verbose)
+
+    @functools.cached_property
+    def weights_id(self) -> str:
+        """
+        :return: the identifier of the weights, i.e. the hash of the weights file
+        """
+        return get_file_hash(f"{self.weights_path}/weights.h5")
+
+
+def load_labels(weights_path: str) -> list[str]:
+    """
+    :param weights_path: the path to the weights of the model, containing the 'labels' file
+    :return: the labels of the model, ordered as its outputs
+    """
+    with open(f"{weights_path}/labels", "rb") as fp:
+        return pickle.load(fp)
+
+
+class TFLiteClassifier:
+    """
+    Classifier running a TensorFlow Lite export of the model (see `camera_traps.model.export`) on CPU threads. The
+    light `tflite_runtime` package is used if installed, otherwise the interpreter of TensorFlow.
+    """
+
+    def __init__(self, weights_path: str, num_threads: Optional[int] = None):
+        """
+        :param weights_path: the path to the exported model; it must contain two files: 'model.tflite' and 'labels'
+        :param num_threads: the number of threads of the interpreter (by default, chosen by TensorFlow Lite)
+        """
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            from tensorflow.lite import Interpreter
+
+        self.weights_path = weights_path
+        self.labels = load_labels(weights_path)
+        self.interpreter = Interpreter(model_path=f"{weights_path}/model.tflite", num_threads=num_threads)
+        self.interpreter.allocate_tensors()
+        self.input_details = self.interpreter.get_input_details()[0]
+        self.output_details = self.interpreter.get_output_details()[0]
+        self.input_shape = tuple(self.input_details["shape"][1:])
+
+    def _invoke(self, batch: np.ndarray) -> np.ndarray:
+        if tuple(self.interpreter.get_input_details()[0]["shape"]) != batch.shape:
+            self.interpreter.resize_tensor_input(self.input_details["index"], batch.shape)
+            self.interpreter.allocate_tensors()
+
+        # Quantize the inputs and dequantize the outputs of the fully integer models.
+        scale, zero_point = self.input_details["quantization"]
+        if np.issubdtype(self.input_details["dtype"], np.integer):
+            batch = np.round(batch / scale + zero_point)
+        self.interpreter.set_tensor(self.input_details["index"], batch.astype(self.input_details["dtype"]))
+        self.interpreter.invoke()
+        outputs = self.interpreter.get_tensor(self.output_details["index"])
+        scale, zero_point = self.output_details["quantization"]
+        if np.issubdtype(self.output_details["dtype"], np.integer):
+            outputs = (outputs.astype(np.float32) - zero_point) * scale
+
+        return outputs.astype(np.float32)
+
+    def predict(self, crops: np.ndarray, batch_size: int = 32, verbose: int = 0) -> np.ndarray:
+        """
+        Classify a stack of crops.
+
+        :param crops: the (N, H, W, 3) array of RGB crops
+        :param batch_size: the number of crops predicted together
+        :param verbose: unused, for compatibility with the Keras classifier
+        :return: the (N, num_classes) array of the class probabilities
+        """
+        outputs = [self._invoke(np.asarray(crops[start:start + batch_size], dtype=np.float32))
+                   for start in range(0, len(crops), batch_size)]
+
+        return np.concatenate(outputs, axis=0) if outputs else np.empty((0, len(self.labels)), dtype=np.float32)
+
+    @functools.cached_property
+    def weights_id(self) -> str:
+        """
+        :return: the identifier of the weights, i.e. the hash of the exported model
+        """
+        return get_file_hash(f"{self.weights_path}/model.tflite")
+
+
+class ONNXClassifier:
+    """
+    Classifier running an ONNX export of the model (see `camera_traps.model.export`) with ONNX Runtime on CPU threads.
+    """
+
+    def __init__(self, weights_path: str, num_threads: Optional[int] = None):
+        """
+        :param weights_path: the path to the exported model; it must contain two files: 'model.onnx' and 'labels'
+        :param num_threads: the number of threads of the session (by default, chosen by ONNX Runtime)
+        """
+        import onnxruntime
+
+        self.weights_path = weights_path
+        self.labels = load_labels(weights_path)
+        options = onnxruntime.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = onnxruntime.InferenceSession(f"{weights_path}/model.onnx", sess_options=options,
+                                                    providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+        self.input_shape = tuple(self.session.get_inputs()[0].shape[1:])
+
+    def predict(self, crops: np.ndarray, batch_size: int = 32, verbose: int = 0) -> np.ndarray:
+        """
+        Classify a stack of crops.
+
+        :param crops: the (N, H, W, 3) array of RGB crops
+        :param batch_size: the number of crops predicted together
+        :param verbose: unused, for compatibility with the Keras classifier
+        :return: the (N, num_classes) array of the class probabilities
+        """
+        outputs = [self.session.run(None, {self.input_name: np.asarray(crops[start:start + batch_size],
+                                                                        dtype=np.float32)})[0]
+                   for start in range(0, len(crops), batch_size)]
+
+        return np.concatenate(outputs, axis=0) if outputs else np.empty((0, len(self.labels)), dtype=np.float32)
+
+    @functools.cached_property
+    def weights_id(self) -> str:
+        """
+        :return: the identifier of the weights, i.e. the hash of the exported model
+        """
+        return get_file_hash(f"{self.weights_path}/model.onnx")
+
+
+CLASSIFIER_BACKENDS = {
+    "keras": lambda weights_path, num_threads: Classifier(weights_path),
+    "tflite": TFLiteClassifier,
+    "onnx": ONNXClassifier,
+}
+
+
+def get_file_hash(path: str, chunk_size: int = 1 << 20) -> str:
+    """
+    Compute the SHA-256 hash of a file, reading it in chunks.
+
+    :param path: the path to the file
+    :param chunk_size: the number of bytes read at a time
+    :return: the hexadecimal digest
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as fp:
+        while chunk := fp.read(chunk_size):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+@functools.lru_cache(maxsize=None)
+def _load_classifier(weights_path: str, backend: str, num_threads: Optional[int]) -> Classifier:
+    return CLASSIFIER_BACKENDS[backend](weights_path, num_threads)
+
+
+def load_classifier(weights_path: str, backend: str = "keras", num_threads: Optional[int] = None) -> Classifier:
+    """
+    Get the classifier of the provided weights, building it only the first time it is requested.
+
+    :param weights_path: the path to the weights of the model (or to the exported model, for the other backends)
+    :param backend: the inference backend: 'keras' (the TensorFlow model), 'tflite' (TensorFlow Lite export) or 'onnx'
+        (ONNX export, run by ONNX Runtime)
+    :param num_threads: the number of CPU threads of the 'tflite' and 'onnx' backends
+    :return: the cached classifier
+    """
+    if backend not in CLASSIFIER_BACKENDS:
+        raise ValueError(f"Unknown classifier backend: {backend}; choose one of {list(CLASSIFIER_BACKENDS)}")
+
+    return _load_classifier(os.path.abspath(weights_path), backend, num_threads)
+
+
+class ClassificationQueue:
+    """
+    Micro-batching queue that collects the crops of consecutive frames and classifies them together as soon as either
+    the batch is full or the oldest queued frame has waited too long. The results are handed back per frame, in the
+    same order in which the frames were queued.
+    """
+
+    def __init__(self, classifier: Classifier, max_batch_size: int = 32, max_latency: float = 0.5):
+        """
+        :param classifier: the classifier of the crops
+        :param max_batch_size: the number of queued crops that triggers a prediction
+        :param max_latency: the maximum time (in seconds) a frame can be queued before triggering a prediction
+        """
+        self.classifier = classifier
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency
+
+        self._pending = []
+        # The queued crops are copied into a preallocated buffer, whose view is given to the classifier.
+        self._crops = CropBuffer(capacity=max_batch_size)
+        self._oldest = None
+
+    def put(self, key: Any, crops: np.ndarray) -> list[tuple[Any, Optional[np.ndarray]]]:
+        """
+        Queue the crops of a frame.
+
+        :param key: the identifier of the frame handed back with its predictions
+        :param crops: the (N, H, W, 3) array of the RGB crops of the frame
+        :return: the frames whose predictions have been completed, as a list of keys and predictions (None if the
+            frame has no crops)
+        """
+        if not self._pending:
+            self._oldest = time.monotonic()
+        self._pending.append((key, len(crops)))
+        self._crops.extend(crops)
+
+        return self.poll()
+
+    def poll(self) -> list[tuple[Any, Optional[np.ndarray]]]:
+        """
+        Classify the queued crops if the batch is full or the latency limit is reached.
+
+        :return: the frames whose predictions have been completed, as a list of keys and predictions
+        """
+        if not self._pending:
+            return []
+        if len(self._crops) >= self.max_batch_size or time.monotonic() - self._oldest >= self.max_latency:
+            return self.flush()
+
+        return []
+
+    def flush(self) -> list[tuple[Any, Optional[np.ndarray]]]:
+        """
+        Classify all the queued crops.
+
+        :return: the frames whose predictions have been completed, as a list of keys and predictions
+        """
+        predictions = self.classifier.predict(self._crops.crops, batch_size=self.max_batch_size) \
+            if len(self._crops) else None
+
+        results, offset = [], 0
+        for key, n_crops in self._pending:
+            results.append((key, predictions[offset:offset + n_crops] if n_crops else None))
+            offset += n_crops
+        self._pending, self._oldest = [], None
+        self._crops.clear()
+
+        return results
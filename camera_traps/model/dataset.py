@@ -0,0 +1,77 @@
+"""
+Index and split of the training dataset, as done by the training notebook (`notebooks/classification/training.ipynb`):
+the dataset folder contains one sub-folder of images for each label, and the images are named as
+
+    {referenceNameDataset}_{nameLabel}_{timeCondition}_{progressiveIndex}.jpg
+"""
+import pathlib
+
+import numpy as np
+import pandas as pd
+import cv2
+from sklearn.model_selection import train_test_split
+from sklearn.utils import resample
+
+
+def get_dataset_index(dataset_path: str) -> pd.DataFrame:
+    """
+    List the images of the dataset with their label, source dataset and time condition. The 'chicken' and 'horse'
+    images are labeled as 'None_of_the_above'.
+
+    :param dataset_path: the path to the dataset folder
+    :return: the DataFrame of the images (filename, label, dataset and time columns)
+    """
+    data = []
+    for file in pathlib.Path(dataset_path).glob("*/*"):
+        data.append({"filename": file.resolve().as_posix(), "label": file.resolve().parent.name})
+    df = pd.DataFrame(data, columns=["filename", "label"])
+
+    df[["dataset", "time"]] = df["filename"].str.split("/").str[-1].str.extract(r"^([^_]+)_[^_]+_([^_]+)")
+    df.loc[df["label"].isin(["chicken", "horse"]), "label"] = "None_of_the_above"
+
+    return df
+
+
+def split_dataset(df: pd.DataFrame, test_size: float = 0.2, random_state: int = 42) \
+        -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Balance the classes of the dataset (all the 'None_of_the_above' images being kept) and split it into training and
+    validation sets, stratified by label, source dataset and time condition.
+
+    :param df: the DataFrame of the images (see `get_dataset_index`)
+    :param test_size: the fraction of the images used for validation
+    :param random_state: the seed of the sampling and of the split
+    :return: the training and the validation DataFrames
+    """
+    df_classes = df.query("label != 'None_of_the_above'")
+    min_count = df_classes.groupby("label")["filename"].nunique().min()
+
+    def balance_dataset(x):
+        return resample(x, replace=False, n_samples=min(min_count, len(x)), random_state=random_state,
+                        stratify=x[["dataset", "time"]])
+
+    df_balanced = df_classes.groupby("label", group_keys=False).apply(balance_dataset)
+    df_balanced = df_balanced.sample(frac=1, random_state=random_state)
+    df_balanced.reset_index(drop=True, inplace=True)
+    df_balanced = pd.concat([df_balanced, df.query("label == 'None_of_the_above'")], axis=0, ignore_index=True)
+
+    df_train, df_valid = train_test_split(df_balanced, test_size=test_size, shuffle=True, random_state=random_state,
+                                          stratify=df_balanced[["label", "dataset", "time"]])
+
+    return df_train, df_valid
+
+
+def load_images(filenames: list[str], image_size: tuple[int, int] = (128, 128)) -> np.ndarray:
+    """
+    Load images as model inputs, the same way the motion crops are prepared (see `crop_bboxes`).
+
+    :param filenames: the paths to the images
+    :param image_size: the width and the height of the model inputs
+    :return: the (N, H, W, 3) array of the RGB images
+    """
+    images = np.empty((len(filenames), image_size[1], image_size[0], 3), dtype=np.uint8)
+    for i, filename in enumerate(filenames):
+        image = cv2.cvtColor(cv2.imread(filename), cv2.COLOR_BGR2RGB)
+        images[i] = cv2.resize(image, image_size)
+
+    return images
@@ -0,0 +1,117 @@
+"""
+Export the trained classifier for the CPU inference backends (see `load_classifier`): TensorFlow Lite, optionally
+quantized, or ONNX. The exported model is written to a folder together with the labels, so that the folder can be used
+as the weights path of the 'tflite' or 'onnx' backend.
+
+Quantization modes of the TensorFlow Lite export:
+
+- 'dynamic': int8 weights, float activations;
+- 'float16': float16 weights;
+- 'int8': int8 weights and activations, calibrated on a representative set of images (e.g. the training images); the
+  inputs and outputs of the model stay float.
+
+Usage:
+
+    python -m camera_traps.model.export path/to/weights path/to/export --format tflite --quantization int8 \
+        --representative-dataset path/to/dataset
+"""
+from typing import Optional
+import argparse
+import os
+import shutil
+
+import numpy as np
+
+from camera_traps.model.classifier import Classifier
+from camera_traps.model.dataset import get_dataset_index, split_dataset, load_images
+
+QUANTIZATIONS = (None, "dynamic", "float16", "int8")
+
+
+def export_tflite(weights_path: str, output_path: str, quantization: Optional[str] = None,
+                  representative_images: Optional[np.ndarray] = None):
+    """
+    Convert the trained classifier to TensorFlow Lite.
+
+    :param weights_path: the path to the weights of the model; it must contain 'weights.h5' and 'labels'
+    :param output_path: the folder where 'model.tflite' and 'labels' are written
+    :param quantization: the quantization mode: None, 'dynamic', 'float16' or 'int8'
+    :param representative_images: the (N, H, W, 3) array of RGB images used for calibrating the 'int8' quantization
+    """
+    import tensorflow as tf
+
+    if quantization not in QUANTIZATIONS:
+        raise ValueError(f"Unknown quantization: {quantization}; choose one of {list(QUANTIZATIONS)}")
+    if quantization == "int8" and representative_images is None:
+        raise ValueError("The int8 quantization requires representative images")
+
+    classifier = Classifier(weights_path)
+    converter = tf.lite.TFLiteConverter.from_keras_model(classifier.model)
+    if quantization is not None:
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if quantization == "float16":
+        converter.target_spec.supported_types = [tf.float16]
+    elif quantization == "int8":
+        converter.representative_dataset = lambda: ([image[np.newaxis].astype(np.float32)]
+                                                    for image in representative_images)
+    model = converter.convert()
+
+    os.makedirs(output_path, exist_ok=True)
+    with open(f"{output_path}/model.tflite", "wb") as fp:
+        fp.write(model)
+    shutil.copy(f"{weights_path}/labels", f"{output_path}/labels")
+
+
+def export_onnx(weights_path: str, output_path: str, opset: int = 13):
+    """
+    Convert the trained classifier to ONNX (it requires tf2onnx).
+
+    :param weights_path: the path to the weights of the model; it must contain 'weights.h5' and 'labels'
+    :param output_path: the folder where 'model.onnx' and 'labels' are written
+    :param opset: the ONNX opset version
+    """
+    import tensorflow as tf
+    import tf2onnx
+
+    classifier = Classifier(weights_path)
+    os.makedirs(output_path, exist_ok=True)
+    # Keep the batch size dynamic.
+    signature = (tf.TensorSpec((None, *classifier.input_shape), tf.float32, name="input"),)
+    tf2onnx.convert.from_keras(classifier.model, input_signature=signature, opset=opset,
+                               output_path=f"{output_path}/model.onnx")
+    shutil.copy(f"{weights_path}/labels", f"{output_path}/labels")
+
+
+def get_representative_images(dataset_path: str, n_images: int = 200, random_state: int = 42) -> np.ndarray:
+    """
+    Sample the training images used for calibrating the quantization.
+
+    :param dataset_path: the path to the dataset folder
+    :param n_images: the number of images
+    :param random_state: the seed of the split and of the sampling
+    :return: the (N, 128, 128, 3) array of RGB images
+    """
+    df_train, _ = split_dataset(get_dataset_index(dataset_path), random_state=random_state)
+    df_sample = df_train.sample(n=min(n_images, len(df_train)), random_state=random_state)
+
+    return load_images(df_sample["filename"].tolist())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("weights", help="folder containing 'weights.h5' and 'labels'")
+    parser.add_argument("output", help="folder of the exported model")
+    parser.add_argument("--format", default="tflite", choices=["tflite", "onnx"], help="format of the exported model")
+    parser.add_argument("--quantization", default=None, choices=QUANTIZATIONS[1:],
+                        help="quantization of the TensorFlow Lite model")
+    parser.add_argument("--representative-dataset", default=None,
+                        help="dataset folder whose training images calibrate the int8 quantization")
+    parser.add_argument("--representative-size", type=int, default=200, help="number of calibration images")
+    args = parser.parse_args()
+
+    if args.format == "onnx":
+        export_onnx(args.weights, args.output)
+    else:
+        images = get_representative_images(args.representative_dataset, args.representative_size) \
+            if args.representative_dataset else None
+        export_tflite(args.weights, args.output, quantization=args.quantization, representative_images=images)
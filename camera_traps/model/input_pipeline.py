@@ -0,0 +1,271 @@
+"""
+`tf.data` input pipeline of the classifier training, replacing the `ImageDataGenerator.flow_from_dataframe` of the
+training notebook (`notebooks/classification/training.ipynb`).
+
+The images of each split (see `camera_traps.model.dataset.split_dataset`) are decoded and resized in parallel only
+once, and written as raw uint8 arrays into TFRecord shards. The shards of a split are stored in a directory named after
+the hash of its images, labels and image size, together with a manifest, so that they are reused by the following
+runs. At every epoch the shards are read in parallel, shuffled, optionally rebalanced by label and augmented, batched
+and prefetched, so that no image is decoded again.
+
+The labels are one-hot encoded in alphabetical order, as the classes of `flow_from_dataframe`, and the images are
+float32 in the range [0, 255], as expected by `EfficientNetB0`. Unlike `flow_from_dataframe` (nearest neighbor), the
+images are resized with the bilinear interpolation, the same way the motion crops are prepared at inference.
+
+Usage:
+
+    python -m camera_traps.model.input_pipeline path/to/dataset --cache-dir path/to/cache --image-size 224 224
+"""
+from typing import Optional
+import argparse
+import hashlib
+import json
+import os
+import pathlib
+import shutil
+import time
+import uuid
+
+import numpy as np
+import pandas as pd
+import tensorflow as tf
+
+from camera_traps.model.dataset import get_dataset_index, split_dataset
+
+AUTOTUNE = tf.data.AUTOTUNE
+
+
+def get_labels(df: pd.DataFrame) -> list[str]:
+    """
+    :param df: the DataFrame of the images (see `get_dataset_index`)
+    :return: the labels of the model, in the alphabetical order of the classes of `flow_from_dataframe`
+    """
+    return sorted(df["label"].unique())
+
+
+def get_shards_key(df: pd.DataFrame, labels: list[str], image_size: tuple[int, int]) -> str:
+    """
+    Get the key of the shards of a split.
+
+    :param df: the DataFrame of the images of the split
+    :param labels: the labels of the model
+    :param image_size: the width and the height of the images
+    :return: the hash of the images, of the labels and of the image size
+    """
+    digest = hashlib.sha256(json.dumps({"labels": labels, "image_size": list(image_size)}).encode())
+    for filename, label in sorted(zip(df["filename"], df["label"])):
+        digest.update(f"{filename}\0{label}\0".encode())
+
+    return digest.hexdigest()
+
+
+def decode_image(filename: tf.Tensor, image_size: tuple[int, int]) -> tf.Tensor:
+    """
+    Decode and resize an image.
+
+    :param filename: the path to the image
+    :param image_size: the width and the height of the output image
+    :return: the uint8 RGB image
+    """
+    image = tf.io.decode_image(tf.io.read_file(filename), channels=3, expand_animations=False)
+    image = tf.image.resize(image, (image_size[1], image_size[0]), method="bilinear")
+
+    return tf.cast(tf.clip_by_value(tf.round(image), 0, 255), tf.uint8)
+
+
+def write_shards(df: pd.DataFrame, labels: list[str], cache_dir: str, image_size: tuple[int, int] = (224, 224),
+                 num_shards: int = 16) -> pathlib.Path:
+    """
+    Decode and resize the images of a split in parallel and write them into TFRecord shards, unless they have been
+    written already.
+
+    :param df: the DataFrame of the images of the split (filename and label columns)
+    :param labels: the labels of the model
+    :param cache_dir: the directory of the shards
+    :param image_size: the width and the height of the images
+    :param num_shards: the number of shards, read in parallel
+    :return: the directory of the shards of the split
+    """
+    cache_dir = pathlib.Path(cache_dir)
+    entry = cache_dir / get_shards_key(df, labels, image_size)
+    if (entry / "manifest.json").exists():
+        return entry
+
+    label_index = {label: i for i, label in enumerate(labels)}
+    images = tf.data.Dataset.from_tensor_slices((df["filename"].tolist(),
+                                                 df["label"].map(label_index).to_numpy(dtype=np.int64)))
+    images = images.map(lambda filename, label: (decode_image(filename, image_size), label),
+                        num_parallel_calls=AUTOTUNE)
+
+    # Write the shards aside, so that partially written shards are never read.
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    tmp_entry = cache_dir / f".{entry.name}.{uuid.uuid4().hex}"
+    tmp_entry.mkdir()
+    num_shards = max(1, min(num_shards, len(df)))
+    shards = [f"shard-{i:05d}.tfrecord" for i in range(num_shards)]
+    writers = [tf.io.TFRecordWriter(str(tmp_entry / shard)) for shard in shards]
+    counts = np.zeros(len(labels), dtype=int)
+    try:
+        for i, (image, label) in enumerate(images.as_numpy_iterator()):
+            example = tf.train.Example(features=tf.train.Features(feature={
+                "image": tf.train.Feature(bytes_list=tf.train.BytesList(value=[image.tobytes()])),
+                "label": tf.train.Feature(int64_list=tf.train.Int64List(value=[label]))}))
+            writers[i % num_shards].write(example.SerializeToString())
+            counts[label] += 1
+    finally:
+        for writer in writers:
+            writer.close()
+
+    manifest = {"image_size": list(image_size), "labels": labels, "shards": shards, "images": int(counts.sum()),
+                "counts": counts.tolist()}
+    with open(tmp_entry / "manifest.json", "w") as fp:
+        json.dump(manifest, fp, indent=2)
+
+    shutil.rmtree(entry, ignore_errors=True)
+    os.replace(tmp_entry, entry)
+
+    return entry
+
+
+def read_shards(entry: pathlib.Path, shuffle: bool = False, seed: Optional[int] = None) \
+        -> tuple[tf.data.Dataset, dict]:
+    """
+    Read the images of a split from its shards.
+
+    :param entry: the directory of the shards of the split (see `write_shards`)
+    :param shuffle: whether to shuffle the order of the shards and to interleave them non-deterministically
+    :param seed: the seed of the shuffling
+    :return: the dataset of the uint8 images and of the label indices, and the manifest of the shards
+    """
+    with open(entry / "manifest.json") as fp:
+        manifest = json.load(fp)
+    width, height = manifest["image_size"]
+
+    files = tf.data.Dataset.from_tensor_slices([str(entry / shard) for shard in manifest["shards"]])
+    if shuffle:
+        files = files.shuffle(len(manifest["shards"]), seed=seed)
+    records = files.interleave(tf.data.TFRecordDataset, cycle_length=len(manifest["shards"]),
+                               num_parallel_calls=AUTOTUNE, deterministic=not shuffle)
+    features = {"image": tf.io.FixedLenFeature([], tf.string), "label": tf.io.FixedLenFeature([], tf.int64)}
+
+    def parse(record):
+        example = tf.io.parse_single_example(record, features)
+        image = tf.reshape(tf.io.decode_raw(example["image"], tf.uint8), (height, width, 3))
+
+        return image, example["label"]
+
+    return records.map(parse, num_parallel_calls=AUTOTUNE), manifest
+
+
+def random_color_distortion(images: tf.Tensor, brightness_max_delta: float = 0.2,
+                            saturation_delta: tuple[float, float] = (0.5, 0.9), hue_max_delta: float = 0.2,
+                            contrast_delta: tuple[float, float] = (0.5, 0.9), seed: Optional[int] = None) -> tf.Tensor:
+    """
+    Apply the random color distortion of the `RandomColorDistortion` layer of the training notebook, in the input
+    pipeline instead of in the model.
+
+    :param images: the float images
+    :param brightness_max_delta: the maximum delta of the brightness
+    :param saturation_delta: the lower and upper bound of the saturation factor
+    :param hue_max_delta: the maximum delta of the hue
+    :param contrast_delta: the lower and upper bound of the contrast factor
+    :param seed: the seed of the distortions
+    :return: the distorted images
+    """
+    images = tf.image.random_brightness(images, brightness_max_delta, seed=seed)
+    images = tf.image.random_saturation(images, saturation_delta[0], saturation_delta[1], seed=seed)
+    images = tf.image.random_hue(images, hue_max_delta, seed=seed)
+    images = tf.image.random_contrast(images, contrast_delta[0], contrast_delta[1], seed=seed)
+
+    return images
+
+
+def make_dataset(df: pd.DataFrame, labels: list[str], cache_dir: str, image_size: tuple[int, int] = (224, 224),
+                 batch_size: int = 32, training: bool = True, balance: bool = False, color_distortion: bool = False,
+                 shuffle_buffer: int = 4096, num_shards: int = 16, seed: Optional[int] = 42) -> tf.data.Dataset:
+    """
+    Build the input pipeline of a split.
+
+    :param df: the DataFrame of the images of the split (filename and label columns)
+    :param labels: the labels of the model (see `get_labels`)
+    :param cache_dir: the directory of the shards of the decoded images (see `write_shards`)
+    :param image_size: the width and the height of the images
+    :param batch_size: the number of images of each batch
+    :param training: whether the images are shuffled (and augmented, if requested) at every epoch
+    :param balance: whether to draw the training images so that every label is equally frequent, by rejection
+        resampling; an epoch still has as many batches as the images of the split
+    :param color_distortion: whether to apply the random color distortion to the training batches (see
+        `random_color_distortion`)
+    :param shuffle_buffer: the number of images shuffled together
+    :param num_shards: the number of shards, read in parallel
+    :param seed: the seed of the shuffling, of the resampling and of the distortion
+    :return: the dataset of the float32 image batches and of the one-hot label batches
+    """
+    entry = write_shards(df, labels, cache_dir, image_size, num_shards)
+    dataset, manifest = read_shards(entry, shuffle=training, seed=seed)
+
+    if training:
+        dataset = dataset.shuffle(shuffle_buffer, seed=seed, reshuffle_each_iteration=True)
+    if training and balance:
+        counts = np.asarray(manifest["counts"], dtype=np.float32)
+        target_dist = (counts > 0).astype(np.float32) / (counts > 0).sum()
+        dataset = dataset.repeat().rejection_resample(lambda image, label: tf.cast(label, tf.int32),
+                                                      target_dist=target_dist, initial_dist=counts / counts.sum(),
+                                                      seed=seed)
+        dataset = dataset.map(lambda label, example: example, num_parallel_calls=AUTOTUNE)
+
+    dataset = dataset.batch(batch_size, drop_remainder=training and balance)
+    if training and balance:
+        dataset = dataset.take(manifest["images"] // batch_size)
+    dataset = dataset.map(lambda images, label: (tf.cast(images, tf.float32),
+                                                 tf.one_hot(label, depth=len(labels))),
+                          num_parallel_calls=AUTOTUNE)
+    if training and color_distortion:
+        dataset = dataset.map(lambda images, label: (random_color_distortion(images, seed=seed), label),
+                              num_parallel_calls=AUTOTUNE)
+
+    return dataset.prefetch(AUTOTUNE)
+
+
+def make_datasets(dataset_path: str, cache_dir: str, image_size: tuple[int, int] = (224, 224),
+                  batch_size: int = 32, balance: bool = False, color_distortion: bool = False,
+                  random_state: int = 42) -> tuple[tf.data.Dataset, tf.data.Dataset, list[str]]:
+    """
+    Build the training and validation pipelines of a dataset folder, split as in the training notebook (see
+    `split_dataset`).
+
+    :param dataset_path: the path to the dataset folder
+    :param cache_dir: the directory of the shards of the decoded images
+    :param image_size: the width and the height of the images
+    :param batch_size: the number of images of each batch
+    :param balance: whether to draw the training images so that every label is equally frequent
+    :param color_distortion: whether to apply the random color distortion to the training batches
+    :param random_state: the seed of the split and of the training pipeline
+    :return: the training and the validation datasets, and the labels of the model
+    """
+    df_train, df_valid = split_dataset(get_dataset_index(dataset_path), random_state=random_state)
+    labels = get_labels(df_train)
+
+    train = make_dataset(df_train, labels, cache_dir, image_size, batch_size, training=True, balance=balance,
+                         color_distortion=color_distortion, seed=random_state)
+    valid = make_dataset(df_valid, labels, cache_dir, image_size, batch_size, training=False)
+
+    return train, valid, labels
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("dataset", help="dataset folder")
+    parser.add_argument("--cache-dir", required=True, help="directory of the shards of the decoded images")
+    parser.add_argument("--image-size", type=int, nargs=2, default=[224, 224], help="width and height of the images")
+    parser.add_argument("--batch-size", type=int, default=32, help="number of images of each batch")
+    parser.add_argument("--balance", action="store_true", help="rebalance the training images by label")
+    parser.add_argument("--epochs", type=int, default=2, help="number of epochs iterated for measuring their time")
+    args = parser.parse_args()
+
+    train, valid, labels = make_datasets(args.dataset, args.cache_dir, tuple(args.image_size), args.batch_size,
+                                         balance=args.balance)
+    for epoch in range(args.epochs):
+        t1 = time.perf_counter()
+        n_images = sum(len(images) for images, _ in train)
+        print(f"Epoch {epoch + 1}: {n_images} images in {time.perf_counter() - t1:.1f} s")
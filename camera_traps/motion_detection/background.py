@@ -0,0 +1,178 @@
+from typing import Optional
+
+import numpy as np
+import cv2
+
+
+def get_motion_mask(difference: np.ndarray) -> np.ndarray:
+    """
+    Turn a grayscale difference image into a binary mask of the moving regions.
+
+    :param difference: the grayscale difference image
+    :return: the binary mask (0 or 255) of the moving regions
+    """
+    frame = cv2.GaussianBlur(difference, (11, 11), 0)
+    _, thresh = cv2.threshold(frame, 20, 255, cv2.THRESH_BINARY)
+    # Dilate the threshold image to fill in holes.
+    thresh = cv2.dilate(thresh, None, iterations=2)
+
+    return thresh
+
+
+def get_difference_mask(frame1: np.ndarray, frame2: np.ndarray) -> np.ndarray:
+    """
+    Calculate the binary mask of the pixel difference between two input images.
+
+    :param frame1: the first input image
+    :param frame2: the second input image
+    :return: the binary mask (0 or 255) of the pixels that differ between the two images
+    """
+    frame = cv2.absdiff(frame1, frame2)
+    frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+
+    return get_motion_mask(frame)
+
+
+def resize_frame(frame: np.ndarray, scale: float) -> np.ndarray:
+    """
+    Downscale (or upscale) a frame by a given factor.
+
+    :param frame: the input frame
+    :param scale: the scale factor
+    :return: the resized frame
+    """
+    if scale == 1:
+        return frame
+
+    # The area interpolation is fast only for halving the frame, while the bilinear one is accurate enough for
+    # detecting the motion on smaller frames, which are blurred anyway.
+    interpolation = cv2.INTER_AREA if scale >= 0.5 else cv2.INTER_LINEAR
+
+    return cv2.resize(frame, None, fx=scale, fy=scale, interpolation=interpolation)
+
+
+class StaticBackground:
+    """
+    Compare every frame against the same background image.
+
+    At a detection scale smaller than 1, the background is downscaled, converted to grayscale and blurred only once,
+    so that for each frame only the (much smaller) frame itself has to be prepared before the difference.
+    """
+
+    def __init__(self, background: np.ndarray, scale: float = 1.0):
+        """
+        :param background: the background image
+        :param scale: the scale at which the motion is detected
+        """
+        self.scale = scale
+        self.blur_size = max(3, int(round(11 * scale)) | 1)
+        self.background = background if scale == 1 else self._prepare(background)
+
+    def _prepare(self, frame: np.ndarray) -> np.ndarray:
+        frame = cv2.cvtColor(resize_frame(frame, self.scale), cv2.COLOR_BGR2GRAY)
+
+        return cv2.GaussianBlur(frame, (self.blur_size, self.blur_size), 0)
+
+    def apply(self, frame: np.ndarray) -> np.ndarray:
+        """
+        :param frame: the current frame
+        :return: the binary mask (0 or 255) of the moving regions of the frame, at the detection scale
+        """
+        if self.scale == 1:
+            return get_difference_mask(self.background, frame)
+
+        frame = cv2.absdiff(self.background, self._prepare(frame))
+        _, thresh = cv2.threshold(frame, 20, 255, cv2.THRESH_BINARY)
+        # Dilate the threshold image to fill in holes.
+        thresh = cv2.dilate(thresh, None, iterations=2)
+
+        return thresh
+
+
+class RunningAverageBackground:
+    """
+    Compare every frame against an exponential running average of the previous frames, so that the background follows
+    slow lighting changes (e.g. dawn or clouds) instead of turning them into frame-wide differences.
+    """
+
+    def __init__(self, background: Optional[np.ndarray] = None, alpha: float = 0.005, scale: float = 1.0):
+        """
+        :param background: the initial background image; if not provided, the first frame is used
+        :param alpha: the weight of the current frame in the running average
+        :param scale: the scale at which the motion is detected
+        """
+        self.alpha = alpha
+        self.scale = scale
+        self.average = resize_frame(background, scale).astype(np.float32) if background is not None else None
+
+    def apply(self, frame: np.ndarray) -> np.ndarray:
+        """
+        :param frame: the current frame
+        :return: the binary mask (0 or 255) of the moving regions of the frame, at the detection scale
+        """
+        frame = resize_frame(frame, self.scale)
+        if self.average is None:
+            self.average = frame.astype(np.float32)
+
+        mask = get_difference_mask(cv2.convertScaleAbs(self.average), frame)
+        cv2.accumulateWeighted(frame, self.average, self.alpha)
+
+        return mask
+
+
+class SubtractorBackground:
+    """
+    Compare every frame against an OpenCV background subtractor (MOG2 or KNN), which models each pixel as a mixture of
+    the values observed over the recent history.
+    """
+
+    def __init__(self, background: Optional[np.ndarray] = None, method: str = "mog2", history: int = 500,
+                 scale: float = 1.0):
+        """
+        :param background: the background image used for priming the subtractor, if provided
+        :param method: the background subtractor, 'mog2' or 'knn'
+        :param history: the number of recent frames modeled by the subtractor
+        :param scale: the scale at which the motion is detected
+        """
+        self.scale = scale
+        if method == "mog2":
+            self.subtractor = cv2.createBackgroundSubtractorMOG2(history=history, detectShadows=False)
+        elif method == "knn":
+            self.subtractor = cv2.createBackgroundSubtractorKNN(history=history, detectShadows=False)
+        else:
+            raise ValueError(f"Unknown background subtractor: {method}")
+
+        if background is not None:
+            self.subtractor.apply(resize_frame(background, scale), learningRate=1)
+
+    def apply(self, frame: np.ndarray) -> np.ndarray:
+        """
+        :param frame: the current frame
+        :return: the binary mask (0 or 255) of the moving regions of the frame, at the detection scale
+        """
+        return get_motion_mask(self.subtractor.apply(resize_frame(frame, self.scale)))
+
+
+BACKGROUND_MODES = {
+    "static": StaticBackground,
+    "running_average": RunningAverageBackground,
+    "mog2": lambda background, scale: SubtractorBackground(background, method="mog2", scale=scale),
+    "knn": lambda background, scale: SubtractorBackground(background, method="knn", scale=scale),
+}
+
+
+def create_background_model(background_mode: str, background: Optional[np.ndarray] = None, scale: float = 1.0):
+    """
+    Create the background model that provides the motion mask of each frame.
+
+    :param background_mode: the background model: 'static' (fixed background image), 'running_average' (exponential
+        running average of the frames), 'mog2' or 'knn' (OpenCV background subtractors)
+    :param background: the background image; it is required by the 'static' mode and used as initial background by
+        the other ones
+    :param scale: the scale at which the motion is detected; the masks are computed on frames resized by this factor
+    :return: the background model
+    """
+    if background_mode not in BACKGROUND_MODES:
+        raise ValueError(f"Unknown background mode: {background_mode}; choose one of {list(BACKGROUND_MODES)}")
+
+    return BACKGROUND_MODES[background_mode](background, scale=scale)
@@ -0,0 +1,186 @@
+"""
+Content-addressed on-disk cache of the motion detection, so that re-running a video with a different score threshold or
+tracking option does not decode it again.
+
+Each entry is a directory named after the hash of the video content and of the motion parameters; it contains the
+bounding boxes (`boxes.npy`), their crops (`crops.npy`, loaded memory-mapped) and the model predictions of the crops,
+one file for each weights hash (`predictions-<weights_id>.npy`). The total size of the cache is capped: when it is
+exceeded, the least recently used entries are evicted.
+
+A video is hashed only the first time it is seen: its hash is stored in a small SQLite table (`hashes.sqlite`) together
+with the path, the size and the modification time of the file, so that a cache hit costs a `stat` instead of a full
+read of the video.
+"""
+from typing import Optional
+import hashlib
+import json
+import os
+import pathlib
+import shutil
+import sqlite3
+import uuid
+
+import numpy as np
+
+from camera_traps.model.classifier import get_file_hash
+from camera_traps.motion_detection.detections import Detections
+
+
+class DetectionCache:
+    """
+    On-disk cache of the bounding boxes, crops and predictions of the videos.
+    """
+
+    def __init__(self, cache_dir: str, max_size: int = 10 * 2 ** 30):
+        """
+        :param cache_dir: the directory of the cache
+        :param max_size: the maximum size (in bytes) of the cache
+        """
+        self.cache_dir = pathlib.Path(cache_dir)
+        self.max_size = max_size
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self._hashes = sqlite3.connect(self.cache_dir / "hashes.sqlite", timeout=30)
+        self._hashes.execute("CREATE TABLE IF NOT EXISTS hashes "
+                             "(path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, hash TEXT)")
+
+    def get_video_hash(self, video_path: str) -> str:
+        """
+        Get the hash of the content of a video, reading the whole file only if it has not been hashed yet with its
+        current size and modification time.
+
+        :param video_path: the path to the video file
+        :return: the SHA-256 hash of the video file
+        """
+        path, stat = os.path.abspath(video_path), os.stat(video_path)
+        row = self._hashes.execute("SELECT hash FROM hashes WHERE path = ? AND size = ? AND mtime_ns = ?",
+                                   (path, stat.st_size, stat.st_mtime_ns)).fetchone()
+        if row is not None:
+            return row[0]
+
+        video_hash = get_file_hash(video_path)
+        with self._hashes:
+            self._hashes.execute("INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?)",
+                                 (path, stat.st_size, stat.st_mtime_ns, video_hash))
+
+        return video_hash
+
+    def get_key(self, video_path: str, parameters: dict) -> str:
+        """
+        Get the key of the motion detection of a video.
+
+        :param video_path: the path to the video file
+        :param parameters: the parameters the motion detection depends on (JSON serializable)
+        :return: the hash of the video content and of the parameters
+        """
+        digest = hashlib.sha256(self.get_video_hash(video_path).encode())
+        digest.update(json.dumps(parameters, sort_keys=True).encode())
+
+        return digest.hexdigest()
+
+    def _touch(self, entry: pathlib.Path):
+        # The modification time of an entry is its last use.
+        os.utime(entry)
+
+    def contains(self, key: str) -> bool:
+        """
+        :param key: the key of the motion detection (see `get_key`)
+        :return: whether the bounding boxes and the crops of a video are cached, without loading them
+        """
+        return (self.cache_dir / key / "crops.npy").exists()
+
+    def load_motion(self, key: str) -> Optional[tuple[Detections, np.ndarray]]:
+        """
+        Load the bounding boxes and the crops of a video.
+
+        :param key: the key of the motion detection (see `get_key`)
+        :return: the detected bounding boxes and the memory-mapped array of their crops, if cached
+        """
+        entry = self.cache_dir / key
+        if not (entry / "crops.npy").exists():
+            return None
+        self._touch(entry)
+
+        boxes = np.load(entry / "boxes.npy")
+        crops = np.load(entry / "crops.npy", mmap_mode="r")
+
+        return Detections.from_boxes(boxes[:, 0], boxes[:, 1:]), crops
+
+    def save_motion(self, key: str, detections: Detections, crops: np.ndarray):
+        """
+        Store the bounding boxes and the crops of a video, evicting the least recently used entries if needed.
+
+        :param key: the key of the motion detection (see `get_key`)
+        :param detections: the detected bounding boxes
+        :param crops: the (N, H, W, 3) array of the crops of the bounding boxes
+        """
+        # Write the entry aside, so that a partially written entry is never loaded.
+        tmp_entry = self.cache_dir / f".{key}.{uuid.uuid4().hex}"
+        tmp_entry.mkdir()
+        np.save(tmp_entry / "boxes.npy", np.column_stack([detections.id_frame, detections.boxes]).astype(np.int32))
+        np.save(tmp_entry / "crops.npy", np.asarray(crops, dtype=np.uint8))
+
+        entry = self.cache_dir / key
+        shutil.rmtree(entry, ignore_errors=True)
+        os.replace(tmp_entry, entry)
+
+        self.evict(keep=key)
+
+    def load_predictions(self, key: str, weights_id: str) -> Optional[np.ndarray]:
+        """
+        Load the model predictions of the crops of a video.
+
+        :param key: the key of the motion detection (see `get_key`)
+        :param weights_id: the identifier of the model weights
+        :return: the predictions of the crops, if cached
+        """
+        path = self.cache_dir / key / f"predictions-{weights_id}.npy"
+        if not path.exists():
+            return None
+        self._touch(path.parent)
+
+        return np.load(path)
+
+    def save_predictions(self, key: str, weights_id: str, predictions: np.ndarray):
+        """
+        Store the model predictions of the crops of a video, whose motion detection must be cached already.
+
+        :param key: the key of the motion detection (see `get_key`)
+        :param weights_id: the identifier of the model weights
+        :param predictions: the predictions of the crops
+        """
+        entry = self.cache_dir / key
+        if not entry.exists():
+            return
+
+        tmp_path = entry / f".predictions-{weights_id}.{uuid.uuid4().hex}.npy"
+        np.save(tmp_path, predictions)
+        os.replace(tmp_path, entry / f"predictions-{weights_id}.npy")
+
+        self.evict(keep=key)
+
+    def get_entries(self) -> list[tuple[pathlib.Path, float, int]]:
+        """
+        :return: the cache entries with their last use time and their size (in bytes), the least recently used first
+        """
+        entries = list()
+        for entry in self.cache_dir.iterdir():
+            if entry.is_dir() and not entry.name.startswith("."):
+                size = sum(f.stat().st_size for f in entry.iterdir())
+                entries.append((entry, entry.stat().st_mtime, size))
+
+        return sorted(entries, key=lambda e: e[1])
+
+    def evict(self, keep: Optional[str] = None):
+        """
+        Delete the least recently used entries until the cache size is within the limit.
+
+        :param keep: the key of an entry that must not be evicted (e.g. the one just written)
+        """
+        entries = self.get_entries()
+        size = sum(e[2] for e in entries)
+        for entry, _, entry_size in entries:
+            if size <= self.max_size:
+                break
+            if entry.name != keep:
+                shutil.rmtree(entry, ignore_errors=True)
+                size -= entry_size
@@ -1,18 +1,27 @@
-from typing import Union, Optional
-import pickle
+from typing import Optional, Iterable, Iterator
+import concurrent.futures
 import logging
+import multiprocessing
+import queue
+import threading
 import time
 
-import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
 import cv2
 
-from camera_traps.motion_detection.geometry_utils import compose_polygon, get_bbox_without_intersection, expand_bbox
-from camera_traps.motion_detection.tracking_objects import tracking
-from camera_traps.model.model import efficientnet_b0
+from camera_traps.motion_detection.background import create_background_model, get_difference_mask
+from camera_traps.motion_detection.detections import Detections
+from camera_traps.motion_detection.geometry_utils import merge_bboxes, expand_bbox, rescale_bboxes
+from camera_traps.motion_detection.sink import write_detections
+from camera_traps.motion_detection.cache import DetectionCache
+from camera_traps.motion_detection.events import EventIndex
+from camera_traps.motion_detection.crops import CropBuffer
+from camera_traps.motion_detection.metrics import PipelineMetrics, NULL_METRICS
+from camera_traps.model.classifier import Classifier, ClassificationQueue, get_file_hash, load_classifier
 
-cmap = plt.get_cmap("Set1")
+# The percentage by which the detected bounding boxes are expanded before being cropped.
+EXPANSION_PERCENTAGE = 0
 
 
 def get_video_properties(video_path: str) -> tuple[cv2.VideoCapture, int, int, int]:
@@ -32,28 +41,56 @@ def get_video_properties(video_path: str) -> tuple[cv2.VideoCapture, int, int, i
     return video, fps, width, height
 
 
-def get_background(video_path: str, n_frames: int = 50) -> np.array:
+def get_background(video_path: str, n_frames: int = 50, seed: Optional[int] = None, max_skip: int = 250) -> np.array:
     """
     Retrieves the background frame from a video by calculating the median of randomly selected frames.
 
+    The selected frames are read in ascending order: the video is moved forward decoding frames without retrieving
+    them (grab) when the next selected frame is close, and it is seeked only when it is far, since every seek decodes
+    the video again from the previous keyframe. The median is computed on horizontal strips of the uint8 frames, so
+    that the floating point temporaries stay small regardless of the resolution.
+
     :param video_path: path to the video file
     :param n_frames: number of frames to randomly select for calculating the median
+    :param seed: the seed for selecting the frames; if provided, the background is reproducible
+    :param max_skip: the maximum number of frames skipped by decoding them instead of seeking
     :return: the computed background frame
+    :raises ValueError: if no frame of the video can be read
     """
     # Open video.
     video = cv2.VideoCapture(video_path)
+    num_frames = max(int(video.get(cv2.CAP_PROP_FRAME_COUNT)), 0)
     # We will randomly select some frames for the calculating the median.
-    frame_indices = video.get(cv2.CAP_PROP_FRAME_COUNT) * np.random.uniform(size=n_frames)
+    rng = np.random.default_rng(seed)
+    frame_indices = np.sort(rng.choice(num_frames, size=min(n_frames, num_frames), replace=False))
     # We will store the frames in array.
-    frames = []
-    for idx in frame_indices:
-        # Set the frame id to read that particular frame.
-        video.set(cv2.CAP_PROP_POS_FRAMES, idx)
-        ret, frame = video.read()
-        if frame is not None:
-            frames.append(frame)
-    # Calculate the median.
-    median_frame = np.median(frames, axis=0).astype(np.uint8)
+    frames = None
+    n_read, position = 0, 0
+    for idx in frame_indices.tolist():
+        if idx - position > max_skip:
+            # Set the frame id to read that particular frame.
+            video.set(cv2.CAP_PROP_POS_FRAMES, idx)
+            position = idx
+        while position < idx and video.grab():
+            position += 1
+        success, frame = video.read()
+        position += 1
+        if not success:
+            continue
+        if frames is None:
+            frames = np.empty((len(frame_indices), *frame.shape), dtype=np.uint8)
+        frames[n_read] = frame
+        n_read += 1
+    video.release()
+    if n_read == 0:
+        raise ValueError(f"Cannot compute the background of {video_path}: no frame could be read")
+    frames = frames[:n_read]
+
+    # Calculate the median, a strip of rows at a time.
+    median_frame = np.empty(frames.shape[1:], dtype=np.uint8)
+    strip = max(1, 2 ** 24 // (frames[0, 0].size * n_read * 8))
+    for row in range(0, len(median_frame), strip):
+        median_frame[row:row + strip] = np.median(frames[:, row:row + strip], axis=0)
 
     return median_frame
 
@@ -66,192 +103,806 @@ def get_pixel_difference(frame1: np.ndarray, frame2: np.ndarray) -> list[np.ndar
     :param frame2: the second input image
     :return: list of contours representing the pixel differences between the two images
     """
-    frame = cv2.absdiff(frame1, frame2)
-    frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-    frame = cv2.GaussianBlur(frame, (11, 11), 0)
-    _, thresh = cv2.threshold(frame, 20, 255, cv2.THRESH_BINARY)
-    # Dilate the threshold image to fill in holes, then find contours on threshold image.
-    thresh = cv2.dilate(thresh, None, iterations=2)
-    # Get all the found contours.
-    contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    return get_contours(get_difference_mask(frame1, frame2))
+
+
+def get_contours(mask: np.ndarray) -> list[np.ndarray]:
+    """
+    Find the external contours of the moving regions of a binary mask.
+
+    :param mask: the binary mask of the moving regions
+    :return: list of contours of the moving regions
+    """
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
 
     return contours
 
 
-def get_color_by_label_or_index(label: Union[int, str]) -> tuple[int, ...]:
+def load_background(input_video_path: str, input_background_path: Optional[str] = None,
+                    background_mode: str = "static") -> Optional[np.ndarray]:
     """
-    Return a color based on some predefined label's name or index conditions.
+    Load the background image or compute it from the video if not provided. The OpenCV background subtractors ('mog2'
+    and 'knn' modes) learn the background by themselves, so it is not computed for them.
 
-    :param label: the provided label or index
-    :return: the color associated to the provided label or index
+    :param input_video_path: the path to input video file (e.g. .mp4, .avi, etc.)
+    :param input_background_path: the path to the input background image
+    :param background_mode: the background model (see `create_background_model`)
+    :return: the background image, if any
     """
-    if isinstance(label, int):
-        return tuple([int(c * 255) for c in cmap.colors[label % 9]])
-    elif isinstance(label, str):
-        if label == "human":
-            return 0, 255, 0
-        elif label == "vehicle":
-            return 0, 0, 255
-        elif label in ["cat", "dog"]:
-            return 255, 165, 0
-        else:
-            return 255, 0, 0
+    if input_background_path:
+        return cv2.imread(input_background_path)
+    elif background_mode in ("static", "running_average"):
+        return get_background(video_path=input_video_path)
+    else:
+        return None
 
 
-def get_primary_label(labels: pd.Series, min_count: int = 3, min_occurrence: float = 25):
+def get_background_source(input_background_path: Optional[str] = None, background_mode: str = "static") \
+        -> Optional[str]:
     """
+    Describe where the background of a run comes from (see `load_background`).
 
-    :param labels: a pandas Series containing labels string, ideally for a unique tracked object
-    :param min_count: the minimum number of labels count of the tracked object to be considered valid
-    :param min_occurrence:
-    :return:
+    :param input_background_path: the path to the input background image
+    :param background_mode: the background model (see `create_background_model`)
+    :return: the path to the background image, 'video' if the background is computed from the video or None if the
+        background model learns it by itself
     """
-    occurrences = labels.value_counts(normalize=True, dropna=False).mul(100)
-    if len(labels) >= min_count and occurrences.max() > min_occurrence:
-        return occurrences.idxmax()
+    if input_background_path:
+        return input_background_path
+    elif background_mode in ("static", "running_average"):
+        return "video"
     else:
-        return "None_of_the_above"
+        return None
 
 
-def detect_motion_on_fixed_video(input_video_path: str, input_background_path: Optional[str] = None,
-                                 area_filer_out: int = 3000, weights_path: Optional[str] = None,
-                                 score_filter_out: float = 95, tracked_prediction: bool = True,
-                                 output_video_path: Optional[str] = "output.mp4") -> pd.DataFrame:
+def get_motion_parameters(input_background_path: Optional[str] = None, area_filer_out: int = 3000,
+                          background_mode: str = "static", detection_scale: float = 1.0, frame_step: int = 1) -> dict:
     """
-    Detect motion searching difference between current frame and a provided background or an average frame along
-    all video. The bounding boxes that identify a motion are given as input to the prediction model in order to
-    classify them.
+    Collect the parameters the bounding boxes and the crops of a video depend on, e.g. for caching them.
 
-    # TODO: Change model: improve time consuming performances.
-    # TODO: Change approach for detecting motion and corresponding bounding boxes.
-
-    :param input_video_path: the path to input video file (e.g. .mp4, .avi, etc.)
-    :param input_background_path: the path to the input background image; if not provided a background is
-        automatically computed averaging frames along the provided video
+    :param input_background_path: the path to the input background image
     :param area_filer_out: the bounding boxes' areas that will not be considered for motion detection if smaller
-    :param weights_path: the path to the weights of the model for predicting the detected bounding boxes; it must
-        contain at least two files: 'weights.h5' and 'labels'
-    :param score_filter_out: the model scores that will not be considered for output predictions if smaller
-    :param tracked_prediction: if activated an algorithm tracks the detected objected over time along the video
-    :param output_video_path: the path to output file (.mp4)
-    :return:
+    :param background_mode: the background model (see `create_background_model`)
+    :param detection_scale: the scale at which the motion is detected (see `detect_bboxes`)
+    :param frame_step: the sampling step of the frames analyzed while no motion is found (see `detect_sampled_bboxes`)
+    :return: the parameters of the motion detection
     """
-    # Open video.
-    video, fps, width, height = get_video_properties(video_path=input_video_path)
+    return {"background": get_file_hash(input_background_path) if input_background_path
+            else get_background_source(input_background_path, background_mode),
+            "background_mode": background_mode,
+            "area_filer_out": area_filer_out,
+            "detection_scale": detection_scale,
+            "frame_step": frame_step,
+            "expansion_percentage": EXPANSION_PERCENTAGE}
+
+
+def predict_cached_crops(classifier: Classifier, crops: np.ndarray, cache: Optional[DetectionCache] = None,
+                         cache_key: Optional[str] = None, verbose: int = 0,
+                         metrics: Optional[PipelineMetrics] = None) -> np.ndarray:
+    """
+    Classify the crops of a video, reusing the cached predictions of the same weights if available.
+
+    :param classifier: the classifier of the crops
+    :param crops: the (N, 128, 128, 3) array of the RGB crops
+    :param cache: the cache of the motion detection
+    :param cache_key: the key of the motion detection of the video (see `DetectionCache.get_key`)
+    :param verbose: the verbosity of the prediction
+    :param metrics: the metrics of the pipeline (see `camera_traps.motion_detection.metrics`)
+    :return: the (N, num_classes) array of the class probabilities
+    """
+    metrics = metrics or NULL_METRICS
+    predictions = cache.load_predictions(cache_key, classifier.weights_id) if cache is not None else None
+    if predictions is None:
+        with metrics.time("classify"):
+            predictions = classifier.predict(crops, batch_size=32, verbose=verbose)
+        metrics.count("crops_classified", len(crops))
+        if cache is not None:
+            cache.save_predictions(cache_key, classifier.weights_id, predictions)
 
-    # Create background.
-    if input_background_path:
-        background = cv2.imread(input_background_path)
-    else:
-        background = get_background(video_path=input_video_path)
+    return predictions
 
-    t1 = time.time()
 
-    num_frames = 0
-    list_frames = list()
-    ids, bboxes, coordinates = list(), list(), list()
+def read_frames(video: cv2.VideoCapture) -> Iterator[np.ndarray]:
+    """
+    Decode the frames of an opened OpenCV video one at a time.
+
+    :param video: the opened OpenCV video
+    :return: a generator over the decoded frames
+    """
     while video.isOpened():
         success, frame = video.read()
 
         if not success:
             break
 
-        # Get difference between current frame and background image.
-        contours = get_pixel_difference(background, frame)
-        # Filter out based on area limit and get polygons.
-        polygons = [compose_polygon(*cv2.boundingRect(c)) for c in contours if cv2.contourArea(c) > area_filer_out]
-        # Get polygons without intersection.
-        bbox_coordinates = get_bbox_without_intersection(polygons)
-
-        # Loop over the box coordinates.
-        for x, y, w, h in bbox_coordinates:
-            new_x, new_y, new_w, new_h = expand_bbox(x, y, w, h, percentage=0)
-            # Get bounding box image.
-            box = frame[new_y:new_y + new_h, new_x:new_x + new_w]
-            box = cv2.cvtColor(box, cv2.COLOR_BGR2RGB)
-            box = cv2.resize(box, (128, 128))
-            # Store bounding boxes data.
-            ids.append(num_frames)
-            bboxes.append(box)
-            coordinates.append((new_x, new_y, new_w, new_h))
-
-        num_frames += 1
-
-        # Add frame.
-        list_frames.append(frame)
-
-    # Store results.
-    box_detection = pd.DataFrame({"id_frame": ids,
-                                  "box": coordinates,
-                                  "score": None,
-                                  "label": None,
-                                  "color_label": None,
-                                  "centroid": None,
-                                  "track_index": None,
-                                  "color_track": None})
-
-    if box_detection.empty:
-        return box_detection
-
-    if weights_path:
-        # Load pretrained model.
-        with open(f"{weights_path}/labels", "rb") as fp:
-            labels = pickle.load(fp)
-        trained_model = efficientnet_b0(num_classes=len(labels), input_shape=(128, 128, 3))
-        trained_model.load_weights(f"{weights_path}/weights.h5")
-
-        # Get predictions.
-        predictions = trained_model.predict(np.stack(bboxes, axis=0), batch_size=32, verbose=1)
-        # Get the best predictions.
-        box_detection["score"] = np.max(predictions, axis=1)
-        box_detection["label"] = np.argmax(predictions, axis=1)
-        # Postprocessing.
-        labels = {i: label for i, label in enumerate(labels)}
-        box_detection["score"] = box_detection["score"].round(2) * 100
-        box_detection["label"] = box_detection["label"].map(labels)
-        # Filter on prediction score.
-        box_detection.loc[box_detection["score"] < score_filter_out, "label"] = "None_of_the_above"
+        yield frame
+
+
+def find_bboxes(frame: np.ndarray, background_model, area_filer_out: int, detection_scale: float = 1.0,
+                metrics: Optional[PipelineMetrics] = None) -> list[tuple[int, int, int, int]]:
+    """
+    Find the bounding boxes of the motion detected on a frame.
+
+    :param frame: the frame to analyze
+    :param background_model: the background model (see `create_background_model`)
+    :param area_filer_out: the bounding boxes' areas that will not be considered for motion detection if smaller
+    :param detection_scale: the scale at which the background model detects the motion; the bounding boxes (and the
+        area limit) are rescaled to the original resolution of the frame
+    :param metrics: the metrics of the pipeline (see `camera_traps.motion_detection.metrics`)
+    :return: the x and y coordinates of the upper left corner, the width and the height of the bounding boxes
+    """
+    metrics = metrics or NULL_METRICS
+    # Get difference between current frame and background image.
+    with metrics.time("difference"):
+        mask = background_model.apply(frame)
+    with metrics.time("contours"):
+        contours = get_contours(mask)
+        # Filter out based on area limit and get bounding rectangles.
+        rectangles = [cv2.boundingRect(c) for c in contours
+                      if cv2.contourArea(c) > area_filer_out * detection_scale ** 2]
+    # Get bounding boxes without intersection.
+    with metrics.time("merge"):
+        bbox_coordinates = merge_bboxes(np.array(rectangles))
+        bbox_coordinates = rescale_bboxes(bbox_coordinates, detection_scale, frame.shape[1], frame.shape[0])
+        bbox_coordinates = [expand_bbox(x, y, w, h, percentage=EXPANSION_PERCENTAGE)
+                            for x, y, w, h in bbox_coordinates.tolist()]
+    metrics.count("contours", len(contours))
+    metrics.count("boxes_area_filtered", len(rectangles))
+    metrics.count("boxes", len(bbox_coordinates))
+
+    return bbox_coordinates
+
+
+def detect_bboxes(frames: Iterable[np.ndarray], background: Optional[np.ndarray], area_filer_out: int,
+                  start: int = 0, background_mode: str = "static", detection_scale: float = 1.0,
+                  metrics: Optional[PipelineMetrics] = None) \
+        -> Iterator[tuple[int, np.ndarray, list[tuple[int, int, int, int]]]]:
+    """
+    Find the bounding boxes of the motion detected on each frame by comparing it against a background image.
+
+    :param frames: the frames to analyze, in video order
+    :param background: the background image
+    :param area_filer_out: the bounding boxes' areas that will not be considered for motion detection if smaller
+    :param start: the index of the first frame
+    :param background_mode: the background model (see `create_background_model`)
+    :param detection_scale: the scale at which the motion is detected; the bounding boxes (and the area limit) are
+        rescaled to the original resolution of the frames
+    :param metrics: the metrics of the pipeline (see `camera_traps.motion_detection.metrics`)
+    :return: a generator over the frame index, the frame itself and the bounding boxes found on it
+    """
+    metrics = metrics or NULL_METRICS
+    background_model = create_background_model(background_mode, background, scale=detection_scale)
+    for id_frame, frame in enumerate(frames, start=start):
+        coordinates = find_bboxes(frame, background_model, area_filer_out, detection_scale, metrics)
+        metrics.count("frames")
+        metrics.frame_done(id_frame)
+
+        yield id_frame, frame, coordinates
+
+
+def detect_sampled_bboxes(video: cv2.VideoCapture, background: Optional[np.ndarray], area_filer_out: int,
+                          frame_step: int = 1, start: int = 0, stop: Optional[int] = None,
+                          background_mode: str = "static", detection_scale: float = 1.0,
+                          metrics: Optional[PipelineMetrics] = None) \
+        -> Iterator[tuple[int, Optional[np.ndarray], list[tuple[int, int, int, int]]]]:
+    """
+    Find the bounding boxes of the motion detected on the frames of a video, gating the processing on the motion
+    itself: while no motion is found, only one frame every `frame_step` is decoded and analyzed, while the other ones
+    are skipped without decoding them (grab). As soon as a motion is found, every frame is analyzed until a frame
+    without motion is found again. The skipped frames never follow a frame with motion, so the tracks are not
+    interrupted by them: a motion is only detected up to `frame_step - 1` frames later than it starts.
+
+    :param video: the opened OpenCV video, positioned on the first frame to analyze
+    :param background: the background image
+    :param area_filer_out: the bounding boxes' areas that will not be considered for motion detection if smaller
+    :param frame_step: the sampling step of the frames analyzed while no motion is found (1 analyzes every frame)
+    :param start: the index of the first frame
+    :param stop: the index of the frame after the last one to analyze; if not provided, the analysis ends with the video
+    :param background_mode: the background model (see `create_background_model`)
+    :param detection_scale: the scale at which the motion is detected (see `detect_bboxes`)
+    :param metrics: the metrics of the pipeline (see `camera_traps.motion_detection.metrics`)
+    :return: a generator over the frame index, the frame itself (None if skipped) and the bounding boxes found on it
+    """
+    metrics = metrics or NULL_METRICS
+    background_model = create_background_model(background_mode, background, scale=detection_scale)
+
+    motion, n_skipped = False, 0
+    id_frame = start
+    while video.isOpened() and (stop is None or id_frame < stop):
+        if motion or (id_frame - start) % frame_step == 0:
+            with metrics.time("decode"):
+                success, frame = video.read()
+            if not success:
+                break
+            coordinates = find_bboxes(frame, background_model, area_filer_out, detection_scale, metrics)
+            motion = bool(coordinates)
+            metrics.count("frames")
+            metrics.frame_done(id_frame)
+
+            yield id_frame, frame, coordinates
+        else:
+            with metrics.time("decode"):
+                success = video.grab()
+            if not success:
+                break
+            n_skipped += 1
+            metrics.count("frames_skipped")
+
+            yield id_frame, None, []
+        id_frame += 1
+
+    if frame_step > 1:
+        logging.info(f"Skipped {n_skipped} of {id_frame - start} frames "
+                     f"({n_skipped / max(id_frame - start, 1):.1%}) without motion")
+
+
+def crop_bboxes(frame: np.ndarray, coordinates: list[tuple[int, int, int, int]],
+                metrics: Optional[PipelineMetrics] = None, buffer: Optional[CropBuffer] = None) -> np.ndarray:
+    """
+    Cut the bounding boxes out of a frame and prepare them as input images for the prediction model.
+
+    :param frame: the frame (BGR) containing the bounding boxes
+    :param coordinates: the x and y coordinates of the upper left corner, the width and the height of the boxes
+    :param metrics: the metrics of the pipeline (see `camera_traps.motion_detection.metrics`)
+    :param buffer: the buffer the crops are appended to; they are converted to RGB later, together with the other
+        crops of the buffer (see `CropBuffer.to_rgb`). If not provided, the crops are converted right away
+    :return: the (N, 128, 128, 3) view of the crops resized to 128x128, RGB unless a buffer is provided
+    """
+    metrics = metrics or NULL_METRICS
+    with metrics.time("crop"):
+        if buffer is not None:
+            return buffer.add(frame, coordinates)
+
+        buffer = CropBuffer(capacity=len(coordinates))
+        buffer.add(frame, coordinates)
+
+        return buffer.to_rgb()
+
+
+def detect_bboxes_in_range(input_video_path: str, background: Optional[np.ndarray], area_filer_out: int, start: int,
+                           stop: Optional[int] = None, crop: bool = True, background_mode: str = "static",
+                           detection_scale: float = 1.0, frame_step: int = 1,
+                           metrics: Optional[PipelineMetrics] = None) \
+        -> list[tuple[int, list[tuple[int, int, int, int]], list[np.ndarray]]]:
+    """
+    Find the bounding boxes of the motion detected on a range of frames of a video, seeking directly to the first one.
+
+    :param input_video_path: the path to input video file (e.g. .mp4, .avi, etc.)
+    :param background: the background image
+    :param area_filer_out: the bounding boxes' areas that will not be considered for motion detection if smaller
+    :param start: the index of the first frame of the range
+    :param stop: the index of the frame after the last one of the range; if not provided, the range ends with the video
+    :param crop: whether to cut the crops of the bounding boxes
+    :param background_mode: the background model (see `create_background_model`); the adaptive ones start learning
+        again from the provided background at the beginning of the range
+    :param detection_scale: the scale at which the motion is detected
+    :param frame_step: the sampling step of the frames analyzed while no motion is found (see `detect_sampled_bboxes`);
+        the sampled frames are the same of a run over the whole video, so the range is analyzed from the last sampled
+        frame before its start, whose results are discarded
+    :param metrics: the metrics of the pipeline (see `camera_traps.motion_detection.metrics`)
+    :return: the frame index, the bounding boxes and the related crops (if requested) of each frame of the range
+    """
+    # A sampled frame is always analyzed, and the frames after it only depend on it: starting from the last one, the
+    # frames of the range are skipped or analyzed as in a sequential run, even if the range starts on a skipped frame.
+    first = start - start % frame_step
+    video, *_ = get_video_properties(video_path=input_video_path)
+    video.set(cv2.CAP_PROP_POS_FRAMES, first)
+
+    # The crops of the range are cut into a single buffer and handed back as views of it, once converted to RGB.
+    buffer = CropBuffer()
+    detections = []
+    for id_frame, frame, coordinates in detect_sampled_bboxes(video, background, area_filer_out,
+                                                              frame_step=frame_step, start=first, stop=stop,
+                                                              background_mode=background_mode,
+                                                              detection_scale=detection_scale, metrics=metrics):
+        if id_frame < start:
+            continue
+        offset = len(buffer)
+        if crop:
+            crop_bboxes(frame, coordinates, metrics, buffer)
+        detections.append((id_frame, coordinates, (offset, len(buffer))))
+
+    video.release()
+
+    with (metrics or NULL_METRICS).time("crop"):
+        crops = buffer.to_rgb()
+
+    return [(id_frame, coordinates, crops[first:last] if crop else [])
+            for id_frame, coordinates, (first, last) in detections]
+
+
+def _detect_bboxes_in_range_with_metrics(*args) \
+        -> tuple[list[tuple[int, list[tuple[int, int, int, int]], list[np.ndarray]]], dict, dict]:
+    # Collect the metrics of a worker process, which are merged back by the parent one.
+    metrics = PipelineMetrics()
+    detections = detect_bboxes_in_range(*args, metrics=metrics)
+
+    return detections, dict(metrics.timings), dict(metrics.counters)
+
+
+def detect_bboxes_parallel(input_video_path: str, background: Optional[np.ndarray], area_filer_out: int, n_jobs: int,
+                           crop: bool = True, background_mode: str = "static", detection_scale: float = 1.0,
+                           frame_step: int = 1, metrics: Optional[PipelineMetrics] = None) \
+        -> Iterator[tuple[int, list[tuple[int, int, int, int]], list[np.ndarray]]]:
+    """
+    Find the bounding boxes of the motion detected on each frame of a video, splitting the video into ranges of
+    consecutive frames processed by worker processes. The results are handed back in frame order, so that they are
+    the same of a sequential run (provided that the video container supports frame accurate seeking).
+
+    :param input_video_path: the path to input video file (e.g. .mp4, .avi, etc.)
+    :param background: the background image
+    :param area_filer_out: the bounding boxes' areas that will not be considered for motion detection if smaller
+    :param n_jobs: the number of worker processes (and of frame ranges)
+    :param crop: whether to cut the crops of the bounding boxes
+    :param background_mode: the background model (see `create_background_model`)
+    :param detection_scale: the scale at which the motion is detected
+    :param frame_step: the sampling step of the frames analyzed while no motion is found (see `detect_sampled_bboxes`)
+    :param metrics: the metrics of the pipeline; the timers of the workers are summed, so that they measure the CPU
+        time spent in each stage rather than the elapsed time
+    :return: a generator over the frame index, the bounding boxes and the related crops (if requested) of each frame
+    """
+    video, *_ = get_video_properties(video_path=input_video_path)
+    num_frames = int(video.get(cv2.CAP_PROP_FRAME_COUNT))
+    video.release()
+
+    # The last range is left open, since the frame count of some containers is only an estimate.
+    bounds = np.linspace(0, num_frames, n_jobs + 1).astype(int).tolist()
+    ranges = [(start, stop) for start, stop in zip(bounds[:-1], bounds[1:]) if stop > start] or [(0, 0)]
+    ranges[-1] = (ranges[-1][0], None)
+
+    context = multiprocessing.get_context("spawn")
+    with concurrent.futures.ProcessPoolExecutor(max_workers=n_jobs, mp_context=context) as executor:
+        target = detect_bboxes_in_range if metrics is None else _detect_bboxes_in_range_with_metrics
+        futures = [executor.submit(target, input_video_path, background, area_filer_out, start, stop, crop,
+                                   background_mode, detection_scale, frame_step) for start, stop in ranges]
+        for future in futures:
+            if metrics is None:
+                yield from future.result()
+            else:
+                detections, timings, counters = future.result()
+                metrics.merge(timings, counters)
+                yield from detections
+
+
+def predict_bboxes(detections: Iterable[tuple[int, list[tuple[int, int, int, int]], list[np.ndarray]]],
+                   classifier: Classifier, batch_size: int = 32, max_latency: float = 0.5,
+                   metrics: Optional[PipelineMetrics] = None) \
+        -> Iterator[tuple[int, list[tuple[int, int, int, int]], Optional[np.ndarray]]]:
+    """
+    Classify the crops of consecutive frames in micro-batches, so that only a bounded number of crops is held in
+    memory at any time.
+
+    :param detections: the frame index, the bounding boxes and the related crops of each frame
+    :param classifier: the classifier of the crops
+    :param batch_size: the maximum number of crops predicted together
+    :param max_latency: the maximum time (in seconds) a frame waits for its batch to be completed
+    :param metrics: the metrics of the pipeline (see `camera_traps.motion_detection.metrics`)
+    :return: a generator over the frame index, the bounding boxes and the related predictions of each frame (None if
+        the frame has no bounding boxes)
+    """
+    metrics = metrics or NULL_METRICS
+    classification_queue = ClassificationQueue(classifier, max_batch_size=batch_size, max_latency=max_latency)
+    for id_frame, coordinates, crops in detections:
+        metrics.count("crops_classified", len(crops))
+        with metrics.time("classify"):
+            done = classification_queue.put((id_frame, coordinates), crops)
+        for (done_id_frame, done_coordinates), predictions in done:
+            yield done_id_frame, done_coordinates, predictions
+
+    with metrics.time("classify"):
+        done = classification_queue.flush()
+    for (done_id_frame, done_coordinates), predictions in done:
+        yield done_id_frame, done_coordinates, predictions
+
+
+def postprocess_detections(detections: Detections, predictions: Optional[np.ndarray], labels: Optional[list],
+                           score_filter_out: float, tracked_prediction: bool) -> Detections:
+    """
+    Assign labels, scores and tracks to the detected bounding boxes.
+
+    :param detections: the detected bounding boxes
+    :param predictions: the model predictions of the bounding boxes, one row for each box; if not provided, the boxes
+        are not labeled
+    :param labels: the labels of the model, ordered as the predictions' columns
+    :param score_filter_out: the model scores that will not be considered for output predictions if smaller
+    :param tracked_prediction: if activated an algorithm tracks the detected objected over time along the video
+    :return: the completed detections
+    """
+    if predictions is not None:
+        detections.set_predictions(predictions, labels, score_filter_out)
 
     # Tracking objects based on centroid movement distance.
     if tracked_prediction:
-        box_detection["centroid"] = box_detection["box"].apply(lambda coord: compose_polygon(*coord).centroid)
-        box_detection["track_index"] = tracking(box_detection, distance_limit=30)
-        box_detection["color_track"] = box_detection["track_index"].apply(get_color_by_label_or_index)
-        box_detection["label"] = box_detection.groupby("track_index")["label"].transform(get_primary_label)
+        detections.track(distance_limit=30)
+        detections.vote_labels()
 
-    # Set color based on label.
-    box_detection["color_label"] = box_detection["label"].apply(get_color_by_label_or_index)
+    return detections
 
-    t2 = time.time()
 
-    logging.info(f"Total elapsed time: {t2 - t1} s")
+def index_detections_by_frame(detections: Detections, labeled: bool = True) \
+        -> tuple[np.ndarray, np.ndarray, np.ndarray, list[str]]:
+    """
+    Build a compact index of the bounding boxes to draw, sorted by frame: the boxes of the frame `i` are the rows from
+    `offsets[i]` to `offsets[i + 1]` of the returned boxes, colors and texts.
 
-    if not output_video_path:
-        return box_detection
+    :param detections: the detected bounding boxes with their labels, scores and tracks
+    :param labeled: whether the bounding boxes were labeled by the prediction model
+    :return: the offsets of the frames, the (N, 4) array of the boxes, their colors and their texts
+    """
+    label = detections.label
+    visible = np.ones(len(detections), dtype=bool) if "None_of_the_above" not in label.categories \
+        else label.codes != label.categories.get_loc("None_of_the_above")
+    visible = np.flatnonzero(visible)
+    visible = visible[np.argsort(detections.id_frame[visible], kind="stable")]
+
+    ids = detections.id_frame[visible]
+    offsets = np.searchsorted(ids, np.arange(ids.max() + 2 if len(ids) else 1))
+    boxes = detections.boxes[visible]
+    label_colors, track_colors = detections.get_label_colors()[visible], detections.get_track_colors()[visible]
+    colors = np.where(pd.isna(label_colors), track_colors, label_colors)
+    # Define the text to write over the bounding boxes.
+    if labeled:
+        texts = [f"{label}: {'{:.2f}'.format(score)}%" for label, score in zip(np.asarray(label[visible], dtype=object),
+                                                                               detections.score[visible].tolist())]
+    else:
+        texts = ["n/a"] * len(visible)
 
-    # Create output video containing motion detection and related predictions.
-    fourcc = cv2.VideoWriter_fourcc(*"mp4v")
-    output_video = cv2.VideoWriter(output_video_path, fourcc, fps=fps, frameSize=(width, height))
+    return offsets, boxes, colors, texts
 
-    for i, frame in enumerate(list_frames):
-        frame_objects_detection = box_detection.query("id_frame == @i & label != 'None_of_the_above'")
-        for index, row in frame_objects_detection.iterrows():
-            x, y, w, h = row["box"]
-            # Draw bounding box rectangle.
-            cv2.rectangle(frame, (x, y), (x + w, y + h), row["color_label"] or row["color_track"], 2)
-            # Define the text to write over the bounding boxes.
-            text = f"{row['label']}: {'{:.2f}'.format(row['score'])}%" if weights_path else "n/a"
-            # Write label and percentage prediction score for the current bounding box.
-            (w, h), _ = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, 0.6, 1)
-            frame = cv2.rectangle(frame, (x, y - 20), (x + w, y), row["color_label"] or row["color_track"], -1)
-            frame = cv2.putText(frame, text, (x, y - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1)
 
-        # Write modified frame.
-        output_video.write(frame)
+class ThreadedVideoWriter:
+    """
+    OpenCV video writer that encodes the frames on a background thread, so that the encoding overlaps with the
+    decoding and the drawing of the next frames.
+    """
+
+    def __init__(self, output_video_path: str, fps: int, width: int, height: int, max_queue_size: int = 32):
+        """
+        :param output_video_path: the path to output file (.mp4)
+        :param fps: the frame rate of the output video
+        :param width: the width of the output frames
+        :param height: the height of the output frames
+        :param max_queue_size: the maximum number of frames waiting to be encoded
+        """
+        fourcc = cv2.VideoWriter_fourcc(*"mp4v")
+        self.output_video = cv2.VideoWriter(output_video_path, fourcc, fps=fps, frameSize=(width, height))
+        self.frames = queue.Queue(maxsize=max_queue_size)
+        self.error = None
+        self.thread = threading.Thread(target=self._encode, daemon=True)
+        self.thread.start()
+
+    def _encode(self):
+        while (frame := self.frames.get()) is not None:
+            try:
+                self.output_video.write(frame)
+            except Exception as error:
+                self.error = error
+
+    def write(self, frame: np.ndarray):
+        """
+        :param frame: the frame to encode; it is queued without copying it, so it must not be modified afterwards
+        """
+        if self.error is not None:
+            raise self.error
+        self.frames.put(frame)
+
+    def release(self):
+        """
+        Wait for the queued frames to be encoded and close the output video.
+        """
+        self.frames.put(None)
+        self.thread.join()
+        self.output_video.release()
+        if self.error is not None:
+            raise self.error
+
+
+def write_output_video(frames: Iterable[np.ndarray], detections: Detections, output_video_path: str, fps: int,
+                       width: int, height: int, labeled: bool = True):
+    """
+    Create output video containing motion detection and related predictions.
+
+    :param frames: the frames of the input video, in video order
+    :param detections: the detected bounding boxes with their labels, scores and tracks
+    :param output_video_path: the path to output file (.mp4)
+    :param fps: the frame rate of the output video
+    :param width: the width of the output frames
+    :param height: the height of the output frames
+    :param labeled: whether the bounding boxes were labeled by the prediction model
+    """
+    offsets, boxes, colors, texts = index_detections_by_frame(detections, labeled=labeled)
+    output_video = ThreadedVideoWriter(output_video_path, fps, width, height)
+
+    try:
+        for i, frame in enumerate(frames):
+            start, stop = (offsets[i], offsets[i + 1]) if i + 1 < len(offsets) else (0, 0)
+            for (x, y, w, h), color, text in zip(boxes[start:stop].tolist(), colors[start:stop], texts[start:stop]):
+                # Draw bounding box rectangle.
+                cv2.rectangle(frame, (x, y), (x + w, y + h), color, 2)
+                # Write label and percentage prediction score for the current bounding box.
+                (w, h), _ = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, 0.6, 1)
+                cv2.rectangle(frame, (x, y - 20), (x + w, y), color, -1)
+                cv2.putText(frame, text, (x, y - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1)
+
+            # Write modified frame.
+            output_video.write(frame)
+    finally:
+        output_video.release()
 
     cv2.destroyAllWindows()
-    output_video.release()
 
-    logging.info("Bye...")
+
+def extract_motion(input_video_path: str, input_background_path: Optional[str] = None,
+                   area_filer_out: int = 3000, crop: bool = True,
+                   background_mode: str = "static", detection_scale: float = 1.0,
+                   frame_step: int = 1) -> tuple[Detections, np.ndarray]:
+    """
+    Detect the motion bounding boxes of a video and cut their crops, without classifying them. This is the part of the
+    pipeline that does not need the prediction model, so that it can run in worker processes while the crops are
+    classified elsewhere.
+
+    :param input_video_path: the path to input video file (e.g. .mp4, .avi, etc.)
+    :param input_background_path: the path to the input background image; if not provided a background is
+        automatically computed averaging frames along the provided video
+    :param area_filer_out: the bounding boxes' areas that will not be considered for motion detection if smaller
+    :param crop: whether to cut the crops of the bounding boxes
+    :param background_mode: the background model (see `create_background_model`)
+    :param detection_scale: the scale at which the motion is detected (see `detect_bboxes`)
+    :param frame_step: the sampling step of the frames analyzed while no motion is found (see `detect_sampled_bboxes`)
+    :return: the detected bounding boxes and the (N, 128, 128, 3) array of the related RGB crops
+    """
+    video, *_ = get_video_properties(video_path=input_video_path)
+    background = load_background(input_video_path, input_background_path, background_mode)
+
+    ids, coordinates, buffer = list(), list(), CropBuffer()
+    for id_frame, frame, frame_coordinates in detect_sampled_bboxes(video, background, area_filer_out,
+                                                                    frame_step=frame_step,
+                                                                    background_mode=background_mode,
+                                                                    detection_scale=detection_scale):
+        ids.extend([id_frame] * len(frame_coordinates))
+        coordinates.extend(frame_coordinates)
+        if crop:
+            crop_bboxes(frame, frame_coordinates, buffer=buffer)
+
+    video.release()
+
+    crops = buffer.to_rgb()
+
+    return Detections.from_boxes(ids, coordinates), crops
+
+
+def detect_and_predict_bboxes(video: cv2.VideoCapture, input_video_path: str, input_background_path: Optional[str],
+                              area_filer_out: int, classifier: Optional[Classifier], streaming: bool = False,
+                              n_jobs: int = 1, background_mode: str = "static", detection_scale: float = 1.0,
+                              frame_step: int = 1, keep_frames: bool = False, cache: Optional[DetectionCache] = None,
+                              cache_key: Optional[str] = None, metrics: Optional[PipelineMetrics] = None) \
+        -> tuple[Detections, list[np.ndarray], Optional[list[np.ndarray]]]:
+    """
+    Detect the motion bounding boxes of a video and classify them, as a chain of generator stages (decode ->
+    difference -> boxes -> classify). See `detect_motion_on_fixed_video` for the parameters.
+
+    :param video: the opened OpenCV video
+    :param input_video_path: the path to input video file
+    :param input_background_path: the path to the input background image
+    :param area_filer_out: the bounding boxes' areas that will not be considered for motion detection if smaller
+    :param classifier: the classifier of the bounding boxes, if any
+    :param streaming: whether to classify the crops as soon as they are available, without accumulating them
+    :param n_jobs: the number of worker processes detecting the motion on separate ranges of frames
+    :param background_mode: the background model (see `create_background_model`)
+    :param detection_scale: the scale at which the motion is detected (see `detect_bboxes`)
+    :param frame_step: the sampling step of the frames analyzed while no motion is found (see `detect_sampled_bboxes`)
+    :param keep_frames: whether to keep the decoded frames, if they are all decoded in the current process
+    :param cache: the cache where the bounding boxes, the crops and the predictions are stored
+    :param cache_key: the key of the motion detection of the video (see `DetectionCache.get_key`)
+    :param metrics: the metrics of the pipeline (see `camera_traps.motion_detection.metrics`)
+    :return: the detected bounding boxes, the predictions of their crops (in chunks) and the decoded frames, if kept
+    """
+    with (metrics or NULL_METRICS).time("background"):
+        background = load_background(input_video_path, input_background_path, background_mode)
+
+    # Keep the decoded frames for writing the output video, unless they are decoded elsewhere.
+    keep_frames = keep_frames and n_jobs == 1 and frame_step == 1
+    # Crop the bounding boxes only if they have to be classified or cached.
+    crop = classifier is not None or cache is not None
+    # Cut the crops directly into a single buffer, unless they are classified as soon as they are available.
+    streaming = classifier is not None and streaming and cache is None
+    buffer = CropBuffer() if not streaming else None
+
+    frames = None
+    if n_jobs > 1:
+        detections = detect_bboxes_parallel(input_video_path, background, area_filer_out, n_jobs, crop=crop,
+                                            background_mode=background_mode, detection_scale=detection_scale,
+                                            frame_step=frame_step, metrics=metrics)
+    else:
+        if keep_frames:
+            with (metrics or NULL_METRICS).time("decode"):
+                frames = list(read_frames(video))
+            bboxes = detect_bboxes(frames, background, area_filer_out, background_mode=background_mode,
+                                   detection_scale=detection_scale, metrics=metrics)
+        else:
+            bboxes = detect_sampled_bboxes(video, background, area_filer_out, frame_step=frame_step,
+                                           background_mode=background_mode, detection_scale=detection_scale,
+                                           metrics=metrics)
+        detections = ((id_frame, coordinates, crop_bboxes(frame, coordinates, metrics, buffer) if crop else [])
+                      for id_frame, frame, coordinates in bboxes)
+
+    ids, coordinates, predictions = list(), list(), list()
+    if streaming:
+        for id_frame, frame_coordinates, frame_predictions in predict_bboxes(detections, classifier,
+                                                                             metrics=metrics):
+            ids.extend([id_frame] * len(frame_coordinates))
+            coordinates.extend(frame_coordinates)
+            if frame_predictions is not None:
+                predictions.append(frame_predictions)
+    else:
+        for id_frame, frame_coordinates, frame_crops in detections:
+            ids.extend([id_frame] * len(frame_coordinates))
+            coordinates.extend(frame_coordinates)
+            if n_jobs > 1:
+                # The crops of the workers are already RGB, while the other ones have been cut into the buffer.
+                buffer.extend(frame_crops)
+        with (metrics or NULL_METRICS).time("crop"):
+            crops = buffer.to_rgb()
+
+        if cache is not None:
+            cache.save_motion(cache_key, Detections.from_boxes(ids, coordinates), crops)
+        if classifier is not None and len(crops):
+            # Get predictions.
+            predictions.append(predict_cached_crops(classifier, crops, cache, cache_key, verbose=1,
+                                                    metrics=metrics))
+
+    return Detections.from_boxes(ids, coordinates), predictions, frames
+
+
+def detect_motion_on_fixed_video(input_video_path: str, input_background_path: Optional[str] = None,
+                                 area_filer_out: int = 3000, weights_path: Optional[str] = None,
+                                 score_filter_out: float = 95, tracked_prediction: bool = True,
+                                 output_video_path: Optional[str] = "output.mp4",
+                                 streaming: bool = False, classifier: Optional[Classifier] = None,
+                                 n_jobs: int = 1, background_mode: str = "static",
+                                 detection_scale: float = 1.0, frame_step: int = 1,
+                                 output_detections_path: Optional[str] = None, cache_dir: Optional[str] = None,
+                                 cache_size: int = 10 * 2 ** 30, backend: str = "keras",
+                                 num_threads: Optional[int] = None,
+                                 metrics: Optional[PipelineMetrics] = None,
+                                 events_path: Optional[str] = None) -> pd.DataFrame:
+    """
+    Detect motion searching difference between current frame and a provided background or an average frame along
+    all video. The bounding boxes that identify a motion are given as input to the prediction model in order to
+    classify them.
+
+    The video is processed as a chain of generator stages (decode -> difference -> boxes -> classify) followed by the
+    tracking and the annotation of the output video. In streaming mode neither the decoded frames nor the crops are
+    accumulated: the crops are classified in fixed size batches as soon as they are available and the input video is
+    decoded a second time for writing the output video, so that memory stays flat regardless of the video length.
+    Otherwise, the decoded frames are kept in memory in order to write the output video without decoding it again.
+
+    The boxes of a frame are the enclosing boxes of the groups of overlapping (or edge sharing) motion rectangles, as
+    merged by `merge_bboxes`, and they are listed by their upper left corner (y, then x). Before the NumPy merge, the
+    boxes were the bounds of the minimum rotated rectangle of each merged polygon, in the order of the shapely union:
+    the two agree whenever that rectangle is axis-aligned, so the same video gives the same boxes up to their order
+    within a frame, but for the groups whose minimum rotated rectangle is tilted.
+
+    :param input_video_path: the path to input video file (e.g. .mp4, .avi, etc.)
+    :param input_background_path: the path to the input background image; if not provided a background is
+        automatically computed averaging frames along the provided video
+    :param area_filer_out: the bounding boxes' areas that will not be considered for motion detection if smaller
+    :param weights_path: the path to the weights of the model for predicting the detected bounding boxes; it must
+        contain at least two files: 'weights.h5' and 'labels'
+    :param score_filter_out: the model scores that will not be considered for output predictions if smaller
+    :param tracked_prediction: if activated an algorithm tracks the detected objected over time along the video
+    :param output_video_path: the path to output file (.mp4)
+    :param streaming: if activated the video is processed holding only a bounded window of frames and crops in memory
+    :param classifier: the classifier of the bounding boxes; if not provided, it is loaded from the weights path (and
+        cached, so that the model is built only once when processing multiple videos)
+    :param n_jobs: the number of worker processes detecting the motion on separate ranges of frames; the bounding boxes
+        are merged back in frame order and tracked afterwards, so that the tracks are stitched across the ranges
+    :param background_mode: the background model: 'static' compares every frame against the same background,
+        'running_average', 'mog2' and 'knn' update the background at every frame, following the lighting changes
+    :param detection_scale: the scale at which the motion is detected (e.g. 0.25 for detecting the motion of 4K videos
+        on 960x540 frames); the bounding boxes are cut from the full resolution frames anyway
+    :param frame_step: if greater than 1, while no motion is found only one frame every `frame_step` is decoded and
+        analyzed, the full processing being limited to the frames following a detected motion
+    :param output_detections_path: the path to the Parquet file (.parquet) where the detections are saved, once the
+        video is completed, together with the class probabilities of the boxes and the parameters of the run, so that
+        they can be relabeled with other thresholds without running the model (see
+        `camera_traps.motion_detection.sink`); it requires pyarrow
+    :param cache_dir: the directory of the cache of the bounding boxes, crops and predictions (see
+        `camera_traps.motion_detection.cache`); when the same video is processed again with the same motion parameters,
+        it is not decoded (unless an output video is requested) and only the thresholds and the tracking are applied
+        again. The crops of a video have to be collected for being cached, so they are never classified in streaming
+    :param cache_size: the maximum size (in bytes) of the cache
+    :param backend: the inference backend of the classifier: 'keras', or 'tflite' and 'onnx' for running a model
+        exported by `camera_traps.model.export` (whose folder is then the weights path) on CPU threads
+    :param num_threads: the number of CPU threads of the 'tflite' and 'onnx' backends
+    :param metrics: the metrics of the pipeline, collecting the elapsed time of each stage and the counts of frames,
+        contours, boxes and classified crops; its observers are notified after each frame and when the video is
+        completed (see `camera_traps.motion_detection.metrics`). If not provided, nothing is collected
+    :param events_path: the path to the SQLite index of the events where the tracks of the video are added, replacing
+        the ones of a previous run (see `camera_traps.motion_detection.events`)
+    :return: the DataFrame of the detections; if the metrics are collected, their summary is attached to it as
+        `attrs["metrics"]`
+    """
+    # Open video.
+    video, fps, width, height = get_video_properties(video_path=input_video_path)
+
+    if classifier is None and weights_path:
+        classifier = load_classifier(weights_path, backend=backend, num_threads=num_threads)
+
+    t1 = time.time()
+
+    cache = DetectionCache(cache_dir, max_size=cache_size) if cache_dir else None
+    if cache is not None:
+        cache_key = cache.get_key(input_video_path, get_motion_parameters(input_background_path, area_filer_out,
+                                                                          background_mode, detection_scale,
+                                                                          frame_step))
+        cached = cache.load_motion(cache_key)
+    else:
+        cache_key, cached = None, None
+
+    if cached is not None:
+        # Reuse the bounding boxes and the crops of a previous run, without decoding the video.
+        logging.info(f"Reusing the cached motion detection of {input_video_path}")
+        detections, crops = cached
+        keep_frames = False
+        predictions = [predict_cached_crops(classifier, crops, cache, cache_key, verbose=1, metrics=metrics)] \
+            if classifier is not None and not detections.empty else []
+    else:
+        detections, predictions, frames = detect_and_predict_bboxes(
+            video, input_video_path, input_background_path, area_filer_out, classifier, streaming, n_jobs,
+            background_mode, detection_scale, frame_step, keep_frames=not streaming and bool(output_video_path),
+            cache=cache, cache_key=cache_key, metrics=metrics)
+        keep_frames = frames is not None
+
+    video.release()
+
+    if not detections.empty:
+        with (metrics or NULL_METRICS).time("tracking"):
+            detections = postprocess_detections(detections,
+                                                predictions=np.concatenate(predictions, axis=0) if predictions
+                                                else None,
+                                                labels=classifier.labels if classifier is not None else None,
+                                                score_filter_out=score_filter_out,
+                                                tracked_prediction=tracked_prediction)
+
+    if output_detections_path:
+        metadata = {"video": input_video_path,
+                    "background": get_background_source(input_background_path, background_mode),
+                    "background_mode": background_mode,
+                    "area_filer_out": area_filer_out,
+                    "detection_scale": detection_scale,
+                    "frame_step": frame_step,
+                    "weights_id": classifier.weights_id if classifier is not None else None,
+                    "score_filter_out": score_filter_out,
+                    "tracked_prediction": tracked_prediction}
+        write_detections(detections, output_detections_path, metadata=metadata)
+
+    if events_path:
+        with EventIndex(events_path) as index:
+            index.add_video(input_video_path, detections, fps,
+                            weights_id=classifier.weights_id if classifier is not None else None)
+
+    if not detections.empty:
+        t2 = time.time()
+
+        logging.info(f"Total elapsed time: {t2 - t1} s")
+
+        if output_video_path:
+            with (metrics or NULL_METRICS).time("write"):
+                if keep_frames:
+                    write_output_video(frames, detections, output_video_path, fps, width, height,
+                                       labeled=classifier is not None)
+                else:
+                    # Decode the input video again instead of keeping its frames in memory.
+                    video, *_ = get_video_properties(video_path=input_video_path)
+                    write_output_video(read_frames(video), detections, output_video_path, fps, width, height,
+                                       labeled=classifier is not None)
+                    video.release()
+
+            logging.info("Bye...")
+
+    box_detection = detections.to_dataframe()
+    if metrics is not None:
+        box_detection.attrs["metrics"] = metrics.finish()
 
     return box_detection
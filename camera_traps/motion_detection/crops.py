@@ -0,0 +1,109 @@
+"""
+Preallocated storage of the motion crops given as input to the classifier.
+
+The crops are resized directly into the rows of a growable uint8 (N, H, W, 3) array, instead of being allocated one at
+a time and stacked afterwards; the BGR to RGB conversion is then applied once to all the rows added since the previous
+conversion. The classifier is fed with views of the array, so that the crops are never copied again. The gain is in
+memory rather than in time: the list of crops and their stacked copy never coexist, which lowers the peak memory of the
+crop extraction (see `camera_traps.benchmarks.crops`).
+"""
+from typing import Iterable
+
+import numpy as np
+import cv2
+
+# The width and the height of the crops given as input to the classifier.
+CROP_SIZE = (128, 128)
+
+
+class CropBuffer:
+    """
+    Growable array of crops. The crops cut out of a frame are stored as BGR (see `add`) until `to_rgb` is called,
+    while the crops added already prepared (see `extend`) are expected to be RGB.
+    """
+
+    def __init__(self, capacity: int = 256, size: tuple[int, int] = CROP_SIZE):
+        """
+        :param capacity: the initial number of crops the buffer can hold; it is doubled whenever it is exceeded
+        :param size: the width and the height of the crops
+        """
+        self.size = size
+        self.array = np.empty((max(capacity, 1), size[1], size[0], 3), dtype=np.uint8)
+        self.length = 0
+        self._converted = 0
+
+    def __len__(self) -> int:
+        return self.length
+
+    @property
+    def crops(self) -> np.ndarray:
+        """
+        :return: the view of the stored crops
+        """
+        return self.array[:self.length]
+
+    def reserve(self, n: int):
+        """
+        Make room for more crops, growing the array if needed.
+
+        :param n: the number of crops about to be added
+        """
+        if self.length + n <= len(self.array):
+            return
+        capacity = len(self.array)
+        while capacity < self.length + n:
+            capacity *= 2
+        array = np.empty((capacity, *self.array.shape[1:]), dtype=np.uint8)
+        array[:self.length] = self.array[:self.length]
+        self.array = array
+
+    def add(self, frame: np.ndarray, coordinates: Iterable[tuple[int, int, int, int]]) -> np.ndarray:
+        """
+        Cut the bounding boxes out of a frame and resize them into the buffer, still as BGR.
+
+        :param frame: the frame (BGR) containing the bounding boxes
+        :param coordinates: the x and y coordinates of the upper left corner, the width and the height of the boxes
+        :return: the view of the added crops
+        """
+        coordinates = list(coordinates)
+        self.reserve(len(coordinates))
+        start = self.length
+        for x, y, w, h in coordinates:
+            cv2.resize(frame[y:y + h, x:x + w], self.size, dst=self.array[self.length])
+            self.length += 1
+
+        return self.array[start:self.length]
+
+    def extend(self, crops: np.ndarray):
+        """
+        Copy crops already prepared (RGB) into the buffer.
+
+        :param crops: the (N, H, W, 3) array of the RGB crops
+        """
+        if not len(crops):
+            return
+        self.to_rgb()
+        self.reserve(len(crops))
+        self.array[self.length:self.length + len(crops)] = crops
+        self.length += len(crops)
+        self._converted = self.length
+
+    def to_rgb(self) -> np.ndarray:
+        """
+        Convert from BGR to RGB, in place, all the crops added since the previous conversion.
+
+        :return: the view of the stored crops
+        """
+        if self._converted < self.length:
+            pending = self.array[self._converted:self.length]
+            pending[..., [0, 2]] = pending[..., [2, 0]]
+            self._converted = self.length
+
+        return self.crops
+
+    def clear(self):
+        """
+        Remove all the crops, keeping the allocated array.
+        """
+        self.length = 0
+        self._converted = 0
@@ -0,0 +1,346 @@
+from typing import Union, Optional
+import dataclasses
+
+import numpy as np
+import pandas as pd
+from shapely.geometry import Point
+
+from camera_traps.motion_detection.tracking_objects import track_centroids
+
+# The colors of the matplotlib "Set1" colormap.
+SET1_COLORS = [(228, 26, 28), (55, 126, 184), (77, 175, 74), (152, 78, 163), (255, 127, 0), (255, 255, 51),
+               (166, 86, 40), (247, 129, 191), (153, 153, 153)]
+
+
+def get_color_by_label_or_index(label: Union[int, str]) -> tuple[int, ...]:
+    """
+    Return a color based on some predefined label's name or index conditions.
+
+    :param label: the provided label or index
+    :return: the color associated to the provided label or index
+    """
+    if isinstance(label, int):
+        return SET1_COLORS[label % 9]
+    elif isinstance(label, str):
+        if label == "human":
+            return 0, 255, 0
+        elif label == "vehicle":
+            return 0, 0, 255
+        elif label in ["cat", "dog"]:
+            return 255, 165, 0
+        else:
+            return 255, 0, 0
+
+
+def get_primary_label(labels: pd.Series, min_count: int = 3, min_occurrence: float = 25):
+    """
+
+    :param labels: a pandas Series containing labels string, ideally for a unique tracked object
+    :param min_count: the minimum number of labels count of the tracked object to be considered valid
+    :param min_occurrence:
+    :return:
+    """
+    occurrences = labels.value_counts(normalize=True, dropna=False).mul(100)
+    if len(labels) >= min_count and occurrences.max() > min_occurrence:
+        return occurrences.idxmax()
+    else:
+        return "None_of_the_above"
+
+
+def get_primary_labels(tracks: np.ndarray, labels: pd.Categorical, min_count: int = 3, min_occurrence: float = 25,
+                       weights: Optional[np.ndarray] = None) -> pd.Categorical:
+    """
+    Vectorized version of `get_primary_label` for all the tracks at once: the occurrences of the labels (missing ones
+    included) in each track are counted by a single 2-D bincount of the track and label codes. A track gets its most
+    frequent label if it has at least `min_count` boxes and the label covers more than `min_occurrence` percent of
+    them, otherwise 'None_of_the_above'; among equally frequent labels, the one appearing first wins.
+
+    :param tracks: the track of each box
+    :param labels: the label of each box
+    :param min_count: the minimum number of boxes of a track for its labels to be considered valid
+    :param min_occurrence: the minimum percentage of the boxes of a track sharing its primary label
+    :param weights: the weight of each box (e.g. its score); if provided, the occurrences of the labels are the sums of
+        the weights instead of the counts of the boxes
+    :return: the primary label of the track of each box
+    """
+    track_codes, unique_tracks = pd.factorize(np.asarray(tracks))
+    categories = list(labels.categories)
+    # The missing label is the last code.
+    label_codes = np.where(labels.codes < 0, len(categories), labels.codes)
+    n_tracks, n_labels = len(unique_tracks), len(categories) + 1
+
+    pairs = track_codes * n_labels + label_codes
+    sizes = np.bincount(track_codes, minlength=n_tracks)
+    occurrences = np.bincount(pairs, weights=weights, minlength=n_tracks * n_labels).reshape(n_tracks, n_labels)
+    totals = occurrences.sum(axis=1) if weights is not None else sizes
+
+    # Get the first position of each label in each track, for breaking the ties.
+    first = np.full(n_tracks * n_labels, len(pairs))
+    unique_pairs, first_positions = np.unique(pairs, return_index=True)
+    first[unique_pairs] = first_positions
+    first = first.reshape(n_tracks, n_labels)
+
+    best = occurrences.max(axis=1)
+    primary = np.argmin(np.where(occurrences == best[:, np.newaxis], first, len(pairs) + 1), axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        valid = (sizes >= min_count) & (best / totals * 100 > min_occurrence)
+
+    categories = list(dict.fromkeys(categories + ["None_of_the_above"]))
+    primary = np.where(primary == n_labels - 1, -1, primary)
+    primary = np.where(valid, primary, categories.index("None_of_the_above"))
+
+    return pd.Categorical.from_codes(primary[track_codes], categories=categories)
+
+
+def to_object_array(values: list) -> np.ndarray:
+    """
+    Store a list of (possibly tuple, geometry or None) values in a 1-D object array, without numpy unpacking the tuples
+    or querying the array interface of the geometries.
+
+    :param values: the values
+    :return: the 1-D object array
+    """
+    return np.fromiter(values, dtype=object, count=len(values))
+
+
+@dataclasses.dataclass
+class Detections:
+    """
+    Columnar store of the detected bounding boxes: one typed array for each field instead of a DataFrame of Python
+    objects, so that the boxes of long videos take a few bytes each and are labeled and tracked by vectorized
+    operations. The missing scores and labels (boxes not classified) are NaN, the missing tracks (boxes not tracked)
+    are -1.
+
+    The class probabilities of the classified boxes are kept as well (in half precision), so that the score threshold
+    and the track voting can be applied again without running the model (see `relabel`).
+
+    The DataFrame used by the rest of the package (tuples for the boxes and the colors, shapely points for the
+    centroids) is built only on request by `to_dataframe`.
+    """
+    id_frame: np.ndarray
+    x: np.ndarray
+    y: np.ndarray
+    w: np.ndarray
+    h: np.ndarray
+    score: np.ndarray
+    label: pd.Categorical
+    track_index: np.ndarray
+    probabilities: Optional[np.ndarray] = None
+    classes: Optional[list] = None
+
+    @classmethod
+    def from_boxes(cls, ids: list[int], coordinates: list[tuple[int, int, int, int]]) -> "Detections":
+        """
+        Store the detected bounding boxes, whose prediction and tracking fields are still empty.
+
+        :param ids: the frame index of each bounding box
+        :param coordinates: the x and y coordinates of the upper left corner, the width and the height of each bounding
+            box
+        :return: the detected bounding boxes
+        """
+        boxes = np.array(coordinates, dtype=np.int32).reshape(-1, 4)
+
+        return cls(id_frame=np.asarray(ids, dtype=np.int32),
+                   x=boxes[:, 0].copy(), y=boxes[:, 1].copy(), w=boxes[:, 2].copy(), h=boxes[:, 3].copy(),
+                   score=np.full(len(boxes), np.nan, dtype=np.float32),
+                   label=pd.Categorical(np.full(len(boxes), np.nan)),
+                   track_index=np.full(len(boxes), -1, dtype=np.int32))
+
+    @classmethod
+    def from_table(cls, table: pd.DataFrame, probabilities: Optional[np.ndarray] = None,
+                   classes: Optional[list] = None) -> "Detections":
+        """
+        Restore the detections saved as a table (see `to_table`), e.g. for relabeling them (see `relabel`).
+
+        :param table: the DataFrame of the id_frame, x, y, w, h, score, label and track_index columns, the missing
+            values being nulls
+        :param probabilities: the class probabilities of the bounding boxes, one row for each box
+        :param classes: the classes of the model, ordered as the columns of the probabilities
+        :return: the detected bounding boxes
+        """
+        label = table["label"]
+        categories = list(dict.fromkeys(list(classes) + ["None_of_the_above"])) if classes \
+            else pd.Categorical(label).categories
+
+        return cls(id_frame=np.asarray(table["id_frame"], dtype=np.int32),
+                   x=np.asarray(table["x"], dtype=np.int32), y=np.asarray(table["y"], dtype=np.int32),
+                   w=np.asarray(table["w"], dtype=np.int32), h=np.asarray(table["h"], dtype=np.int32),
+                   score=table["score"].to_numpy(dtype=np.float32, na_value=np.nan),
+                   label=pd.Categorical(label, categories=categories),
+                   track_index=np.asarray(table["track_index"].fillna(-1), dtype=np.int32),
+                   probabilities=np.asarray(probabilities, dtype=np.float16) if probabilities is not None else None,
+                   classes=list(classes) if classes else None)
+
+    def __len__(self) -> int:
+        return len(self.id_frame)
+
+    @property
+    def empty(self) -> bool:
+        return len(self) == 0
+
+    @property
+    def boxes(self) -> np.ndarray:
+        """
+        :return: the (N, 4) array of the x and y coordinates of the upper left corner, the width and the height of the
+            bounding boxes
+        """
+        return np.stack([self.x, self.y, self.w, self.h], axis=1)
+
+    @property
+    def centroids(self) -> np.ndarray:
+        """
+        :return: the (N, 2) array of the x and y coordinates of the bounding boxes' centroids
+        """
+        return np.stack([self.x + self.w / 2, self.y + self.h / 2], axis=1).astype(np.float32)
+
+    @property
+    def labeled(self) -> bool:
+        """
+        :return: whether the bounding boxes have been classified
+        """
+        return not np.isnan(self.score).all()
+
+    @property
+    def tracked(self) -> bool:
+        """
+        :return: whether the bounding boxes have been tracked
+        """
+        return bool((self.track_index >= 0).any())
+
+    def set_predictions(self, predictions: np.ndarray, labels: list, score_filter_out: float):
+        """
+        Store the class probabilities of the bounding boxes and assign them the best label and its score (in
+        percentage).
+
+        :param predictions: the model predictions of the bounding boxes, one row for each box
+        :param labels: the labels of the model, ordered as the predictions' columns
+        :param score_filter_out: the model scores that will not be considered for output predictions if smaller; the
+            related boxes are labeled as 'None_of_the_above'
+        """
+        self.probabilities = np.asarray(predictions, dtype=np.float16)
+        self.classes = list(labels)
+        # Get the best predictions.
+        score = np.max(predictions, axis=1).round(2) * 100
+        self.apply_threshold(score_filter_out, score=score, codes=np.argmax(predictions, axis=1))
+
+    def apply_threshold(self, score_filter_out: float, score: Optional[np.ndarray] = None,
+                        codes: Optional[np.ndarray] = None):
+        """
+        Label the bounding boxes with their best class, unless its score is below the threshold.
+
+        :param score_filter_out: the model scores that will not be considered for output predictions if smaller; the
+            related boxes are labeled as 'None_of_the_above'
+        :param score: the scores (in percentage) of the best classes; if not provided, the stored ones
+        :param codes: the indices of the best classes; if not provided, they are computed from the stored probabilities
+        """
+        score = self.score if score is None else score
+        codes = np.argmax(self.probabilities, axis=1) if codes is None else codes.copy()
+        # Filter on prediction score.
+        categories = list(dict.fromkeys(self.classes + ["None_of_the_above"]))
+        codes[score < score_filter_out] = categories.index("None_of_the_above")
+
+        self.score = score.astype(np.float32)
+        self.label = pd.Categorical.from_codes(codes, categories=categories)
+
+    def track(self, distance_limit: float = 30):
+        """
+        Track the bounding boxes over consecutive frames based on the distance of their centroids.
+
+        :param distance_limit: the maximum distance between the centroids of the same object in consecutive frames
+        """
+        self.track_index = track_centroids(self.id_frame, self.centroids, distance_limit=distance_limit) \
+            .astype(np.int32)
+
+    def vote_labels(self, min_count: int = 3, min_occurrence: float = 25, weighted: bool = False):
+        """
+        Replace the label of each bounding box with the primary label of its track (see `get_primary_labels`).
+
+        :param min_count: the minimum number of boxes of a track for its labels to be considered valid
+        :param min_occurrence: the minimum percentage of the boxes (or of their scores, if weighted) of a track sharing
+            its primary label
+        :param weighted: whether to weight the vote of each box by its score
+        """
+        weights = np.nan_to_num(self.score.astype(np.float64)) if weighted else None
+        self.label = get_primary_labels(self.track_index, self.label, min_count=min_count,
+                                        min_occurrence=min_occurrence, weights=weights)
+
+    def relabel(self, score_filter_out: float, tracked_prediction: bool = True, min_count: int = 3,
+                min_occurrence: float = 25, weighted: bool = False) -> "Detections":
+        """
+        Apply again the score threshold and the track voting to the stored scores and probabilities, without running
+        the model (e.g. for sweeping the thresholds). The best classes are taken from the half precision probabilities,
+        so they may differ from the original predictions only for the boxes whose two best classes are almost tied.
+
+        :param score_filter_out: the model scores that will not be considered for output predictions if smaller
+        :param tracked_prediction: whether to replace the labels with the primary label of their track; the boxes are
+            tracked if they are not yet
+        :param min_count: the minimum number of boxes of a track for its labels to be considered valid
+        :param min_occurrence: the minimum percentage of the boxes of a track sharing its primary label
+        :param weighted: whether to weight the vote of each box by its score
+        :return: the relabeled detections, sharing the boxes and the probabilities with the current ones
+        """
+        if self.probabilities is None:
+            raise ValueError("The detections have not been classified")
+
+        detections = dataclasses.replace(self)
+        detections.apply_threshold(score_filter_out)
+        if tracked_prediction:
+            if not detections.tracked:
+                detections.track()
+            detections.vote_labels(min_count=min_count, min_occurrence=min_occurrence, weighted=weighted)
+
+        return detections
+
+    def get_label_colors(self) -> np.ndarray:
+        """
+        :return: the object array of the colors of the bounding boxes' labels (None for the missing labels)
+        """
+        colors = to_object_array([None] + [get_color_by_label_or_index(label) for label in self.label.categories])
+
+        return colors[self.label.codes + 1]
+
+    def get_track_colors(self) -> np.ndarray:
+        """
+        :return: the object array of the colors of the bounding boxes' tracks (None for the missing tracks)
+        """
+        colors = to_object_array([get_color_by_label_or_index(i) for i in range(9)] + [None])
+
+        return colors[np.where(self.track_index >= 0, self.track_index % 9, 9)]
+
+    def to_table(self) -> pd.DataFrame:
+        """
+        Convert the detections to a DataFrame with one typed column for each field (missing tracks as nullable
+        integers), suitable for being saved.
+
+        :return: the DataFrame of the id_frame, x, y, w, h, score, label and track_index columns
+        """
+        return pd.DataFrame({"id_frame": self.id_frame,
+                             "x": self.x, "y": self.y, "w": self.w, "h": self.h,
+                             "score": self.score,
+                             "label": self.label,
+                             "track_index": pd.arrays.IntegerArray(self.track_index, self.track_index < 0)})
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """
+        Convert the detections to the DataFrame of Python objects historically returned by the motion detection, whose
+        columns are filled only if the boxes have been classified (score and label) or tracked (centroid, track_index
+        and color_track):
+
+            | id_frame | box | score | label | color_label | centroid | track_index | color_track |
+            |----------|-----|-------|-------|-------------|----------|-------------|-------------|
+            |  ------  | --- | ----- | ----- |   -------   |  ------  |   -------   |   -------   |
+
+        :return: the DataFrame of the detected bounding boxes
+        """
+        tracked = self.tracked
+        box_detection = pd.DataFrame({"id_frame": self.id_frame.astype(np.int64),
+                                      "box": list(zip(*[c.tolist() for c in (self.x, self.y, self.w, self.h)])),
+                                      "score": self.score if self.labeled else None,
+                                      "label": np.asarray(self.label, dtype=object),
+                                      "color_label": self.get_label_colors(),
+                                      "centroid": to_object_array([Point(x, y) for x, y in self.centroids.tolist()])
+                                      if tracked else None,
+                                      "track_index": self.track_index.astype(np.int64) if tracked else None,
+                                      "color_track": self.get_track_colors()})
+
+        return box_detection
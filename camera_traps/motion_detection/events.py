@@ -0,0 +1,226 @@
+"""
+Archive-wide index of the events (tracked objects) of the processed videos, stored in a SQLite database, so that
+questions like "which clips had a fox at night" are answered without loading the detections of every video.
+
+The index holds one row for each video (`videos`) and one row for each track of its detections (`events`): the first
+and the last frame, their time in the video and their timestamp (from the recording time of the video), the primary
+label of the track (see `get_primary_labels`), its maximum score, its number of boxes and the extent covered by its
+boxes. The events are indexed by label and by time. A video is (re)indexed in a single transaction as soon as it is
+processed, replacing its previous events, so that the index is always consistent and grows incrementally.
+
+Usage:
+
+    python -m camera_traps.motion_detection.events detections/events.sqlite --label fox --hours 20 6
+"""
+from typing import Optional
+import argparse
+import os
+import sqlite3
+import time
+
+import numpy as np
+import pandas as pd
+
+from camera_traps.motion_detection.detections import Detections, get_primary_labels
+from camera_traps.motion_detection.tracking_objects import track_centroids
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS videos (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    recorded_at REAL,
+    fps REAL NOT NULL,
+    weights_id TEXT,
+    events INTEGER NOT NULL,
+    indexed_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY,
+    video_id INTEGER NOT NULL REFERENCES videos (id) ON DELETE CASCADE,
+    track INTEGER NOT NULL,
+    start_frame INTEGER NOT NULL,
+    end_frame INTEGER NOT NULL,
+    start_time REAL NOT NULL,
+    end_time REAL NOT NULL,
+    start_timestamp REAL,
+    end_timestamp REAL,
+    label TEXT,
+    max_score REAL,
+    boxes INTEGER NOT NULL,
+    x_min INTEGER NOT NULL,
+    y_min INTEGER NOT NULL,
+    x_max INTEGER NOT NULL,
+    y_max INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS events_label_timestamp ON events (label, start_timestamp);
+CREATE INDEX IF NOT EXISTS events_timestamp ON events (start_timestamp);
+CREATE INDEX IF NOT EXISTS events_video ON events (video_id);
+"""
+
+# The columns of the events, as returned by `get_events`.
+EVENT_COLUMNS = ["track", "start_frame", "end_frame", "start_time", "end_time", "label", "max_score", "boxes",
+                 "x_min", "y_min", "x_max", "y_max"]
+
+
+def get_events(detections: Detections, fps: float, min_count: int = 3, min_occurrence: float = 25) -> pd.DataFrame:
+    """
+    Summarize the detections of a video as one event for each track. If the detections were not tracked, they are
+    tracked here, without changing them.
+
+    :param detections: the detected bounding boxes with their labels, scores and tracks
+    :param fps: the frame rate of the video
+    :param min_count: the minimum number of boxes of a track for its labels to be considered valid
+    :param min_occurrence: the minimum percentage of the boxes of a track sharing its primary label
+    :return: the DataFrame of the events (see `EVENT_COLUMNS`); the label is missing if the boxes were not classified
+    """
+    if detections.empty:
+        return pd.DataFrame(columns=EVENT_COLUMNS)
+
+    tracks = detections.track_index if detections.tracked \
+        else track_centroids(detections.id_frame, detections.centroids, distance_limit=30)
+    boxes = pd.DataFrame({"track": tracks, "id_frame": detections.id_frame, "score": detections.score,
+                          "x_min": detections.x, "y_min": detections.y,
+                          "x_max": detections.x + detections.w, "y_max": detections.y + detections.h})
+
+    events = boxes.groupby("track", sort=True).agg(start_frame=("id_frame", "min"), end_frame=("id_frame", "max"),
+                                                   max_score=("score", "max"), boxes=("id_frame", "size"),
+                                                   x_min=("x_min", "min"), y_min=("y_min", "min"),
+                                                   x_max=("x_max", "max"), y_max=("y_max", "max")).reset_index()
+    if detections.labeled:
+        # The primary label of every box, voted by all the tracks at once; the events are sorted by track as well.
+        primary = get_primary_labels(tracks, detections.label, min_count=min_count, min_occurrence=min_occurrence)
+        _, first = np.unique(tracks, return_index=True)
+        events["label"] = np.asarray(primary, dtype=object)[first]
+    else:
+        events["label"] = None
+    events["start_time"] = events["start_frame"] / fps
+    events["end_time"] = events["end_frame"] / fps
+
+    return events[EVENT_COLUMNS]
+
+
+class EventIndex:
+    """
+    SQLite index of the events of the processed videos.
+    """
+
+    def __init__(self, path: str):
+        """
+        :param path: the path to the SQLite database, created if missing
+        """
+        self.path = path
+        # Wait for the other writers (e.g. concurrent runs) instead of failing right away.
+        self.connection = sqlite3.connect(path, timeout=30)
+        self.connection.execute("PRAGMA journal_mode = WAL")
+        self.connection.execute("PRAGMA foreign_keys = ON")
+        self.connection.executescript(SCHEMA)
+
+    def add_video(self, video_path: str, detections: Detections, fps: float, recorded_at: Optional[float] = None,
+                  weights_id: Optional[str] = None) -> int:
+        """
+        Index the events of a video, replacing the ones of a previous run.
+
+        :param video_path: the path to the video file, identifying the video
+        :param detections: the detected bounding boxes with their labels, scores and tracks
+        :param fps: the frame rate of the video
+        :param recorded_at: the recording time (UNIX timestamp) of the first frame of the video; by default, the
+            modification time of the video file, if it exists
+        :param weights_id: the hash of the weights of the classifier of the boxes
+        :return: the number of indexed events
+        """
+        if recorded_at is None and os.path.exists(video_path):
+            recorded_at = os.path.getmtime(video_path)
+        events = get_events(detections, fps)
+        if recorded_at is not None:
+            events["start_timestamp"] = recorded_at + events["start_time"]
+            events["end_timestamp"] = recorded_at + events["end_time"]
+        else:
+            events["start_timestamp"] = events["end_timestamp"] = None
+        # Store the missing scores and labels as NULL.
+        events = events.astype(object).where(events.notna(), None)
+
+        with self.connection:
+            self.connection.execute("DELETE FROM videos WHERE path = ?", (video_path,))
+            video_id = self.connection.execute(
+                "INSERT INTO videos (path, recorded_at, fps, weights_id, events, indexed_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (video_path, recorded_at, fps, weights_id, len(events), time.time())).lastrowid
+            columns = EVENT_COLUMNS + ["start_timestamp", "end_timestamp"]
+            self.connection.executemany(
+                f"INSERT INTO events (video_id, {', '.join(columns)}) VALUES (?{', ?' * len(columns)})",
+                [(video_id, *row) for row in events[columns].itertuples(index=False, name=None)])
+
+        return len(events)
+
+    def query(self, labels: Optional[list[str]] = None, start: Optional[float] = None, end: Optional[float] = None,
+              hours: Optional[tuple[int, int]] = None, min_score: Optional[float] = None,
+              limit: Optional[int] = None) -> pd.DataFrame:
+        """
+        Find the events matching all the provided conditions.
+
+        :param labels: the primary labels of the events
+        :param start: the earliest start timestamp (UNIX) of the events
+        :param end: the latest start timestamp (UNIX) of the events
+        :param hours: the first and the last hour (local time, inclusive) of the day the events start in; the range can
+            wrap around midnight, e.g. (20, 5) for the night
+        :param min_score: the minimum score of the events
+        :param limit: the maximum number of events, the earliest first
+        :return: the DataFrame of the events, with the path to their video
+        """
+        conditions, parameters = [], []
+        if labels:
+            conditions.append(f"events.label IN ({', '.join('?' * len(labels))})")
+            parameters.extend(labels)
+        if start is not None:
+            conditions.append("events.start_timestamp >= ?")
+            parameters.append(start)
+        if end is not None:
+            conditions.append("events.start_timestamp <= ?")
+            parameters.append(end)
+        if hours is not None:
+            hour = "CAST(strftime('%H', events.start_timestamp, 'unixepoch', 'localtime') AS INTEGER)"
+            operator = "AND" if hours[0] <= hours[1] else "OR"
+            conditions.append(f"({hour} >= ? {operator} {hour} <= ?)")
+            parameters.extend(hours)
+        if min_score is not None:
+            conditions.append("events.max_score >= ?")
+            parameters.append(min_score)
+
+        sql = "SELECT videos.path AS video, events.* FROM events JOIN videos ON videos.id = events.video_id"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY events.start_timestamp, events.video_id, events.track"
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+
+        return pd.read_sql_query(sql, self.connection, params=parameters)
+
+    def videos(self) -> pd.DataFrame:
+        """
+        :return: the DataFrame of the indexed videos
+        """
+        return pd.read_sql_query("SELECT * FROM videos ORDER BY path", self.connection)
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self) -> "EventIndex":
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("index", help="path to the SQLite index of the events")
+    parser.add_argument("--label", nargs="+", default=None, help="primary labels of the events")
+    parser.add_argument("--hours", type=int, nargs=2, default=None, help="first and last hour of the day (local time)")
+    parser.add_argument("--min-score", type=float, default=None, help="minimum score of the events")
+    parser.add_argument("--limit", type=int, default=None, help="maximum number of events")
+    args = parser.parse_args()
+
+    with EventIndex(args.index) as index:
+        t1 = time.perf_counter()
+        events = index.query(labels=args.label, hours=args.hours, min_score=args.min_score, limit=args.limit)
+        print(events.to_string(index=False))
+        print(f"{len(events)} events in {(time.perf_counter() - t1) * 1e3:.1f} ms")
@@ -1,3 +1,5 @@
+from typing import Optional
+
 import numpy as np
 from shapely.geometry import Polygon
 from shapely.ops import unary_union
@@ -61,31 +63,117 @@ def get_bbox_without_intersection(boxes: list[Polygon]) -> list[tuple[int, int,
     return contours
 
 
-def crop_random_bbox(image: np.array, min_area: int) -> np.array:
+def merge_bboxes(boxes: np.ndarray) -> np.ndarray:
+    """
+    Get the minimum bounding boxes that do not intersect each other from an array of axis-aligned boxes, without
+    building any shapely geometry. The boxes that intersect or share an edge are iteratively grouped together
+    (boxes touching only at a corner stay separated) and each group is replaced by its enclosing box.
+
+    It gives the same boxes of `get_bbox_without_intersection` whenever the minimum rotated rectangle of the merged
+    polygons is axis-aligned (e.g. always for a single box or for boxes overlapping along an axis); otherwise, it
+    returns the axis-aligned extent of the merged boxes instead of the bounds of the rotated rectangle.
+
+    :param boxes: the (N, 4) array of the x and y coordinates of the upper left corner, the width and the height of the
+        boxes
+    :return: the (M, 4) array of the merged boxes, sorted by their upper left corner (y, then x)
+    """
+    boxes = np.asarray(boxes, dtype=int).reshape(-1, 4)
+    if len(boxes) <= 1:
+        return boxes
+
+    x_min, y_min = boxes[:, 0], boxes[:, 1]
+    x_max, y_max = x_min + boxes[:, 2], y_min + boxes[:, 3]
+
+    # Compute the pairwise overlaps along both axes (zero means that the boxes are touching).
+    overlap_x = np.minimum(x_max[:, np.newaxis], x_max) - np.maximum(x_min[:, np.newaxis], x_min)
+    overlap_y = np.minimum(y_max[:, np.newaxis], y_max) - np.maximum(y_min[:, np.newaxis], y_min)
+    connected = (overlap_x >= 0) & (overlap_y >= 0) & ((overlap_x > 0) | (overlap_y > 0))
+
+    # Propagate the smallest box index along the connected boxes until each group shares the same one.
+    groups = np.arange(len(boxes))
+    while True:
+        new_groups = np.where(connected, groups, len(boxes)).min(axis=1)
+        if np.array_equal(new_groups, groups):
+            break
+        groups = new_groups
+
+    # Compute the enclosing box of each group.
+    order = np.argsort(groups, kind="stable")
+    starts = np.flatnonzero(np.diff(groups[order], prepend=-1))
+    corners_min = np.minimum.reduceat(np.stack([x_min, y_min], axis=1)[order], starts, axis=0)
+    corners_max = np.maximum.reduceat(np.stack([x_max, y_max], axis=1)[order], starts, axis=0)
+
+    merged = np.concatenate([corners_min, corners_max - corners_min], axis=1)
+    merged = merged[np.lexsort((merged[:, 0], merged[:, 1]))]
+
+    return merged
+
+
+def rescale_bboxes(boxes: np.ndarray, scale: float, width: int, height: int) -> np.ndarray:
     """
-    Crop a random bounding box from the image while ensuring the area is not less than the specified minimum area.
+    Bring boxes found on a resized image back to the coordinates of the original image, rounding them outwards.
+
+    :param boxes: the (N, 4) array of the x and y coordinates of the upper left corner, the width and the height of the
+        boxes on the resized image
+    :param scale: the scale factor of the resized image
+    :param width: the width of the original image
+    :param height: the height of the original image
+    :return: the (N, 4) array of the boxes on the original image
+    """
+    if scale == 1:
+        return boxes
+
+    corners_min = np.floor(boxes[:, :2] / scale)
+    corners_max = np.ceil((boxes[:, :2] + boxes[:, 2:]) / scale)
+    corners_min = np.maximum(corners_min, 0).astype(int)
+    corners_max = np.minimum(corners_max, [width, height]).astype(int)
+
+    return np.concatenate([corners_min, corners_max - corners_min], axis=1)
+
+
+def sample_random_bboxes(width: int, height: int, min_area: int, n_boxes: int,
+                         rng: Optional[np.random.Generator] = None) -> np.ndarray:
+    """
+    Draw random bounding boxes inside an image, all at once and without rejection: the width of each box is drawn among
+    the ones that allow the minimum area, its height among the ones that reach the minimum area with that width and its
+    position among the ones that keep it inside the image.
+
+    :param width: the width of the image
+    :param height: the height of the image
+    :param min_area: the minimum area of the bounding boxes
+    :param n_boxes: the number of bounding boxes
+    :param rng: the random generator
+    :return: the (N, 4) array of the x and y coordinates of the upper left corner, the width and the height of the
+        boxes
+    """
+    if min_area > width * height:
+        raise ValueError(f"No bounding box of area {min_area} fits in an image of {width}x{height} pixels")
+    rng = rng if rng is not None else np.random.default_rng()
+
+    widths = rng.integers(max(1, -(-min_area // height)), width + 1, size=n_boxes)
+    heights = rng.integers(np.maximum(1, -(-min_area // widths)), height + 1)
+    x = rng.integers(0, width - widths + 1)
+    y = rng.integers(0, height - heights + 1)
+
+    return np.stack([x, y, widths, heights], axis=1)
+
+
+def crop_random_bbox(image: np.array, min_area: int, rng: Optional[np.random.Generator] = None) -> np.array:
+    """
+    Crop a random bounding box from the image while ensuring the area is not less than the specified minimum area (see
+    `sample_random_bboxes`).
 
     :param image: the input image
     :param min_area: the minimum area constraint for the bounding box
+    :param rng: the random generator
     :return: the cropped image representing the random bounding box
     """
     # Get image dimensions.
     height, width = image.shape[:2]
 
-    while True:
-        # Generate random top-left and bottom-right coordinates.
-        x1 = np.random.randint(0, width)
-        y1 = np.random.randint(0, height)
-        x2 = np.random.randint(x1, width)
-        y2 = np.random.randint(y1, height)
-
-        # Calculate bounding box area.
-        bbox_area = (x2 - x1) * (y2 - y1)
-
-        if bbox_area >= min_area:
-            # Crop the bounding box from the image.
-            cropped_image = image[y1:y2, x1:x2]
-            return cropped_image
+    x, y, w, h = sample_random_bboxes(width, height, min_area, 1, rng)[0].tolist()
+
+    return image[y:y + h, x:x + w]
 
 
 def expand_bbox(x: int, y: int, width: int, height: int, percentage: float) -> tuple[int, int, int, int]:
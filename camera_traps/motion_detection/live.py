@@ -0,0 +1,389 @@
+"""
+Motion detection on a live stream (a camera device or a URL), with bounded latency.
+
+A producer thread reads the frames from the `cv2.VideoCapture` source into a bounded queue, while the consumer detects
+the motion, tracks the boxes and classifies their crops in micro-batches (see `ClassificationQueue`), handing the
+result of each frame to a callback as soon as its crops are classified. When the consumer falls behind, the queue
+drops frames according to the chosen policy: 'drop_oldest' discards the oldest queued frame (the results stay as fresh
+as possible), 'drop_newest' discards the incoming one (the processed frames stay contiguous). The latency of every frame
+(from its capture to its callback) and the dropped frames are reported at the end.
+
+Since the stream has no end, the background cannot be computed from the whole video: the adaptive background models
+('running_average', 'mog2' and 'knn') learn it from the stream, while the 'static' one requires a background image. The
+boxes are tracked frame by frame, but their labels are not voted along the tracks, since the tracks are never complete.
+
+A video file can be replayed at its native frame rate as a stand-in for a live source, e.g. for testing offline:
+
+    python -m camera_traps.motion_detection.live path/to/video.mp4 --weights path/to/weights --max-queue-size 4
+"""
+from collections import deque
+from typing import Any, Callable, Optional, Union
+import argparse
+import dataclasses
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+import cv2
+
+from camera_traps.model.classifier import Classifier, ClassificationQueue, load_classifier
+from camera_traps.motion_detection.background import BACKGROUND_MODES, create_background_model
+from camera_traps.motion_detection.capture_motion import crop_bboxes, find_bboxes
+from camera_traps.motion_detection.metrics import PipelineMetrics, NULL_METRICS
+from camera_traps.motion_detection.tracking_objects import CentroidTracker
+
+DROP_POLICIES = ("drop_oldest", "drop_newest")
+
+
+@dataclasses.dataclass
+class LiveFrame:
+    """
+    A frame read from the live source.
+    """
+    id_frame: int
+    timestamp: float
+    frame: np.ndarray
+
+
+@dataclasses.dataclass
+class FrameDetections:
+    """
+    The detections of a frame of the live source, handed to the callback.
+    """
+    id_frame: int
+    frame: np.ndarray
+    boxes: list[tuple[int, int, int, int]]
+    tracks: np.ndarray
+    labels: Optional[list[str]] = None
+    scores: Optional[np.ndarray] = None
+    latency: float = 0.0
+
+
+class FrameQueue:
+    """
+    Bounded queue of frames that never blocks the producer: when it is full, a frame is dropped according to the drop
+    policy.
+    """
+
+    def __init__(self, max_size: int = 8, drop_policy: str = "drop_oldest"):
+        """
+        :param max_size: the maximum number of queued frames
+        :param drop_policy: 'drop_oldest' or 'drop_newest'
+        """
+        if drop_policy not in DROP_POLICIES:
+            raise ValueError(f"Unknown drop policy: {drop_policy}; choose one of {list(DROP_POLICIES)}")
+
+        self.max_size = max_size
+        self.drop_policy = drop_policy
+        self.n_dropped = 0
+        self._frames = deque()
+        self._closed = False
+        self._condition = threading.Condition()
+
+    def put(self, frame: LiveFrame):
+        """
+        :param frame: the frame to queue
+        """
+        with self._condition:
+            if len(self._frames) >= self.max_size:
+                self.n_dropped += 1
+                if self.drop_policy == "drop_newest":
+                    return
+                self._frames.popleft()
+            self._frames.append(frame)
+            self._condition.notify()
+
+    def get(self, timeout: Optional[float] = None) -> Optional[LiveFrame]:
+        """
+        :param timeout: the maximum time (in seconds) to wait for a frame
+        :return: the oldest queued frame, or None if no frame arrived in time or the queue is closed and empty
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: self._frames or self._closed, timeout=timeout)
+
+            return self._frames.popleft() if self._frames else None
+
+    @property
+    def done(self) -> bool:
+        """
+        :return: whether the queue is closed and all its frames have been taken
+        """
+        with self._condition:
+            return self._closed and not self._frames
+
+    def close(self):
+        """
+        Signal that no more frames will be queued.
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+
+class FrameReader(threading.Thread):
+    """
+    Producer thread reading the frames of the live source into a frame queue.
+    """
+
+    def __init__(self, source: Union[int, str], frames: FrameQueue, replay: bool = False,
+                 max_frames: Optional[int] = None):
+        """
+        :param source: the OpenCV source: a device index, a URL or a video file
+        :param frames: the queue of the read frames
+        :param replay: whether to read the frames at the native frame rate of the source, as if it were live
+        :param max_frames: the maximum number of frames to read
+        """
+        super().__init__(daemon=True)
+        self.source = source
+        self.frames = frames
+        self.replay = replay
+        self.max_frames = max_frames
+        self.n_read = 0
+        self.error = None
+        self._stop_event = threading.Event()
+
+    def run(self):
+        video = cv2.VideoCapture(self.source)
+        try:
+            if not video.isOpened():
+                raise IOError(f"Cannot open the video source {self.source}")
+            fps = video.get(cv2.CAP_PROP_FPS) or 25
+            start = time.monotonic()
+            while not self._stop_event.is_set() and (self.max_frames is None or self.n_read < self.max_frames):
+                if self.replay:
+                    # Wait for the time the frame would be captured by a live source.
+                    delay = start + self.n_read / fps - time.monotonic()
+                    if delay > 0:
+                        self._stop_event.wait(delay)
+                success, frame = video.read()
+                if not success:
+                    break
+                self.frames.put(LiveFrame(self.n_read, time.monotonic(), frame))
+                self.n_read += 1
+        except Exception as error:
+            self.error = error
+        finally:
+            video.release()
+            self.frames.close()
+
+    def stop(self):
+        """
+        Stop reading frames.
+        """
+        self._stop_event.set()
+
+
+class LiveDetector:
+    """
+    Consumer of the frames of a live source: it detects the motion, tracks the boxes and classifies their crops,
+    calling the callback with the detections of each frame.
+    """
+
+    def __init__(self, callback: Callable[[FrameDetections], Any], background: Optional[np.ndarray] = None,
+                 area_filer_out: int = 3000, classifier: Optional[Classifier] = None, score_filter_out: float = 95,
+                 background_mode: str = "running_average", detection_scale: float = 1.0, batch_size: int = 8,
+                 max_latency: float = 0.2, distance_limit: float = 30, metrics: Optional[PipelineMetrics] = None):
+        """
+        :param callback: the function called with the detections of each processed frame, in frame order
+        :param background: the background image (required by the 'static' mode)
+        :param area_filer_out: the bounding boxes' areas that will not be considered for motion detection if smaller
+        :param classifier: the classifier of the bounding boxes, if any
+        :param score_filter_out: the model scores that will not be considered for output predictions if smaller
+        :param background_mode: the background model (see `create_background_model`)
+        :param detection_scale: the scale at which the motion is detected (see `detect_bboxes`)
+        :param batch_size: the maximum number of crops classified together
+        :param max_latency: the maximum time (in seconds) a frame waits for its crops to be classified
+        :param distance_limit: the maximum distance between the centroids of the same object in consecutive frames
+        :param metrics: the metrics of the pipeline (see `camera_traps.motion_detection.metrics`)
+        """
+        if background_mode == "static" and background is None:
+            raise ValueError("The 'static' background mode requires a background image on a live source")
+
+        self.callback = callback
+        self.area_filer_out = area_filer_out
+        self.classifier = classifier
+        self.score_filter_out = score_filter_out
+        self.detection_scale = detection_scale
+        self.max_latency = max_latency
+        self.metrics = metrics or NULL_METRICS
+
+        self.background_model = create_background_model(background_mode, background, scale=detection_scale)
+        self.tracker = CentroidTracker(distance_limit=distance_limit)
+        self.queue = ClassificationQueue(classifier, max_batch_size=batch_size, max_latency=max_latency) \
+            if classifier is not None else None
+        self.latencies = list()
+        self.n_processed = 0
+
+    def process(self, live_frame: LiveFrame):
+        """
+        Detect, track and queue for classification the boxes of a frame.
+
+        :param live_frame: the frame read from the live source
+        """
+        frame = live_frame.frame
+        coordinates = find_bboxes(frame, self.background_model, self.area_filer_out, self.detection_scale,
+                                  self.metrics)
+        centroids = np.array([(x + w / 2, y + h / 2) for x, y, w, h in coordinates]).reshape(-1, 2)
+        # The dropped frames are skipped by the tracker, which follows the sequence of the processed frames.
+        tracks = self.tracker.update(self.n_processed, centroids)
+        self.n_processed += 1
+        self.metrics.count("frames")
+        self.metrics.frame_done(live_frame.id_frame)
+
+        detections = FrameDetections(live_frame.id_frame, frame, coordinates, tracks)
+        if self.queue is None:
+            self._emit(live_frame, detections, None)
+        else:
+            crops = crop_bboxes(frame, coordinates, self.metrics)
+            self.metrics.count("crops_classified", len(crops))
+            with self.metrics.time("classify"):
+                done = self.queue.put((live_frame, detections), crops)
+            for (done_frame, done_detections), predictions in done:
+                self._emit(done_frame, done_detections, predictions)
+
+    def poll(self, flush: bool = False):
+        """
+        Classify the queued crops if the batch is full or the latency limit is reached.
+
+        :param flush: whether to classify all the queued crops anyway
+        """
+        if self.queue is None:
+            return
+        with self.metrics.time("classify"):
+            done = self.queue.flush() if flush else self.queue.poll()
+        for (done_frame, done_detections), predictions in done:
+            self._emit(done_frame, done_detections, predictions)
+
+    def _emit(self, live_frame: LiveFrame, detections: FrameDetections, predictions: Optional[np.ndarray]):
+        if predictions is not None:
+            scores = predictions.max(axis=1).round(2) * 100
+            labels = np.asarray(self.classifier.labels, dtype=object)[predictions.argmax(axis=1)]
+            labels[scores < self.score_filter_out] = "None_of_the_above"
+            detections.labels, detections.scores = labels.tolist(), scores
+        elif self.classifier is not None:
+            detections.labels, detections.scores = [], np.empty(0)
+
+        detections.latency = time.monotonic() - live_frame.timestamp
+        self.latencies.append(detections.latency)
+        self.callback(detections)
+
+
+def get_latency_summary(latencies: list[float]) -> dict:
+    """
+    :param latencies: the latencies (in seconds) of the processed frames
+    :return: the mean, median, 95th percentile and maximum latency (in seconds)
+    """
+    if not latencies:
+        return {"mean": None, "p50": None, "p95": None, "max": None}
+    latencies = np.asarray(latencies)
+
+    return {"mean": float(latencies.mean()), "p50": float(np.percentile(latencies, 50)),
+            "p95": float(np.percentile(latencies, 95)), "max": float(latencies.max())}
+
+
+def detect_motion_on_live_stream(source: Union[int, str], callback: Callable[[FrameDetections], Any],
+                                 input_background_path: Optional[str] = None, area_filer_out: int = 3000,
+                                 weights_path: Optional[str] = None, classifier: Optional[Classifier] = None,
+                                 score_filter_out: float = 95, background_mode: str = "running_average",
+                                 detection_scale: float = 1.0, max_queue_size: int = 8,
+                                 drop_policy: str = "drop_oldest", batch_size: int = 8, max_latency: float = 0.2,
+                                 replay: Optional[bool] = None, max_frames: Optional[int] = None,
+                                 backend: str = "keras", num_threads: Optional[int] = None,
+                                 metrics: Optional[PipelineMetrics] = None,
+                                 stop_event: Optional[threading.Event] = None) -> dict:
+    """
+    Detect the motion on a live source, calling the callback with the detections of each processed frame, until the
+    source ends, `max_frames` frames are read or the stop event is set.
+
+    :param source: the OpenCV source: a device index, a URL or a video file
+    :param callback: the function called with the detections of each processed frame (see `FrameDetections`)
+    :param input_background_path: the path to the input background image (required by the 'static' mode)
+    :param area_filer_out: the bounding boxes' areas that will not be considered for motion detection if smaller
+    :param weights_path: the path to the weights of the model for predicting the detected bounding boxes
+    :param classifier: the classifier of the bounding boxes; if not provided, it is loaded from the weights path
+    :param score_filter_out: the model scores that will not be considered for output predictions if smaller
+    :param background_mode: the background model (see `create_background_model`)
+    :param detection_scale: the scale at which the motion is detected (see `detect_bboxes`)
+    :param max_queue_size: the maximum number of frames waiting to be processed
+    :param drop_policy: the frame dropped when the queue is full: 'drop_oldest' or 'drop_newest'
+    :param batch_size: the maximum number of crops classified together
+    :param max_latency: the maximum time (in seconds) a frame waits for its crops to be classified
+    :param replay: whether to read the source at its native frame rate, as if it were live; by default, only the video
+        files are replayed
+    :param max_frames: the maximum number of frames to read
+    :param backend: the inference backend of the classifier (see `load_classifier`)
+    :param num_threads: the number of CPU threads of the 'tflite' and 'onnx' backends
+    :param metrics: the metrics of the pipeline (see `camera_traps.motion_detection.metrics`)
+    :param stop_event: the event that stops the detection when set
+    :return: the numbers of read, processed and dropped frames and the latency summary (see `get_latency_summary`)
+    """
+    if classifier is None and weights_path:
+        classifier = load_classifier(weights_path, backend=backend, num_threads=num_threads)
+    background = cv2.imread(input_background_path) if input_background_path else None
+    if replay is None:
+        replay = isinstance(source, str) and os.path.isfile(source)
+
+    detector = LiveDetector(callback, background, area_filer_out, classifier, score_filter_out, background_mode,
+                            detection_scale, batch_size, max_latency, metrics=metrics)
+    frames = FrameQueue(max_queue_size, drop_policy)
+    reader = FrameReader(source, frames, replay=replay, max_frames=max_frames)
+
+    t1 = time.monotonic()
+    reader.start()
+    try:
+        while not frames.done and not (stop_event is not None and stop_event.is_set()):
+            live_frame = frames.get(timeout=max_latency)
+            if live_frame is not None:
+                detector.process(live_frame)
+            detector.poll()
+        detector.poll(flush=True)
+    finally:
+        reader.stop()
+        reader.join()
+    elapsed = time.monotonic() - t1
+
+    if reader.error is not None:
+        raise reader.error
+
+    summary = {"read": reader.n_read, "processed": detector.n_processed, "dropped": frames.n_dropped,
+               "fps": detector.n_processed / elapsed if elapsed > 0 else 0.0,
+               "latency": get_latency_summary(detector.latencies)}
+    if metrics is not None:
+        summary["metrics"] = metrics.finish()
+    logging.info(f"Processed {summary['processed']} of {summary['read']} frames ({summary['dropped']} dropped), "
+                 f"latency p95 {summary['latency']['p95']} s")
+
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("source", help="device index, URL or video file (replayed at its frame rate)")
+    parser.add_argument("--background", default=None, help="background image (required by the 'static' mode)")
+    parser.add_argument("--background-mode", default="running_average", choices=list(BACKGROUND_MODES),
+                        help="background model used for detecting the motion")
+    parser.add_argument("--detection-scale", type=float, default=1.0, help="scale at which the motion is detected")
+    parser.add_argument("--area-filter-out", type=int, default=3000, help="minimum area of the bounding boxes")
+    parser.add_argument("--weights", default=None, help="folder containing 'weights.h5' and 'labels'")
+    parser.add_argument("--score-filter-out", type=float, default=95, help="minimum score of the predictions")
+    parser.add_argument("--max-queue-size", type=int, default=8, help="maximum number of queued frames")
+    parser.add_argument("--drop-policy", default="drop_oldest", choices=list(DROP_POLICIES),
+                        help="frame dropped when the queue is full")
+    parser.add_argument("--max-latency", type=float, default=0.2, help="maximum wait of a frame for its batch (s)")
+    parser.add_argument("--max-frames", type=int, default=None, help="maximum number of frames to read")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    def print_detections(detections: FrameDetections):
+        if detections.boxes:
+            print(detections.id_frame, detections.boxes, detections.labels, f"{detections.latency:.3f} s")
+
+    source = int(args.source) if args.source.isdigit() else args.source
+    print(detect_motion_on_live_stream(source, print_detections, input_background_path=args.background,
+                                       area_filer_out=args.area_filter_out, weights_path=args.weights,
+                                       score_filter_out=args.score_filter_out, background_mode=args.background_mode,
+                                       detection_scale=args.detection_scale, max_queue_size=args.max_queue_size,
+                                       drop_policy=args.drop_policy, max_latency=args.max_latency,
+                                       max_frames=args.max_frames))
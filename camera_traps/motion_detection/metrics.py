@@ -0,0 +1,156 @@
+"""
+Instrumentation of the motion detection pipeline: cumulative timers of its stages (decode, difference, contours, merge,
+crop, classify, tracking, write) and counters of what flows through them (frames, contours, boxes, classified crops).
+
+The stages take an optional `PipelineMetrics`; when it is not provided, they use `NULL_METRICS`, whose timers and
+counters do nothing, so that the disabled instrumentation costs a few attribute lookups per frame. The metrics are
+reported to observers (see `MetricsObserver`) after each frame and when the video is completed, and their summary is a
+plain dictionary that can be attached to the results.
+"""
+from collections import defaultdict
+import contextlib
+import logging
+import time
+
+# The order in which the stages are reported.
+STAGES = ("background", "decode", "difference", "contours", "merge", "crop", "classify", "tracking", "write")
+
+
+class MetricsObserver:
+    """
+    Observer of the metrics of a video. The default callbacks do nothing, so that subclasses only override the ones
+    they need.
+    """
+
+    def on_frame(self, id_frame: int, metrics: "PipelineMetrics"):
+        """
+        Called after the motion of a frame has been detected.
+
+        :param id_frame: the index of the frame
+        :param metrics: the metrics collected so far
+        """
+
+    def on_finish(self, summary: dict):
+        """
+        Called when the video has been completed.
+
+        :param summary: the summary of the metrics (see `PipelineMetrics.summary`)
+        """
+
+
+class LoggingObserver(MetricsObserver):
+    """
+    Observer logging the summary of the metrics of each video.
+    """
+
+    def on_finish(self, summary: dict):
+        stages = ", ".join(f"{stage} {elapsed:.2f} s" for stage, elapsed in summary["stages"].items())
+        logging.info(f"{summary['counters'].get('frames', 0)} frames in {summary['elapsed']:.2f} s "
+                     f"({summary['fps']:.1f} frames/s): {stages}")
+
+
+class PipelineMetrics:
+    """
+    Cumulative timers and counters of the stages of the pipeline, for a single video: the clock of the frames per
+    second starts when the metrics are created.
+    """
+
+    def __init__(self, observers: tuple[MetricsObserver, ...] = ()):
+        """
+        :param observers: the observers notified after each frame and when the video is completed
+        """
+        self.observers = list(observers)
+        self.timings = defaultdict(float)
+        self.counters = defaultdict(int)
+        self.start = time.perf_counter()
+        self.elapsed = None
+
+    @contextlib.contextmanager
+    def time(self, stage: str):
+        """
+        Add the elapsed time of the block to the timer of a stage.
+
+        :param stage: the name of the stage
+        """
+        t1 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[stage] += time.perf_counter() - t1
+
+    def count(self, counter: str, n: int = 1):
+        """
+        :param counter: the name of the counter
+        :param n: the amount added to the counter
+        """
+        self.counters[counter] += n
+
+    def merge(self, timings: dict, counters: dict):
+        """
+        Add the timers and the counters collected elsewhere, e.g. by a worker process.
+
+        :param timings: the elapsed time (in seconds) of each stage
+        :param counters: the value of each counter
+        """
+        for stage, elapsed in timings.items():
+            self.timings[stage] += elapsed
+        for counter, n in counters.items():
+            self.counters[counter] += n
+
+    def frame_done(self, id_frame: int):
+        """
+        Notify the observers that a frame has been processed.
+
+        :param id_frame: the index of the frame
+        """
+        for observer in self.observers:
+            observer.on_frame(id_frame, self)
+
+    def finish(self) -> dict:
+        """
+        Stop the clock and notify the observers with the summary.
+
+        :return: the summary of the metrics
+        """
+        self.elapsed = time.perf_counter() - self.start
+        summary = self.summary()
+        for observer in self.observers:
+            observer.on_finish(summary)
+
+        return summary
+
+    def summary(self) -> dict:
+        """
+        :return: the total elapsed time (in seconds), the frames per second, the elapsed time of each stage (in seconds)
+            and the counters
+        """
+        elapsed = self.elapsed if self.elapsed is not None else time.perf_counter() - self.start
+        stages = sorted(self.timings, key=lambda s: STAGES.index(s) if s in STAGES else len(STAGES))
+
+        return {"elapsed": elapsed,
+                "fps": self.counters.get("frames", 0) / elapsed if elapsed > 0 else 0.0,
+                "stages": {stage: self.timings[stage] for stage in stages},
+                "counters": dict(self.counters)}
+
+
+class NullMetrics:
+    """
+    Metrics that record nothing, used when the instrumentation is disabled.
+    """
+
+    _timer = contextlib.nullcontext()
+
+    def time(self, stage: str) -> contextlib.nullcontext:
+        return self._timer
+
+    def count(self, counter: str, n: int = 1):
+        pass
+
+    def merge(self, timings: dict, counters: dict):
+        pass
+
+    def frame_done(self, id_frame: int):
+        pass
+
+
+NULL_METRICS = NullMetrics()
@@ -0,0 +1,213 @@
+"""
+Parquet storage of the detections, so that a video has not to be decoded again for analyzing its results.
+
+The detections of a video are written once, at the end of its processing (the tracking and the label voting need all
+of its frames), in row groups of consecutive frames with one typed column for each field; the class probabilities of
+the classified boxes are stored as well, in a fixed size list column, so that the thresholds can be applied again
+without running the model (see `read_detections_with_probabilities`). The parameters of the run and the classes of the
+model are stored in the file metadata. Since every row group keeps the statistics of its columns, the detections of a
+range of frames or of some labels are read without loading the whole file (see `read_detections`).
+
+The Parquet support requires the optional `pyarrow` dependency, which is imported only when needed.
+"""
+from typing import Optional
+import json
+
+import numpy as np
+import pandas as pd
+
+from camera_traps.motion_detection.detections import Detections
+
+METADATA_KEY = b"camera_traps"
+
+
+def import_pyarrow():
+    """
+    Import pyarrow and its Parquet module, which are optional dependencies.
+
+    :return: the pyarrow and pyarrow.parquet modules
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as error:
+        raise ImportError("The Parquet output requires pyarrow: install it with `pip install pyarrow`") from error
+
+    return pa, pq
+
+
+def get_schema(n_classes: int = 0):
+    """
+    :param n_classes: the number of classes of the model; if 0, the class probabilities are not stored
+    :return: the Arrow schema of the Parquet files
+    """
+    pa, _ = import_pyarrow()
+
+    fields = [("id_frame", pa.int32()),
+              ("x", pa.int32()), ("y", pa.int32()), ("w", pa.int32()), ("h", pa.int32()),
+              ("score", pa.float32()),
+              ("label", pa.dictionary(pa.int32(), pa.string())),
+              ("track_index", pa.int32())]
+    if n_classes:
+        # Parquet has no half precision type: the float16 probabilities are stored as float32, without loss.
+        fields.append(("probabilities", pa.list_(pa.float32(), n_classes)))
+
+    return pa.schema(fields)
+
+
+def to_arrow_table(detections: Detections):
+    """
+    Convert the detections to an Arrow table with the schema of the Parquet files; the missing scores, labels and
+    tracks are stored as nulls, the class probabilities only if the boxes have been classified.
+
+    :param detections: the detected bounding boxes
+    :return: the Arrow table
+    """
+    pa, _ = import_pyarrow()
+
+    label = detections.label
+    labels = pa.DictionaryArray.from_arrays(pa.array(label.codes.astype(np.int32), mask=label.codes < 0),
+                                            pa.array([str(c) for c in label.categories], type=pa.string()))
+    columns = [pa.array(detections.id_frame, type=pa.int32()),
+               *[pa.array(c, type=pa.int32()) for c in (detections.x, detections.y, detections.w, detections.h)],
+               pa.array(detections.score, type=pa.float32(), mask=np.isnan(detections.score)),
+               labels,
+               pa.array(detections.track_index, type=pa.int32(), mask=detections.track_index < 0)]
+    n_classes = 0
+    if detections.probabilities is not None:
+        n_classes = detections.probabilities.shape[1]
+        values = pa.array(detections.probabilities.astype(np.float32).ravel(), type=pa.float32())
+        columns.append(pa.FixedSizeListArray.from_arrays(values, n_classes))
+
+    return pa.Table.from_arrays(columns, schema=get_schema(n_classes))
+
+
+class ParquetSink:
+    """
+    Write the detections of a video to a Parquet file, one row group for every chunk of consecutive frames. Every call
+    to `write` appends its detections, which have to follow the ones already written.
+
+        with ParquetSink("detections.parquet", metadata={"area_filer_out": 3000}) as sink:
+            sink.write(detections)
+    """
+
+    def __init__(self, path: str, metadata: Optional[dict] = None, row_group_frames: int = 1000,
+                 classes: Optional[list[str]] = None):
+        """
+        :param path: the path to the Parquet file
+        :param metadata: the parameters of the run, stored in the file metadata as JSON
+        :param row_group_frames: the number of consecutive frames stored in each row group
+        :param classes: the classes of the model, ordered as the columns of the probabilities; if not provided, the
+            detections are stored without their class probabilities
+        """
+        _, pq = import_pyarrow()
+
+        self.path = path
+        self.row_group_frames = row_group_frames
+        metadata = {**(metadata or {}), "classes": list(classes)} if classes else metadata or {}
+        schema = get_schema(len(classes) if classes else 0) \
+            .with_metadata({METADATA_KEY: json.dumps(metadata).encode()})
+        self.writer = pq.ParquetWriter(str(path), schema)
+
+    def write(self, detections: Detections):
+        """
+        Append the detections to the file.
+
+        :param detections: the detected bounding boxes, sorted by frame
+        """
+        if detections.empty:
+            return
+
+        table = to_arrow_table(detections).select(self.writer.schema.names)
+        # Split the detections into chunks of consecutive frames.
+        chunks = np.asarray(detections.id_frame) // self.row_group_frames
+        boundaries = [0, *(np.flatnonzero(np.diff(chunks)) + 1).tolist(), len(detections)]
+        for start, stop in zip(boundaries[:-1], boundaries[1:]):
+            self.writer.write_table(table.slice(start, stop - start))
+
+    def close(self):
+        self.writer.close()
+
+    def __enter__(self) -> "ParquetSink":
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def write_detections(detections: Detections, path: str, metadata: Optional[dict] = None,
+                     row_group_frames: int = 1000):
+    """
+    Save the detections of a video to a Parquet file.
+
+    :param detections: the detected bounding boxes, sorted by frame
+    :param path: the path to the Parquet file
+    :param metadata: the parameters of the run, stored in the file metadata as JSON
+    :param row_group_frames: the number of consecutive frames stored in each row group
+    """
+    with ParquetSink(path, metadata=metadata, row_group_frames=row_group_frames, classes=detections.classes) as sink:
+        sink.write(detections)
+
+
+def read_metadata(path: str) -> dict:
+    """
+    Read the parameters of the run stored in a Parquet file of detections.
+
+    :param path: the path to the Parquet file
+    :return: the parameters of the run
+    """
+    _, pq = import_pyarrow()
+
+    metadata = pq.read_schema(path).metadata or {}
+
+    return json.loads(metadata.get(METADATA_KEY, b"{}"))
+
+
+def read_detections(path: str, frames: Optional[tuple[int, int]] = None, labels: Optional[list[str]] = None,
+                    columns: Optional[list[str]] = None) -> pd.DataFrame:
+    """
+    Read the detections stored in a Parquet file. The file is memory-mapped and the row groups that cannot contain the
+    requested frames are skipped.
+
+    :param path: the path to the Parquet file
+    :param frames: the first (included) and the last (excluded) frame to read
+    :param labels: the labels to read
+    :param columns: the columns to read; by default, all of them but the class probabilities
+    :return: the DataFrame of the detections, the missing values being nulls
+    """
+    pa, pq = import_pyarrow()
+
+    filters = list()
+    if frames is not None:
+        filters.extend([("id_frame", ">=", frames[0]), ("id_frame", "<", frames[1])])
+    if labels is not None:
+        filters.append(("label", "in", list(labels)))
+
+    if columns is None:
+        columns = [name for name in pq.read_schema(path).names if name != "probabilities"]
+    table = pq.read_table(path, columns=columns, filters=filters or None, memory_map=True)
+
+    # Keep the integer columns as integers, even if some tracks are missing.
+    return table.to_pandas(types_mapper={pa.int32(): pd.Int32Dtype()}.get)
+
+
+def read_detections_with_probabilities(path: str) -> Detections:
+    """
+    Load the detections stored in a Parquet file, together with their class probabilities, so that they can be
+    relabeled with other thresholds without running the model (see `Detections.relabel`).
+
+    :param path: the path to the Parquet file
+    :return: the detected bounding boxes
+    """
+    pa, pq = import_pyarrow()
+
+    table = pq.read_table(path, memory_map=True)
+    classes = read_metadata(path).get("classes")
+    probabilities = None
+    if "probabilities" in table.column_names:
+        values = table.column("probabilities").combine_chunks().flatten().to_numpy()
+        probabilities = values.reshape(len(table), len(classes))
+        table = table.drop(["probabilities"])
+
+    return Detections.from_table(table.to_pandas(types_mapper={pa.int32(): pd.Int32Dtype()}.get),
+                                 probabilities=probabilities, classes=classes)
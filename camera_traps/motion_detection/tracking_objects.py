@@ -2,13 +2,82 @@ import pandas as pd
 import numpy as np
 
 
-def flatten_concatenated_mapping(key, value, dictionary):
-    if dictionary.get(value) is not None:
-        new_value = dictionary.get(value)
-        dictionary[key] = new_value
-        return flatten_concatenated_mapping(key, new_value, dictionary)
-    else:
-        return dictionary
+class CentroidTracker:
+    """
+    Online tracker that assigns a unique ID to the boxes of consecutive frames based on the distance of their
+    centroids. Only the centroids of the previous frame are kept, so that the tracker can be fed frame by frame (e.g.
+    from a streaming pipeline) in time linear in the number of detections.
+
+    A box continues the track of a box of the previous frame if their centroids have a distance not greater than the
+    provided limit; if more boxes of the previous frame are close enough, the last one (in detection order) is chosen.
+    Otherwise, a new track is started. The tracks are numbered in order of appearance.
+    """
+
+    def __init__(self, distance_limit: float = 10):
+        self.distance_limit = distance_limit
+        self.num_tracks = 0
+        self._previous_id_frame = None
+        self._previous_centroids = np.empty((0, 2))
+        self._previous_tracks = np.empty(0, dtype=int)
+
+    def update(self, id_frame: int, centroids: np.ndarray) -> np.ndarray:
+        """
+        Assign the track IDs to the boxes of a new frame.
+
+        :param id_frame: the frame ID; the frames must be provided in ascending order
+        :param centroids: the (N, 2) array of the x and y coordinates of the boxes' centroids
+        :return: the track IDs of the boxes
+        """
+        centroids = np.asarray(centroids, dtype=float).reshape(-1, 2)
+        tracks = np.empty(len(centroids), dtype=int)
+
+        matched = np.zeros(len(centroids), dtype=bool)
+        if self._previous_id_frame is not None and id_frame - self._previous_id_frame == 1 \
+                and len(self._previous_centroids):
+            # Compute the distances between the current and the previous centroids.
+            deltas = centroids[:, np.newaxis, :] - self._previous_centroids[np.newaxis, :, :]
+            close = np.hypot(deltas[..., 0], deltas[..., 1]) <= self.distance_limit
+            matched = close.any(axis=1)
+            # Get the last close box of the previous frame.
+            last_close = close.shape[1] - 1 - np.argmax(close[:, ::-1], axis=1)
+            tracks[matched] = self._previous_tracks[last_close[matched]]
+
+        # Start new tracks for the unmatched boxes.
+        n_new = np.count_nonzero(~matched)
+        tracks[~matched] = np.arange(self.num_tracks, self.num_tracks + n_new)
+        self.num_tracks += n_new
+
+        self._previous_id_frame = id_frame
+        self._previous_centroids = centroids
+        self._previous_tracks = tracks
+
+        return tracks
+
+
+def track_centroids(id_frames: np.ndarray, centroids: np.ndarray, distance_limit: float = 10) -> np.ndarray:
+    """
+    Retrieve the unique IDs of the boxes over time (consecutive frames) based on distance condition of the relative
+    centroids.
+
+    :param id_frames: the frame ID of each box
+    :param centroids: the (N, 2) array of the x and y coordinates of the boxes' centroids
+    :param distance_limit: the maximum distance between the centroids of the same object in consecutive frames
+    :return: the tracking IDs of the boxes, numbered in order of appearance
+    """
+    id_frames = np.asarray(id_frames)
+    centroids = np.asarray(centroids, dtype=float).reshape(-1, 2)
+
+    # Feed the tracker frame by frame.
+    tracker = CentroidTracker(distance_limit=distance_limit)
+    tracks = np.empty(len(id_frames), dtype=int)
+    order = np.argsort(id_frames, kind="stable")
+    boundaries = np.flatnonzero(np.diff(id_frames[order])) + 1
+    for positions in np.split(order, boundaries):
+        if len(positions):
+            tracks[positions] = tracker.update(id_frames[positions[0]], centroids[positions])
+
+    # Number the tracks in order of appearance.
+    return pd.factorize(tracks)[0]
 
 
 def tracking(df: pd.DataFrame, distance_limit: float = 10):
@@ -22,26 +91,10 @@ def tracking(df: pd.DataFrame, distance_limit: float = 10):
         |  ------  |  ------  |
 
     :param df: the DataFrame containing boxes' centroid (centroid) and the frame IDs (id_frame)
-    :param distance_limit:
-    :return:
+    :param distance_limit: the maximum distance between the centroids of the same object in consecutive frames
+    :return: the tracking IDs of the boxes, numbered in order of appearance
     """
-    # Create unique row id.
-    df_centroid = df[["id_frame", "centroid"]].copy()
-    df_centroid["index"] = np.arange(0, len(df_centroid))
-    # Get all the combination boxes between consecutive frames.
-    traker = pd.merge(df_centroid, df_centroid, how="cross", suffixes=(" (t)", " (t-1)"))
-    traker.query("`id_frame (t)` - `id_frame (t-1)` == 1", inplace=True)
-    # Consider the boxes to be the same if their centroids have a distance smaller than a provided threshold.
-    traker["distance"] = traker.apply(lambda x: x["centroid (t)"].distance(x["centroid (t-1)"]), axis=1)
-    traker.query("distance <= @distance_limit", inplace=True)
-
-    # Get a dictionary de-concatenating the inner mapping.
-    mapping = traker.set_index("index (t)")["index (t-1)"].to_dict()
-    for k, v in mapping.items():
-        mapping = flatten_concatenated_mapping(k, v, mapping)
-
-    tracking_index = df_centroid["index"].map(mapping).fillna(df_centroid["index"]).astype(int)
-    ascending_mapping = dict(zip(tracking_index.unique(), np.arange(0, tracking_index.nunique())))
-    tracking_index = tracking_index.map(ascending_mapping)
-
-    return tracking_index
+    centroids = np.array([(centroid.x, centroid.y) for centroid in df["centroid"]], dtype=float).reshape(-1, 2)
+
+    return pd.Series(track_centroids(df["id_frame"].to_numpy(), centroids, distance_limit=distance_limit),
+                     index=df.index)
@@ -0,0 +1,18 @@
+import pytest
+
+from camera_traps.benchmarks.synthetic import write_video
+
+
+@pytest.fixture
+def make_video(tmp_path):
+    """
+    Write a small synthetic camera-trap video (see `camera_traps.benchmarks.synthetic`).
+    """
+    def make(name: str = "video.mp4", n_frames: int = 40, width: int = 320, height: int = 240, seed: int = 0,
+             **kwargs) -> str:
+        path = tmp_path / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        return write_video(str(path), n_frames, width, height, n_sprites=2, drift=0, seed=seed, **kwargs)
+
+    return make
@@ -0,0 +1,114 @@
+import cv2
+import numpy as np
+import pytest
+
+from camera_traps.benchmarks.synthetic import generate_frames, make_background
+from camera_traps.motion_detection.background import RunningAverageBackground, StaticBackground, \
+    create_background_model
+from camera_traps.motion_detection.capture_motion import find_bboxes, get_background
+from camera_traps.motion_detection.geometry_utils import compose_polygon, get_bbox_without_intersection
+
+WIDTH, HEIGHT = 160, 120
+
+
+def baseline_find_bboxes(frame: np.ndarray, background: np.ndarray, area_filer_out: int) \
+        -> list[tuple[int, int, int, int]]:
+    # The motion detection of a frame before the background models.
+    difference = cv2.cvtColor(cv2.absdiff(background, frame), cv2.COLOR_BGR2GRAY)
+    difference = cv2.GaussianBlur(difference, (11, 11), 0)
+    _, thresh = cv2.threshold(difference, 20, 255, cv2.THRESH_BINARY)
+    thresh = cv2.dilate(thresh, None, iterations=2)
+    contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    polygons = [compose_polygon(*cv2.boundingRect(c)) for c in contours if cv2.contourArea(c) > area_filer_out]
+
+    return get_bbox_without_intersection(polygons)
+
+
+def still_background() -> np.ndarray:
+    return make_background(WIDTH, HEIGHT, np.random.default_rng(0))
+
+
+def with_object(background: np.ndarray, x: int = 40, y: int = 30) -> np.ndarray:
+    frame = background.copy()
+    cv2.rectangle(frame, (x, y), (x + 40, y + 30), (255, 255, 255), -1)
+
+    return frame
+
+
+def covers(boxes: list[tuple[int, int, int, int]], x: int = 40, y: int = 30) -> bool:
+    # Whether a box contains the center of the object drawn by `with_object`.
+    return any(bx <= x + 20 <= bx + bw and by <= y + 15 <= by + bh for bx, by, bw, bh in boxes)
+
+
+def test_static_background_matches_the_baseline():
+    # A tiny synthetic video with a single sprite, so that the merged boxes are never tilted.
+    frames = list(generate_frames(n_frames=20, width=WIDTH, height=HEIGHT, n_sprites=1, drift=0, seed=3))
+    background = make_background(WIDTH, HEIGHT, np.random.default_rng(3))
+    model = StaticBackground(background)
+
+    n_boxes = 0
+    for frame in frames:
+        boxes = find_bboxes(frame, model, area_filer_out=100)
+        assert sorted(boxes) == sorted(baseline_find_bboxes(frame, background, area_filer_out=100))
+        n_boxes += len(boxes)
+    assert n_boxes > 0
+
+
+def test_static_background():
+    background = still_background()
+    model = create_background_model("static", background)
+
+    assert find_bboxes(background, model, 100) == []
+    assert covers(find_bboxes(with_object(background), model, 100))
+    # The background never changes, so a still object is always detected.
+    for _ in range(5):
+        boxes = find_bboxes(with_object(background), model, 100)
+    assert covers(boxes)
+
+
+def test_running_average_background():
+    background = still_background()
+    # Without a background image, the first frame is used.
+    model = create_background_model("running_average")
+
+    assert find_bboxes(background, model, 100) == []
+    assert covers(find_bboxes(with_object(background), model, 100))
+
+    # A still object is absorbed into the background.
+    model = RunningAverageBackground(background, alpha=0.5)
+    frame = with_object(background)
+    assert covers(find_bboxes(frame, model, 100))
+    for _ in range(10):
+        boxes = find_bboxes(frame, model, 100)
+    assert boxes == []
+
+
+@pytest.mark.parametrize("background_mode", ["mog2", "knn"])
+def test_subtractor_background(background_mode):
+    background = still_background()
+    model = create_background_model(background_mode, background)
+
+    for _ in range(5):
+        assert find_bboxes(background, model, 100) == []
+    assert covers(find_bboxes(with_object(background, x=90, y=60), model, 100), x=90, y=60)
+
+
+@pytest.mark.parametrize("background_mode", ["static", "running_average", "mog2", "knn"])
+def test_background_modes_at_a_detection_scale(background_mode):
+    background = still_background()
+    model = create_background_model(background_mode, background, scale=0.5)
+
+    assert covers(find_bboxes(with_object(background), model, 100, detection_scale=0.5))
+
+
+def test_unknown_background_mode():
+    with pytest.raises(ValueError, match="Unknown background mode"):
+        create_background_model("median")
+
+
+def test_get_background_without_frames(tmp_path):
+    video_path = tmp_path / "empty.mp4"
+    video_path.write_bytes(b"")
+
+    with pytest.raises(ValueError, match="empty.mp4"):
+        get_background(str(video_path))
@@ -0,0 +1,80 @@
+import os
+
+import numpy as np
+import pytest
+
+from camera_traps.motion_detection import cache as cache_module
+from camera_traps.motion_detection.cache import DetectionCache
+from camera_traps.motion_detection.detections import Detections
+
+CROPS_SIZE = 10 * 128 * 128 * 3
+
+
+@pytest.fixture
+def video_path(tmp_path):
+    path = tmp_path / "video.mp4"
+    path.write_bytes(np.random.default_rng(0).bytes(1 << 20))
+
+    return str(path)
+
+
+def make_motion(n_boxes: int = 10, seed: int = 0) -> tuple[Detections, np.ndarray]:
+    rng = np.random.default_rng(seed)
+    detections = Detections.from_boxes(np.arange(n_boxes), rng.integers(0, 100, (n_boxes, 4)).tolist())
+
+    return detections, rng.integers(0, 256, (n_boxes, 128, 128, 3), dtype=np.uint8)
+
+
+def test_hit_and_miss_after_parameter_change(tmp_path, video_path):
+    cache = DetectionCache(str(tmp_path / "cache"))
+    key = cache.get_key(video_path, {"area_filer_out": 3000})
+    assert cache.load_motion(key) is None
+
+    detections, crops = make_motion()
+    cache.save_motion(key, detections, crops)
+
+    # A new cache on the same directory, as in a later run.
+    cached = DetectionCache(str(tmp_path / "cache")).load_motion(key)
+    assert cached is not None
+    np.testing.assert_array_equal(cached[0].boxes, detections.boxes)
+    np.testing.assert_array_equal(cached[0].id_frame, detections.id_frame)
+    np.testing.assert_array_equal(cached[1], crops)
+
+    other_key = cache.get_key(video_path, {"area_filer_out": 1000})
+    assert other_key != key
+    assert cache.load_motion(other_key) is None
+
+
+def test_video_hashed_once(tmp_path, video_path, monkeypatch):
+    calls = []
+    get_file_hash = cache_module.get_file_hash
+    monkeypatch.setattr(cache_module, "get_file_hash", lambda path: calls.append(path) or get_file_hash(path))
+
+    cache = DetectionCache(str(tmp_path / "cache"))
+    key = cache.get_key(video_path, {})
+    assert DetectionCache(str(tmp_path / "cache")).get_key(video_path, {}) == key
+    assert len(calls) == 1
+
+    # A changed video is hashed again.
+    with open(video_path, "ab") as fp:
+        fp.write(b"more")
+    assert cache.get_key(video_path, {}) != key
+    assert len(calls) == 2
+
+
+def test_lru_eviction(tmp_path, video_path):
+    cache = DetectionCache(str(tmp_path / "cache"), max_size=int(2.5 * CROPS_SIZE))
+    keys = [cache.get_key(video_path, {"n": i}) for i in range(3)]
+
+    for i, key in enumerate(keys[:2]):
+        cache.save_motion(key, *make_motion(seed=i))
+        os.utime(cache.cache_dir / key, (1000 + i, 1000 + i))
+    # Using the first entry makes the second one the least recently used.
+    assert cache.load_motion(keys[0]) is not None
+
+    cache.save_motion(keys[2], *make_motion(seed=2))
+
+    assert cache.load_motion(keys[0]) is not None
+    assert cache.load_motion(keys[1]) is None
+    assert cache.load_motion(keys[2]) is not None
+    assert sum(size for _, _, size in cache.get_entries()) <= cache.max_size
@@ -0,0 +1,120 @@
+import cv2
+import numpy as np
+import pytest
+
+from camera_traps.benchmarks.detection_scale import get_iou
+from camera_traps.benchmarks.synthetic import generate_frames
+from camera_traps.motion_detection.capture_motion import ThreadedVideoWriter, detect_bboxes, detect_bboxes_in_range, \
+    detect_bboxes_parallel, get_video_properties, read_frames
+
+# The frames showing the moving object: with 40 frames and 3 jobs the ranges start at the frames 13 and 26, the first
+# one during the motion and the second one on a frame skipped by the sequential run (when sampling every 4 frames).
+MOTION_FRAMES = [*range(8, 15), *range(26, 34)]
+
+
+@pytest.fixture
+def gated_video(tmp_path) -> str:
+    """
+    Write a video of a still scene crossed by an object on `MOTION_FRAMES` only, with intra-coded frames, so that the
+    seeking is frame accurate.
+    """
+    path = str(tmp_path / "gated.avi")
+    rng = np.random.default_rng(0)
+    background = cv2.GaussianBlur(rng.integers(0, 256, (240, 320, 3), dtype=np.uint8), (0, 0), sigmaX=3)
+    video = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), fps=25, frameSize=(320, 240))
+    for id_frame in range(40):
+        frame = background.copy()
+        if id_frame in MOTION_FRAMES:
+            x = 10 + 8 * (id_frame % 20)
+            cv2.rectangle(frame, (x, 80), (x + 60, 160), (255, 255, 255), -1)
+        video.write(frame)
+    video.release()
+
+    return path
+
+
+def read_background(video_path: str) -> np.ndarray:
+    video, *_ = get_video_properties(video_path)
+    _, background = video.read()
+    video.release()
+
+    return background
+
+
+@pytest.mark.parametrize("frame_step", [1, 4])
+@pytest.mark.parametrize("n_jobs", [2, 3])
+def test_parallel_detection_matches_the_sequential_one(gated_video, n_jobs, frame_step):
+    background = read_background(gated_video)
+
+    expected = detect_bboxes_in_range(gated_video, background, 500, 0, crop=True, frame_step=frame_step)
+    detections = list(detect_bboxes_parallel(gated_video, background, 500, n_jobs, crop=True,
+                                             frame_step=frame_step))
+
+    assert [(id_frame, coordinates) for id_frame, coordinates, _ in detections] \
+        == [(id_frame, coordinates) for id_frame, coordinates, _ in expected]
+    for (_, _, crops), (_, _, expected_crops) in zip(detections, expected):
+        assert np.array_equal(np.asarray(crops), np.asarray(expected_crops))
+    # The motion is found on the expected frames only.
+    assert {id_frame for id_frame, coordinates, _ in expected if coordinates} <= set(MOTION_FRAMES)
+
+
+def test_range_starting_on_a_skipped_frame(gated_video):
+    background = read_background(gated_video)
+
+    detections = detect_bboxes_in_range(gated_video, background, 500, 26, 32, crop=False, frame_step=4)
+
+    # The frames 26 and 27 are skipped as in the sequential run, since the frame 24 has no motion.
+    assert [id_frame for id_frame, _, _ in detections] == list(range(26, 32))
+    assert [bool(coordinates) for _, coordinates, _ in detections] == [False, False, True, True, True, True]
+
+
+@pytest.mark.parametrize("detection_scale", [0.5, 0.25])
+def test_detection_scale(gated_video, detection_scale):
+    background = read_background(gated_video)
+    video, *_ = get_video_properties(gated_video)
+    frames = list(read_frames(video))
+    video.release()
+
+    expected = list(detect_bboxes(frames, background, 500))
+    detections = list(detect_bboxes(frames, background, 500, detection_scale=detection_scale))
+
+    assert [id_frame for id_frame, _, _ in detections] == list(range(len(frames)))
+    for (_, frame, coordinates), (_, _, expected_coordinates) in zip(detections, expected):
+        # The same objects are found, with boxes at the full resolution of the frames.
+        assert len(coordinates) == len(expected_coordinates)
+        if coordinates:
+            boxes = np.array(coordinates)
+            assert (boxes[:, :2] >= 0).all()
+            assert (boxes[:, 0] + boxes[:, 2] <= frame.shape[1]).all()
+            assert (boxes[:, 1] + boxes[:, 3] <= frame.shape[0]).all()
+            assert (get_iou(boxes, np.array(expected_coordinates)).max(axis=1) > 0.6).all()
+
+
+def read_video(video_path: str) -> list[np.ndarray]:
+    video, *_ = get_video_properties(video_path)
+    frames = list(read_frames(video))
+    video.release()
+
+    return frames
+
+
+@pytest.mark.parametrize("max_queue_size", [1, 32])
+def test_threaded_video_writer_matches_the_synchronous_one(tmp_path, max_queue_size):
+    frames = list(generate_frames(n_frames=30, width=160, height=120, n_sprites=2, seed=0))
+
+    expected_path = str(tmp_path / "synchronous.mp4")
+    video = cv2.VideoWriter(expected_path, cv2.VideoWriter_fourcc(*"mp4v"), fps=25, frameSize=(160, 120))
+    for frame in frames:
+        video.write(frame)
+    video.release()
+
+    output_path = str(tmp_path / "threaded.mp4")
+    writer = ThreadedVideoWriter(output_path, 25, 160, 120, max_queue_size=max_queue_size)
+    for frame in frames:
+        writer.write(frame)
+    writer.release()
+
+    expected, written = read_video(expected_path), read_video(output_path)
+    assert len(written) == len(expected) == len(frames)
+    for frame, expected_frame in zip(written, expected):
+        assert np.array_equal(frame, expected_frame)
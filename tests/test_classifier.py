@@ -0,0 +1,111 @@
+import types
+
+import numpy as np
+import pytest
+
+import camera_traps.model.classifier as classifier_module
+from camera_traps.model.classifier import ClassificationQueue
+from camera_traps.motion_detection.capture_motion import predict_bboxes
+
+
+class FakeClassifier:
+    """
+    Classifier predicting the value of the first pixel of each crop, recording the size of each batch.
+    """
+    labels = ["value"]
+
+    def __init__(self):
+        self.batches = []
+
+    def predict(self, crops: np.ndarray, batch_size: int = 32) -> np.ndarray:
+        self.batches.append(len(crops))
+
+        return crops[:, 0, 0, :1].astype(np.float32)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch) -> Clock:
+    clock = Clock()
+    monkeypatch.setattr(classifier_module, "time", types.SimpleNamespace(monotonic=clock.monotonic))
+
+    return clock
+
+
+def make_crops(*values: int) -> np.ndarray:
+    return np.stack([np.full((128, 128, 3), value, dtype=np.uint8) for value in values]) if values \
+        else np.empty((0, 128, 128, 3), dtype=np.uint8)
+
+
+def as_values(results) -> list:
+    return [(key, None if predictions is None else predictions[:, 0].tolist()) for key, predictions in results]
+
+
+def test_flush_at_max_batch_size(clock):
+    classifier = FakeClassifier()
+    queue = ClassificationQueue(classifier, max_batch_size=4, max_latency=10)
+
+    assert queue.put(0, make_crops(1, 2)) == []
+    assert queue.put(1, make_crops()) == []
+    # The batch is full: all the queued frames are completed, in order, the ones without crops included.
+    assert as_values(queue.put(2, make_crops(3, 4, 5))) == [(0, [1, 2]), (1, None), (2, [3, 4, 5])]
+    assert classifier.batches == [5]
+    assert queue.flush() == []
+
+
+def test_flush_at_max_latency(clock):
+    classifier = FakeClassifier()
+    queue = ClassificationQueue(classifier, max_batch_size=32, max_latency=0.5)
+
+    assert queue.put(0, make_crops(1)) == []
+    clock.now = 0.3
+    assert queue.put(1, make_crops(2)) == []
+    assert queue.poll() == []
+    # The latency is measured from the oldest queued frame.
+    clock.now = 0.5
+    assert as_values(queue.poll()) == [(0, [1]), (1, [2])]
+
+    # The next frame starts a new batch.
+    assert queue.put(2, make_crops(3)) == []
+    clock.now = 0.9
+    assert queue.poll() == []
+    clock.now = 1.0
+    assert as_values(queue.put(3, make_crops())) == [(2, [3]), (3, None)]
+    assert classifier.batches == [2, 1]
+
+
+def test_flush_without_crops(clock):
+    classifier = FakeClassifier()
+    queue = ClassificationQueue(classifier, max_batch_size=4, max_latency=10)
+
+    queue.put("a", make_crops())
+    queue.put("b", make_crops())
+
+    assert queue.flush() == [("a", None), ("b", None)]
+    assert classifier.batches == []
+
+
+def test_predict_bboxes_keeps_the_frame_order(clock):
+    classifier = FakeClassifier()
+    rng = np.random.default_rng(0)
+    detections = []
+    for id_frame in range(30):
+        n_crops = int(rng.integers(0, 4))
+        detections.append((id_frame, [(id_frame, 0, 10, 10)] * n_crops, make_crops(*[id_frame] * n_crops)))
+
+    results = list(predict_bboxes(detections, classifier, batch_size=5, max_latency=10))
+
+    assert [(id_frame, coordinates) for id_frame, coordinates, _ in results] \
+        == [(id_frame, coordinates) for id_frame, coordinates, _ in detections]
+    for id_frame, coordinates, predictions in results:
+        assert (predictions is None) == (not coordinates)
+        if predictions is not None:
+            assert predictions[:, 0].tolist() == [id_frame] * len(coordinates)
+    assert all(size >= 5 for size in classifier.batches[:-1])
@@ -0,0 +1,51 @@
+import pathlib
+
+import pandas as pd
+
+from camera_traps.cli import get_detections_path, get_videos_root, run_batch
+
+
+def test_detections_paths_of_videos_with_the_same_name(tmp_path):
+    videos = [tmp_path / "cam1" / "IMG_0001.mp4", tmp_path / "cam2" / "IMG_0001.mp4", tmp_path / "cam2" / "b.mp4"]
+    root = get_videos_root(videos)
+    output_dir = tmp_path / "detections"
+
+    paths = [get_detections_path(output_dir, v, "csv", root) for v in videos]
+
+    assert root == tmp_path
+    assert paths == [output_dir / "cam1" / "IMG_0001.csv", output_dir / "cam2" / "IMG_0001.csv",
+                     output_dir / "cam2" / "b.csv"]
+    # The videos of a single directory keep their flat names.
+    assert get_detections_path(output_dir, videos[0], "csv", get_videos_root(videos[:1])) \
+        == output_dir / "IMG_0001.csv"
+
+
+def test_run_batch_with_videos_with_the_same_name(tmp_path, make_video):
+    videos = [pathlib.Path(make_video("cam1/IMG_0001.mp4", seed=1)), pathlib.Path(make_video("cam2/IMG_0001.mp4",
+                                                                                              seed=2))]
+    output_dir = tmp_path / "detections"
+
+    summary = run_batch(videos, output_dir, area_filer_out=100, workers=1)
+
+    assert summary["status"].tolist() == ["processed", "processed"]
+    assert summary["detections"].tolist() == ["cam1/IMG_0001.csv", "cam2/IMG_0001.csv"]
+    first, second = (pd.read_csv(output_dir / name) for name in summary["detections"])
+    assert not first.equals(second)
+
+    # Both videos are found done when the batch is run again.
+    assert run_batch(videos, output_dir, area_filer_out=100, workers=1)["status"].tolist() == ["skipped", "skipped"]
+
+
+def test_run_batch_with_more_videos_than_in_flight(tmp_path, make_video):
+    # With one worker, at most two videos are in flight at once.
+    videos = [pathlib.Path(make_video(f"video_{i}.mp4", n_frames=20, seed=i)) for i in range(5)]
+    cache_dir = tmp_path / "cache"
+
+    first = run_batch(videos, tmp_path / "first", area_filer_out=100, workers=1, cache_dir=str(cache_dir))
+    # The second run loads the motion of every video from the cache.
+    second = run_batch(videos, tmp_path / "second", area_filer_out=100, workers=1, cache_dir=str(cache_dir))
+
+    assert first["status"].tolist() == second["status"].tolist() == ["processed"] * len(videos)
+    assert (second["elapsed"] >= 0).all()
+    for name in first["detections"]:
+        pd.testing.assert_frame_equal(pd.read_csv(tmp_path / "first" / name), pd.read_csv(tmp_path / "second" / name))
@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+from camera_traps.benchmarks.crops import legacy_crops
+from camera_traps.motion_detection.capture_motion import crop_bboxes
+from camera_traps.motion_detection.crops import CropBuffer
+
+
+def make_frames(n_frames: int = 6, seed: int = 0) -> tuple[list[np.ndarray], list[list[tuple[int, int, int, int]]]]:
+    rng = np.random.default_rng(seed)
+    frames = [rng.integers(0, 256, (120, 160, 3), dtype=np.uint8) for _ in range(n_frames)]
+    coordinates = []
+    for _ in range(n_frames):
+        n_boxes = int(rng.integers(0, 4))
+        x, y = rng.integers(0, 150, n_boxes), rng.integers(0, 110, n_boxes)
+        w, h = rng.integers(1, 160 - x + 1), rng.integers(1, 120 - y + 1)
+        coordinates.append([tuple(box) for box in np.stack([x, y, w, h], axis=1).tolist()])
+    # At least a box, for the legacy stacking.
+    coordinates[0].append((0, 0, 160, 120))
+
+    return frames, coordinates
+
+
+@pytest.mark.parametrize("capacity", [1, 256])
+def test_to_rgb_matches_the_legacy_crops(capacity):
+    frames, coordinates = make_frames()
+    buffer = CropBuffer(capacity=capacity)
+    views = []
+    for frame, frame_coordinates in zip(frames, coordinates):
+        views.append(buffer.add(frame, frame_coordinates).shape)
+        # Converting in the middle only converts the crops added since.
+        if len(views) == 3:
+            buffer.to_rgb()
+
+    assert np.array_equal(buffer.to_rgb(), legacy_crops(frames, coordinates))
+    assert views == [(len(c), 128, 128, 3) for c in coordinates]
+    # Converting again changes nothing.
+    assert np.array_equal(buffer.to_rgb(), legacy_crops(frames, coordinates))
+
+
+def test_crop_bboxes_matches_the_legacy_crops():
+    frames, coordinates = make_frames(seed=1)
+
+    crops = [crop_bboxes(frame, frame_coordinates) for frame, frame_coordinates in zip(frames, coordinates)]
+
+    assert np.array_equal(np.concatenate(crops), legacy_crops(frames, coordinates))
+
+
+def test_extend_matches_the_legacy_crops():
+    frames, coordinates = make_frames(seed=2)
+    expected = legacy_crops(frames, coordinates)
+
+    # Crops added from frames and already prepared crops, mixed.
+    buffer = CropBuffer(capacity=2)
+    buffer.add(frames[0], coordinates[0])
+    buffer.extend(legacy_crops(frames[1:2], coordinates[1:2]) if coordinates[1] else np.empty((0, 128, 128, 3)))
+    for frame, frame_coordinates in zip(frames[2:], coordinates[2:]):
+        buffer.add(frame, frame_coordinates)
+
+    assert np.array_equal(buffer.to_rgb(), expected)
+
+    buffer.clear()
+    assert len(buffer) == 0
+    buffer.extend(expected)
+    assert np.array_equal(buffer.to_rgb(), expected)
@@ -0,0 +1,107 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+import pytest
+from shapely.errors import ShapelyDeprecationWarning
+
+from camera_traps.benchmarks.voting import make_tracks
+from camera_traps.motion_detection.detections import Detections, get_primary_label, get_primary_labels, \
+    to_object_array
+
+
+def as_objects(labels) -> list:
+    # The labels as comparable objects, the missing ones included.
+    return pd.Series(np.asarray(labels, dtype=object)).fillna("nan").tolist()
+
+
+def weighted_primary_labels(tracks, labels, weights, min_count: int = 3, min_occurrence: float = 25) -> list:
+    # The voting of each track on its own, summing the weights of each label in order of first appearance.
+    primary = dict()
+    labels = as_objects(labels)
+    for track in dict.fromkeys(tracks.tolist()):
+        positions = np.flatnonzero(tracks == track)
+        sums = dict()
+        for position in positions:
+            sums[labels[position]] = sums.get(labels[position], 0) + weights[position]
+        best = max(sums, key=sums.get)
+        valid = len(positions) >= min_count and sums[best] / sum(sums.values()) * 100 > min_occurrence
+        primary[track] = best if valid else "None_of_the_above"
+
+    return [primary[track] for track in tracks.tolist()]
+
+
+def test_to_dataframe_keeps_float32_scores():
+    detections = Detections.from_boxes([0, 0, 1], [(0, 0, 10, 10), (50, 50, 10, 10), (1, 1, 10, 10)])
+    detections.set_predictions(np.array([[0.9, 0.1], [0.2, 0.8], [0.97, 0.03]], dtype=np.float32), ["deer", "fox"],
+                               score_filter_out=95)
+
+    box_detection = detections.to_dataframe()
+
+    assert box_detection["score"].dtype == np.float32
+    assert box_detection["label"].tolist() == ["None_of_the_above", "None_of_the_above", "deer"]
+
+
+def test_to_dataframe_without_predictions():
+    box_detection = Detections.from_boxes([0], [(0, 0, 10, 10)]).to_dataframe()
+
+    assert box_detection["score"].isna().all()
+    assert box_detection["box"].tolist() == [(0, 0, 10, 10)]
+
+
+
+def test_to_dataframe_of_tracked_detections_without_shapely_warnings():
+    detections = Detections.from_boxes([0, 1, 1], [(0, 0, 10, 10), (2, 2, 10, 10), (100, 100, 10, 10)])
+    detections.track()
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("error", ShapelyDeprecationWarning)
+        box_detection = detections.to_dataframe()
+
+    assert [(p.x, p.y) for p in box_detection["centroid"]] == [(5, 5), (7, 7), (105, 105)]
+    assert box_detection["track_index"].tolist() == [0, 0, 1]
+
+
+def test_to_object_array_keeps_the_tuples():
+    array = to_object_array([(1, 2), None, (3, 4)])
+
+    assert array.shape == (3,)
+    assert array.tolist() == [(1, 2), None, (3, 4)]
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("track_length", [2, 5, 20])
+def test_primary_labels_match_the_groupby(seed, track_length):
+    tracks, labels = make_tracks(2000, track_length, n_labels=3, seed=seed)
+    # Shuffle the boxes, so that the tracks are not contiguous.
+    order = np.random.default_rng(seed).permutation(len(tracks))
+    tracks, labels = tracks[order], labels[order]
+
+    expected = pd.Series(np.asarray(labels, dtype=object)).groupby(tracks).transform(get_primary_label)
+
+    assert as_objects(get_primary_labels(tracks, labels)) == as_objects(expected)
+
+
+def test_primary_labels_ties():
+    tracks = np.array([0, 0, 0, 0, 1, 1, 1, 1, 2, 2, 2, 2])
+    labels = pd.Categorical(["fox", "deer", "deer", "fox",
+                             "deer", np.nan, np.nan, "deer",
+                             "fox", "deer", "boar", "cat"])
+
+    expected = pd.Series(np.asarray(labels, dtype=object)).groupby(tracks).transform(get_primary_label)
+    primary = as_objects(get_primary_labels(tracks, labels))
+
+    # Among equally frequent labels, the first one wins (the missing label as well); 25% is not enough.
+    assert primary == ["fox"] * 4 + ["deer"] * 4 + ["None_of_the_above"] * 4
+    assert primary == as_objects(expected)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_weighted_primary_labels(seed):
+    tracks, labels = make_tracks(1000, 6, n_labels=3, seed=seed)
+    weights = np.random.default_rng(seed).uniform(0.5, 1, len(tracks))
+
+    assert as_objects(get_primary_labels(tracks, labels, weights=weights)) \
+        == weighted_primary_labels(tracks, labels, weights)
+    # Equal weights vote as the counts.
+    assert as_objects(get_primary_labels(tracks, labels, weights=np.full(len(tracks), 0.5))) \
+        == as_objects(get_primary_labels(tracks, labels))
@@ -0,0 +1,64 @@
+import time
+
+import numpy as np
+
+from camera_traps.motion_detection.detections import Detections
+from camera_traps.motion_detection.events import EventIndex, get_events
+
+CLASSES = ["deer", "fox"]
+
+
+def make_detections(tracks: dict[str, tuple[int, int]], n_frames: int = 3) -> Detections:
+    """
+    Build the labeled and tracked detections of still objects, one for each label, visible in the first frames.
+    """
+    ids, coordinates, codes = [], [], []
+    for id_frame in range(n_frames):
+        for label, (x, y) in tracks.items():
+            ids.append(id_frame)
+            coordinates.append((x, y, 20, 20))
+            codes.append(CLASSES.index(label))
+    detections = Detections.from_boxes(ids, coordinates)
+    detections.set_predictions(np.eye(len(CLASSES))[codes], CLASSES, score_filter_out=95)
+    detections.track(distance_limit=30)
+    detections.vote_labels()
+
+    return detections
+
+
+def local_timestamp(hour: int) -> float:
+    return time.mktime((2024, 6, 1, hour, 0, 0, 0, 0, -1))
+
+
+def test_get_events():
+    events = get_events(make_detections({"fox": (10, 10), "deer": (300, 300)}), fps=10)
+
+    assert len(events) == 2
+    fox = events[events["label"] == "fox"].iloc[0]
+    assert (fox["start_frame"], fox["end_frame"], fox["boxes"]) == (0, 2, 3)
+    assert fox["end_time"] == 0.2
+    assert (fox["x_min"], fox["y_min"], fox["x_max"], fox["y_max"]) == (10, 10, 30, 30)
+    assert fox["max_score"] == 100
+
+
+def test_add_video_and_query(tmp_path):
+    with EventIndex(str(tmp_path / "events.sqlite")) as index:
+        index.add_video("night.mp4", make_detections({"fox": (10, 10), "deer": (300, 300)}), 10,
+                        recorded_at=local_timestamp(23))
+        index.add_video("dawn.mp4", make_detections({"fox": (10, 10)}), 10, recorded_at=local_timestamp(2))
+        index.add_video("noon.mp4", make_detections({"fox": (10, 10)}), 10, recorded_at=local_timestamp(12))
+
+        assert len(index.query()) == 4
+        assert sorted(index.query(labels=["fox"])["video"]) == ["dawn.mp4", "night.mp4", "noon.mp4"]
+        # The range of hours wraps around midnight.
+        night = index.query(labels=["fox"], hours=(20, 5))
+        assert sorted(night["video"]) == ["dawn.mp4", "night.mp4"]
+        assert list(index.query(hours=(10, 14))["video"]) == ["noon.mp4"]
+        assert list(index.query(labels=["deer"], start=local_timestamp(22), end=local_timestamp(23) + 1)["video"]) \
+            == ["night.mp4"]
+
+        # Indexing a video again replaces its events.
+        index.add_video("night.mp4", make_detections({"deer": (300, 300)}), 10, recorded_at=local_timestamp(23))
+        assert sorted(index.query(labels=["fox"], hours=(20, 5))["video"]) == ["dawn.mp4"]
+        assert len(index.videos()) == 3
+        assert len(index.query()) == 3
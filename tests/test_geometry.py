@@ -0,0 +1,98 @@
+import numpy as np
+import pytest
+from shapely.ops import unary_union
+
+from camera_traps.motion_detection.geometry_utils import compose_polygon, decompose_polygon, \
+    get_bbox_without_intersection, merge_bboxes, rescale_bboxes, sample_random_bboxes
+
+
+def sort_boxes(boxes) -> list[tuple[int, int, int, int]]:
+    return sorted(map(tuple, np.asarray(boxes).reshape(-1, 4).tolist()), key=lambda b: (b[1], b[0]))
+
+
+def random_frame_boxes(rng: np.random.Generator, n_boxes: int, width: int = 640, height: int = 360) -> np.ndarray:
+    x = rng.integers(0, width - 20, n_boxes)
+    y = rng.integers(0, height - 20, n_boxes)
+    w = rng.integers(10, 120, n_boxes)
+    h = rng.integers(10, 120, n_boxes)
+
+    return np.stack([x, y, w, h], axis=1)
+
+
+def is_axis_aligned(polygon) -> bool:
+    rectangle = polygon.minimum_rotated_rectangle
+
+    return np.isclose(rectangle.area, rectangle.envelope.area, rtol=1e-9)
+
+
+@pytest.mark.parametrize("boxes, expected", [
+    # A single box.
+    ([(10, 10, 20, 20)], [(10, 10, 20, 20)]),
+    # Overlapping boxes.
+    ([(10, 10, 20, 20), (20, 15, 20, 20)], [(10, 10, 30, 25)]),
+    # Boxes sharing an edge.
+    ([(10, 10, 20, 20), (30, 10, 20, 20)], [(10, 10, 40, 20)]),
+    # Boxes touching only at a corner stay separated.
+    ([(10, 10, 20, 20), (30, 30, 20, 20)], [(10, 10, 20, 20), (30, 30, 20, 20)]),
+    # A chain of boxes is merged as a whole, even if its ends do not overlap.
+    ([(0, 0, 10, 10), (100, 0, 10, 10), (5, 5, 100, 2)], [(0, 0, 110, 10)]),
+    # The merged boxes are sorted by their upper left corner, y first.
+    ([(200, 5, 10, 10), (0, 50, 10, 10), (50, 5, 10, 10)], [(50, 5, 10, 10), (200, 5, 10, 10), (0, 50, 10, 10)]),
+])
+def test_merge_bboxes(boxes, expected):
+    assert np.asarray(merge_bboxes(np.array(boxes))).tolist() == [list(b) for b in expected]
+
+
+def test_merge_bboxes_empty():
+    assert merge_bboxes(np.empty((0, 4), dtype=int)).shape == (0, 4)
+
+
+@pytest.mark.parametrize("n_boxes", [2, 5, 30])
+def test_merge_bboxes_against_shapely(n_boxes):
+    rng = np.random.default_rng(n_boxes)
+    for _ in range(300):
+        boxes = random_frame_boxes(rng, n_boxes)
+        merged = sort_boxes(merge_bboxes(boxes))
+
+        union = unary_union([compose_polygon(*b) for b in boxes.tolist()])
+        polygons = list(union.geoms) if union.geom_type == "MultiPolygon" else [union]
+        # The merged boxes are the axis-aligned extents of the polygons of the union.
+        assert merged == sort_boxes([decompose_polygon(p) for p in polygons])
+
+        # They are the boxes of the previous implementation whenever no minimum rotated rectangle is tilted.
+        if all(is_axis_aligned(p) for p in polygons):
+            assert merged == sort_boxes(get_bbox_without_intersection([compose_polygon(*b) for b in boxes.tolist()]))
+
+
+def test_rescale_bboxes():
+    boxes = np.array([(0, 0, 10, 10), (5, 3, 7, 9), (150, 110, 10, 10)])
+
+    assert rescale_bboxes(boxes, 1, 320, 240) is boxes
+    # The boxes are brought back to the original resolution, rounded outwards.
+    assert rescale_bboxes(boxes, 0.5, 320, 240).tolist() == [[0, 0, 20, 20], [10, 6, 14, 18], [300, 220, 20, 20]]
+    # The boxes touching the border of a resized image never exceed the original one.
+    assert rescale_bboxes(np.array([(25, 0, 5, 5)]), 0.3, 100, 100).tolist() == [[83, 0, 17, 17]]
+
+
+@pytest.mark.parametrize("width, height, min_area", [(640, 360, 1000), (50, 40, 2000), (10, 10, 1), (64, 48, 64 * 48)])
+def test_sample_random_bboxes(width, height, min_area):
+    boxes = sample_random_bboxes(width, height, min_area, 5000, np.random.default_rng(0))
+
+    x, y, w, h = boxes.T
+    assert boxes.shape == (5000, 4)
+    # The boxes are inside the image, and large enough.
+    assert (x >= 0).all() and (y >= 0).all() and (w >= 1).all() and (h >= 1).all()
+    assert (x + w <= width).all() and (y + h <= height).all()
+    assert (w * h >= min_area).all()
+
+
+def test_sample_random_bboxes_is_reproducible():
+    first = sample_random_bboxes(640, 360, 1000, 100, np.random.default_rng(7))
+
+    assert np.array_equal(first, sample_random_bboxes(640, 360, 1000, 100, np.random.default_rng(7)))
+    assert not np.array_equal(first, sample_random_bboxes(640, 360, 1000, 100, np.random.default_rng(8)))
+
+
+def test_sample_random_bboxes_larger_than_the_image():
+    with pytest.raises(ValueError, match="No bounding box"):
+        sample_random_bboxes(10, 10, 101, 1)
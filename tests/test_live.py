@@ -0,0 +1,79 @@
+import threading
+
+import numpy as np
+import pytest
+
+from camera_traps.motion_detection.live import FrameQueue, LiveFrame
+
+
+def make_frame(id_frame: int) -> LiveFrame:
+    return LiveFrame(id_frame=id_frame, timestamp=float(id_frame), frame=np.zeros((2, 2, 3), dtype=np.uint8))
+
+
+def drain(frames: FrameQueue) -> list[int]:
+    frames.close()
+    ids = []
+    while (frame := frames.get(timeout=0)) is not None:
+        ids.append(frame.id_frame)
+
+    return ids
+
+
+@pytest.mark.parametrize("drop_policy, expected", [
+    # The latest frames survive.
+    ("drop_oldest", [7, 8, 9]),
+    # The first frames survive, the incoming ones are dropped.
+    ("drop_newest", [0, 1, 2]),
+])
+def test_drop_policies(drop_policy, expected):
+    frames = FrameQueue(max_size=3, drop_policy=drop_policy)
+    for id_frame in range(10):
+        frames.put(make_frame(id_frame))
+
+    assert frames.n_dropped == 7
+    assert drain(frames) == expected
+    assert frames.done
+
+
+@pytest.mark.parametrize("drop_policy", ["drop_oldest", "drop_newest"])
+def test_no_frame_is_dropped_while_the_consumer_keeps_up(drop_policy):
+    frames = FrameQueue(max_size=2, drop_policy=drop_policy)
+    taken = []
+    for id_frame in range(5):
+        frames.put(make_frame(id_frame))
+        frames.put(make_frame(id_frame + 100))
+        taken.extend(frames.get(timeout=0).id_frame for _ in range(2))
+
+    assert frames.n_dropped == 0
+    assert taken == [i for id_frame in range(5) for i in (id_frame, id_frame + 100)]
+
+
+def test_drops_after_partial_consumption():
+    frames = FrameQueue(max_size=2, drop_policy="drop_oldest")
+    for id_frame in range(3):
+        frames.put(make_frame(id_frame))
+    assert frames.get(timeout=0).id_frame == 1
+    frames.put(make_frame(3))
+    frames.put(make_frame(4))
+
+    assert frames.n_dropped == 2
+    assert drain(frames) == [3, 4]
+
+
+def test_get_waits_for_a_frame_or_the_closing():
+    frames = FrameQueue(max_size=2)
+
+    assert frames.get(timeout=0) is None
+    assert not frames.done
+
+    threading.Timer(0.05, frames.put, args=(make_frame(0),)).start()
+    assert frames.get(timeout=5).id_frame == 0
+
+    threading.Timer(0.05, frames.close).start()
+    assert frames.get(timeout=5) is None
+    assert frames.done
+
+
+def test_unknown_drop_policy():
+    with pytest.raises(ValueError, match="Unknown drop policy"):
+        FrameQueue(drop_policy="block")
@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+from camera_traps.cli import restore_detections, save_detections
+from camera_traps.motion_detection.capture_motion import postprocess_detections
+from camera_traps.motion_detection.detections import Detections
+
+CLASSES = ["badger", "deer", "fox"]
+THRESHOLDS = [0, 50, 80, 95]
+
+
+def make_boxes(n_frames: int = 40, n_objects: int = 3, seed: int = 0) -> tuple[list[int], list[tuple], np.ndarray]:
+    """
+    Build the boxes of objects moving slowly along the frames, with random predictions (exactly representable in half
+    precision, as the stored ones).
+    """
+    rng = np.random.default_rng(seed)
+    ids, coordinates = [], []
+    for id_frame in range(n_frames):
+        for i in range(n_objects):
+            if rng.random() < 0.8:
+                ids.append(id_frame)
+                coordinates.append((100 * i + id_frame, 200 * i, 40, 30))
+    predictions = rng.dirichlet(np.full(len(CLASSES), 0.3), size=len(ids))
+
+    return ids, coordinates, predictions.astype(np.float16).astype(np.float32)
+
+
+def fresh_run(score_filter_out: float) -> Detections:
+    ids, coordinates, predictions = make_boxes()
+
+    return postprocess_detections(Detections.from_boxes(ids, coordinates), predictions, CLASSES,
+                                  score_filter_out=score_filter_out, tracked_prediction=True)
+
+
+def assert_same_labels(detections: Detections, expected: Detections):
+    np.testing.assert_array_equal(detections.id_frame, expected.id_frame)
+    np.testing.assert_array_equal(detections.track_index, expected.track_index)
+    np.testing.assert_allclose(detections.score, expected.score, rtol=1e-6)
+    np.testing.assert_array_equal(np.asarray(detections.label, dtype=object), np.asarray(expected.label, dtype=object))
+
+
+@pytest.mark.parametrize("score_filter_out", THRESHOLDS)
+def test_relabel_matches_fresh_run(score_filter_out):
+    assert_same_labels(fresh_run(0).relabel(score_filter_out), fresh_run(score_filter_out))
+
+
+@pytest.mark.parametrize("suffix", [".csv", ".parquet"])
+def test_relabel_restored_detections(tmp_path, suffix):
+    if suffix == ".parquet":
+        pytest.importorskip("pyarrow")
+    path = tmp_path / f"video{suffix}"
+    save_detections(fresh_run(0), path, metadata={"score_filter_out": 0})
+
+    restored = restore_detections(path)
+    assert restored.classes == CLASSES
+    assert restored.probabilities.shape == (len(restored), len(CLASSES))
+    for score_filter_out in THRESHOLDS:
+        assert_same_labels(restored.relabel(score_filter_out), fresh_run(score_filter_out))
@@ -0,0 +1,84 @@
+import numpy as np
+import pandas as pd
+import pytest
+from shapely.geometry import Point
+
+from camera_traps.motion_detection.tracking_objects import CentroidTracker, track_centroids, tracking
+
+
+def legacy_tracking(df: pd.DataFrame, distance_limit: float = 10) -> pd.Series:
+    # The cross-join tracking replaced by `CentroidTracker`.
+    def flatten_concatenated_mapping(key, value, dictionary):
+        if dictionary.get(value) is not None:
+            new_value = dictionary.get(value)
+            dictionary[key] = new_value
+            return flatten_concatenated_mapping(key, new_value, dictionary)
+        else:
+            return dictionary
+
+    df_centroid = df[["id_frame", "centroid"]].copy()
+    df_centroid["index"] = np.arange(0, len(df_centroid))
+    traker = pd.merge(df_centroid, df_centroid, how="cross", suffixes=(" (t)", " (t-1)"))
+    traker.query("`id_frame (t)` - `id_frame (t-1)` == 1", inplace=True)
+    traker["distance"] = traker.apply(lambda x: x["centroid (t)"].distance(x["centroid (t-1)"]), axis=1)
+    traker.query("distance <= @distance_limit", inplace=True)
+
+    mapping = traker.set_index("index (t)")["index (t-1)"].to_dict()
+    for k, v in mapping.items():
+        mapping = flatten_concatenated_mapping(k, v, mapping)
+
+    tracking_index = df_centroid["index"].map(mapping).fillna(df_centroid["index"]).astype(int)
+    ascending_mapping = dict(zip(tracking_index.unique(), np.arange(0, tracking_index.nunique())))
+
+    return tracking_index.map(ascending_mapping)
+
+
+def get_partition(tracks) -> set[frozenset[int]]:
+    # The groups of boxes sharing a track, whatever the numbering of the tracks.
+    return {frozenset(np.flatnonzero(np.asarray(tracks) == track).tolist()) for track in np.unique(tracks)}
+
+
+def random_boxes(seed: int, n_frames: int = 30, max_boxes: int = 4) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    # Skip some frames, so that the tracks are broken by gaps.
+    id_frames = np.sort(rng.choice(n_frames + n_frames // 3, n_frames, replace=False))
+    id_frame = np.repeat(id_frames, rng.integers(0, max_boxes + 1, n_frames))
+    # Centroids on a coarse grid, so that many distances are equal to each other and to the limit.
+    centroids = rng.integers(0, 5, (len(id_frame), 2)) * 5
+
+    return pd.DataFrame({"id_frame": id_frame, "centroid": [Point(x, y) for x, y in centroids.tolist()]})
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_tracks_match_the_legacy_tracking(seed):
+    df = random_boxes(seed)
+
+    expected = legacy_tracking(df, distance_limit=10)
+    centroids = np.array([(p.x, p.y) for p in df["centroid"]])
+
+    assert get_partition(track_centroids(df["id_frame"].to_numpy(), centroids, distance_limit=10)) \
+        == get_partition(expected)
+    # The numbering in order of appearance is kept as well.
+    assert tracking(df, distance_limit=10).tolist() == expected.tolist()
+
+
+def test_tracker_with_ties_and_gaps():
+    tracker = CentroidTracker(distance_limit=10)
+
+    assert tracker.update(0, [(0, 0), (20, 0)]).tolist() == [0, 1]
+    # Both boxes of the previous frame are at the limit distance: the last one is continued.
+    assert tracker.update(1, [(10, 0)]).tolist() == [1]
+    # Two boxes continue the same track.
+    assert tracker.update(2, [(5, 0), (15, 0)]).tolist() == [1, 1]
+    # A gap of one frame starts new tracks, even for the same centroids.
+    assert tracker.update(4, [(5, 0), (15, 0)]).tolist() == [2, 3]
+    assert tracker.update(5, []).tolist() == []
+    assert tracker.update(6, [(5, 0)]).tolist() == [4]
+    assert tracker.num_tracks == 5
+
+
+def test_track_centroids_with_unsorted_frames():
+    id_frames = np.array([1, 0, 1, 0])
+    centroids = np.array([(0, 0), (1, 1), (100, 100), (101, 101)])
+
+    assert track_centroids(id_frames, centroids).tolist() == [0, 0, 1, 1]